@@ -0,0 +1,172 @@
+"""
+Flat analytics rows built from a Smart Search result.
+
+One row per query with a fixed schema (``ANALYTICS_SCHEMA``), shared by the
+dashboard's CSV download and the headless batch runner.
+"""
+
+from __future__ import annotations
+from datetime import datetime
+from typing import Any, Dict, Iterable, List
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+
+from intelligence.nlp import score_many
+
+# Column -> pandas dtype. Nullable dtypes keep the schema stable when a batch has only missing values.
+ANALYTICS_SCHEMA: Dict[str, str] = {
+    "timestamp": "string",
+    "query": "string",
+    "query_type": "string",
+    "execution_time_sec": "Float64",
+    "time_to_first_content_sec": "Float64",
+    "place_name": "string",
+    "country": "string",
+    "latitude": "Float64",
+    "longitude": "Float64",
+    "temperature_c": "Float64",
+    "windspeed_ms": "Float64",
+    "wind_direction": "Float64",
+    "is_day": "Int64",
+    "weather_code": "Int64",
+    "daily_max_temp": "Float64",
+    "daily_min_temp": "Float64",
+    "daily_precip_sum": "Float64",
+    "daily_uv_index": "Float64",
+    "wiki_title": "string",
+    "wiki_summary_length": "Int64",
+    "wiki_summary_words": "Int64",
+    "news_count": "Int64",
+    "avg_news_sentiment": "Float64",
+    "positive_news_count": "Int64",
+    "negative_news_count": "Int64",
+    "total_news_points": "Int64",
+    "total_news_comments": "Int64",
+    "news_sources_count": "Int64",
+    "wiki_time_sec": "Float64",
+    "news_time_sec": "Float64",
+    "weather_time_sec": "Float64",
+    "fx_time_sec": "Float64",
+    "source_errors": "Int64",
+}
+ANALYTICS_COLUMNS: List[str] = list(ANALYTICS_SCHEMA)
+
+
+def build_analytics_row(raw_query: str, res: dict) -> Dict[str, Any]:
+    """
+    Take the aggregated smart search result and return a flat row
+    that can later be downloaded as CSV.
+    Logs ALL queries, with extra fields for weather, news, wiki, etc.
+    """
+    query_type = res.get("query_type", "Abstract")
+    geo = res.get("geo")
+    weather = res.get("weather")
+    wiki_pages = res.get("wiki") or []
+    news_hits = res.get("news") or []
+
+    # Execution times (injected into res by the caller)
+    exec_time = res.get("execution_time", 0.0)
+    first_content_time = res.get("first_content_time")
+    timings = res.get("timings") or {}
+
+    # Weather details
+    cur = {}
+    daily = {}
+    if weather:
+        cur = weather.get("current_weather", {}) or {}
+        daily = weather.get("daily", {}) or {}
+
+    # Extract daily metrics (arrays -> single value)
+    def get_daily_val(key):
+        vals = daily.get(key)
+        return vals[0] if vals else None
+
+    # Top wiki page
+    top_wiki = wiki_pages[0] if wiki_pages else {}
+    wiki_title = top_wiki.get("title")
+    # Summary already fetched by smart_aggregate (no extra request here)
+    wiki_summary = (res.get("summaries") or {}).get(wiki_title) or {}
+    wiki_extract = wiki_summary.get("extract") or ""
+
+    # News metrics
+    total_points = sum(h.get("points", 0) or 0 for h in news_hits)
+    total_comments = sum(h.get("num_comments", 0) or 0 for h in news_hits)
+
+    # Unique sources
+    domains = set()
+    for h in news_hits:
+        u = h.get("url") or h.get("story_url")
+        if u:
+            try:
+                domains.add(urlparse(u).netloc)
+            except ValueError:
+                pass
+    news_sources_count = len(domains)
+
+    # Sentiment (reuse the scores computed for the results view, one per headline)
+    scores = res.get("news_sentiment")
+    if scores is None:
+        scores = score_many([h.get("title") or "" for h in news_hits])
+    sentiments = np.asarray([s for h, s in zip(news_hits, scores) if h.get("title")])
+    pos_count = int((sentiments > 0).sum())
+    neg_count = int((sentiments < 0).sum())
+    avg_sentiment = float(sentiments.mean()) if sentiments.size else None
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "query": raw_query,
+        "query_type": query_type,
+        "execution_time_sec": round(exec_time, 4),
+        "time_to_first_content_sec": round(first_content_time, 4) if first_content_time is not None else None,
+
+        # Geo
+        "place_name": geo.get("name") if geo else None,
+        "country": geo.get("country_code") if geo else None,
+        "latitude": geo.get("latitude") if geo else None,
+        "longitude": geo.get("longitude") if geo else None,
+
+        # Weather
+        "temperature_c": cur.get("temperature"),
+        "windspeed_ms": cur.get("windspeed"),
+        "wind_direction": cur.get("winddirection"),
+        "is_day": cur.get("is_day"),
+        "weather_code": cur.get("weathercode"),
+        "daily_max_temp": get_daily_val("temperature_2m_max"),
+        "daily_min_temp": get_daily_val("temperature_2m_min"),
+        "daily_precip_sum": get_daily_val("precipitation_sum"),
+        "daily_uv_index": get_daily_val("uv_index_max"),
+
+        # Wiki
+        "wiki_title": wiki_title,
+        "wiki_summary_length": len(wiki_extract) if wiki_summary else None,
+        "wiki_summary_words": len(wiki_extract.split()) if wiki_summary else None,
+
+        # News
+        "news_count": len(news_hits),
+        "avg_news_sentiment": avg_sentiment,
+        "positive_news_count": pos_count,
+        "negative_news_count": neg_count,
+        "total_news_points": total_points,
+        "total_news_comments": total_comments,
+        "news_sources_count": news_sources_count,
+
+        # Per-source breakdown (None for sources that did not run)
+        "wiki_time_sec": _seconds(timings.get("wiki")),
+        "news_time_sec": _seconds(timings.get("news")),
+        "weather_time_sec": _seconds(timings.get("weather")),
+        "fx_time_sec": _seconds(timings.get("fx")),
+        # a source can report several upstream problems; count it once
+        "source_errors": len({e.split(":", 1)[0] for e in res.get("errors") or []}),
+    }
+
+
+def _seconds(value) -> Any:
+    return round(value, 4) if value is not None else None
+
+
+def rows_to_frame(rows: Iterable[Dict[str, Any]]) -> pd.DataFrame:
+    """DataFrame with exactly the analytics columns, in order, with the schema's dtypes."""
+    df = pd.DataFrame(list(rows), columns=ANALYTICS_COLUMNS)
+    return df.astype(ANALYTICS_SCHEMA)
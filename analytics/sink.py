@@ -0,0 +1,250 @@
+"""
+Process-wide analytics sink shared by every Streamlit session.
+
+``add_analytics_row`` hands each row to ``AnalyticsSink.submit``, which only puts
+it on a queue; a daemon writer thread batches rows and flushes them every
+``batch_rows`` rows or ``flush_interval`` seconds to a Parquet dataset
+partitioned by day (``<dir>/date=YYYY-MM-DD/part-<sink id>-NNNNN.parquet``; the
+random id keeps processes sharing the directory from picking the same file
+name). Query traffic from all users therefore survives closed tabs and
+restarts, and ``query`` reads back only the partitions and columns asked for.
+"""
+
+from __future__ import annotations
+import atexit
+import datetime as dt
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from analytics.rows import ANALYTICS_COLUMNS, rows_to_frame
+from analytics.writers import ParquetDatasetWriter
+
+BATCH_ROWS = int(os.getenv("INTELLIDASH_ANALYTICS_BATCH_ROWS", "500"))
+FLUSH_INTERVAL = float(os.getenv("INTELLIDASH_ANALYTICS_FLUSH_INTERVAL", "5"))
+# Day partitions older than this are deleted as new days roll in; 0 keeps everything
+RETENTION_DAYS = int(os.getenv("INTELLIDASH_ANALYTICS_RETENTION_DAYS", "0"))
+QUEUE_SIZE = 10_000
+# Seconds the process may spend at exit writing rows still queued in the shared sink
+EXIT_FLUSH_TIMEOUT = 10.0
+
+_PARTITIONING = ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive")
+_STOP = object()
+
+
+def default_dir() -> Optional[Path]:
+    """Location of the shared dataset, or None when ``INTELLIDASH_ANALYTICS_DIR=off``."""
+    root = os.getenv("INTELLIDASH_ANALYTICS_DIR", str(Path(__file__).resolve().parent.parent / ".cache" / "analytics"))
+    if not root or root.lower() in ("0", "off", "false", "none"):
+        return None
+    return Path(root)
+
+
+def _partition(row: Dict[str, Any]) -> str:
+    ts = row.get("timestamp")
+    return str(ts)[:10] if ts else dt.date.today().isoformat()
+
+
+class AnalyticsSink:
+    """Thread-safe, non-blocking row sink flushing to a day-partitioned Parquet dataset."""
+
+    def __init__(
+        self,
+        directory: os.PathLike,
+        batch_rows: int = BATCH_ROWS,
+        flush_interval: float = FLUSH_INTERVAL,
+        compression: str = "zstd",
+        queue_size: int = QUEUE_SIZE,
+        retention_days: int = RETENTION_DAYS,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.compression = compression
+        self.retention_days = retention_days
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+        self._writers: Dict[str, ParquetDatasetWriter] = {}
+        # Part file prefix of this sink; another worker or a restarted process writing the same day uses its own
+        self._part_prefix = f"part-{uuid.uuid4().hex[:12]}"
+        self._stats = {"submitted": 0, "written": 0, "dropped": 0, "parts": 0, "errors": 0}
+        self._stats_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="analytics-sink", daemon=True)
+        self._thread.start()
+
+    def _count(self, field: str, n: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[field] += n
+
+    def submit(self, row: Dict[str, Any]) -> bool:
+        """Queue a row for writing without blocking; False if the queue is full and the row was dropped."""
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self._count("dropped")
+            return False
+        self._count("submitted")
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Write everything submitted so far; True once it is on disk."""
+        if not self._thread.is_alive():
+            return False
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Flush pending rows and stop the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        buffer: List[Dict[str, Any]] = []
+        deadline = 0.0
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()) if buffer else None)
+            except queue.Empty:
+                item = None  # flush interval elapsed
+            if isinstance(item, dict):
+                if not buffer:
+                    deadline = time.monotonic() + self.flush_interval
+                buffer.append(item)
+                if len(buffer) < self.batch_rows:
+                    continue
+            self._write(buffer)
+            buffer = []
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is _STOP:
+                return
+
+    def _write(self, rows: List[Dict[str, Any]]) -> None:
+        by_day: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            by_day.setdefault(_partition(row), []).append(row)
+        for day, day_rows in by_day.items():
+            try:
+                writer = self._writers.get(day)
+                if writer is None:
+                    self.prune()  # a new day rolled in
+                    writer = self._writers[day] = ParquetDatasetWriter(
+                        self.directory / f"date={day}", compression=self.compression, prefix=self._part_prefix
+                    )
+                writer.write(day_rows)
+            except Exception as e:  # keep the writer thread alive; the batch is lost
+                self._count("errors")
+                print(f"analytics sink: failed to write {len(day_rows)} rows for {day}: {e}", file=sys.stderr)
+                continue
+            self._count("written", len(day_rows))
+            self._count("parts")
+
+    def prune(self, today: Optional[dt.date] = None) -> List[str]:
+        """Delete day partitions older than ``retention_days``; return the days removed."""
+        if self.retention_days <= 0:
+            return []
+        cutoff = ((today or dt.date.today()) - dt.timedelta(days=self.retention_days)).isoformat()
+        removed = []
+        for part_dir in self.directory.glob("date=*"):
+            day = part_dir.name[len("date="):]
+            if day < cutoff:
+                shutil.rmtree(part_dir, ignore_errors=True)
+                self._writers.pop(day, None)
+                removed.append(day)
+        return sorted(removed)
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self._stats, pending=self._queue.qsize())
+
+    def dataset(self) -> ds.Dataset:
+        # Explicit schema: parts written before a column was added read it back as nulls
+        schema = pa.Schema.from_pandas(rows_to_frame([]), preserve_index=False).append(pa.field("date", pa.string()))
+        return ds.dataset(self.directory, format="parquet", partitioning=_PARTITIONING, schema=schema)
+
+    def query(
+        self,
+        since: Optional[dt.date] = None,
+        until: Optional[dt.date] = None,
+        columns: Optional[Sequence[str]] = None,
+        limit: Optional[int] = None,
+    ) -> pd.DataFrame:
+        """
+        Rows written between ``since`` and ``until`` (inclusive days), newest last.
+        Only matching day partitions are opened and only ``columns`` are read;
+        ``limit`` keeps the last ``limit`` rows.
+        """
+        columns = list(columns or ANALYTICS_COLUMNS)
+        read = columns if "timestamp" in columns else columns + ["timestamp"]
+        expr = None
+        if since is not None:
+            expr = ds.field("date") >= since.isoformat()
+        if until is not None:
+            cond = ds.field("date") <= until.isoformat()
+            expr = cond if expr is None else expr & cond
+        try:
+            table = self.dataset().to_table(columns=read, filter=expr)
+        except (FileNotFoundError, pa.ArrowInvalid):
+            return rows_to_frame([])[columns]
+        if table.num_rows:
+            table = table.sort_by("timestamp")
+        if limit is not None:
+            table = table.slice(max(0, table.num_rows - limit))
+        return _typed(table.select(columns).to_pandas(), columns)
+
+    def export(self, path: os.PathLike, since: Optional[dt.date] = None, until: Optional[dt.date] = None) -> Path:
+        """Write the selected rows to one ``.csv``, ``.arrow``/``.feather`` or ``.parquet`` file."""
+        path = Path(path)
+        df = self.query(since, until)
+        suffix = path.suffix.lower()
+        if suffix == ".csv":
+            df.to_csv(path, index=False)
+        elif suffix in (".arrow", ".feather"):
+            df.to_feather(path, compression=self.compression)
+        else:
+            df.to_parquet(path, index=False, compression=self.compression)
+        return path
+
+
+def _typed(df: pd.DataFrame, columns: Sequence[str]) -> pd.DataFrame:
+    schema = rows_to_frame([]).dtypes
+    return df.astype({c: schema[c] for c in columns if c in schema.index})
+
+
+_sink: Optional[AnalyticsSink] = None
+_sink_ready = False
+_sink_lock = threading.Lock()
+
+
+def get_sink() -> Optional[AnalyticsSink]:
+    """
+    The process-wide sink, created on first use; None when disabled or the directory is unusable.
+    It is closed at interpreter exit, so rows still queued are written rather than lost on a restart.
+    """
+    global _sink, _sink_ready
+    if _sink_ready:
+        return _sink
+    with _sink_lock:
+        if not _sink_ready:
+            directory = default_dir()
+            if directory is not None:
+                try:
+                    _sink = AnalyticsSink(directory)
+                except OSError:
+                    _sink = None
+                else:
+                    atexit.register(_sink.close, EXIT_FLUSH_TIMEOUT)
+            _sink_ready = True
+    return _sink
@@ -0,0 +1,115 @@
+"""
+Bounded, column-oriented store for the per-session analytics rows.
+
+Rows are buffered and sealed into typed DataFrame chunks of ``chunk_size`` rows,
+so a long-lived session never rebuilds a frame from a growing list of dicts.
+Once more than ``max_rows`` rows are held, the oldest chunks are either spilled
+to a Parquet dataset (``spill_dir``) or dropped. The full DataFrame and the CSV
+bytes are only built when asked for, and reuse per-chunk work between calls.
+The spill directory belongs to the store: it is deleted when the store is
+garbage-collected (e.g. its Streamlit session ended) or at interpreter exit.
+"""
+
+from __future__ import annotations
+import os
+import shutil
+import weakref
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from analytics.rows import ANALYTICS_COLUMNS, rows_to_frame
+from analytics.writers import ParquetDatasetWriter
+
+MAX_ROWS = int(os.getenv("INTELLIDASH_ANALYTICS_MAX_ROWS", "5000"))
+CHUNK_ROWS = int(os.getenv("INTELLIDASH_ANALYTICS_CHUNK_ROWS", "256"))
+
+
+def _csv(df: pd.DataFrame, header: bool = False) -> bytes:
+    return df.to_csv(index=False, header=header).encode("utf-8")
+
+
+class AnalyticsStore:
+    def __init__(self, max_rows: int = MAX_ROWS, chunk_size: int = CHUNK_ROWS, spill_dir: Optional[os.PathLike] = None):
+        self.max_rows = max_rows
+        self.chunk_size = max(1, min(chunk_size, max_rows))
+        self._buffer: List[Dict[str, Any]] = []
+        self._chunks: List[pd.DataFrame] = []
+        self._chunk_csv: List[Optional[bytes]] = []
+        self._spill = ParquetDatasetWriter(spill_dir) if spill_dir else None
+        if self._spill is not None:
+            weakref.finalize(self, shutil.rmtree, self._spill.directory, True)
+        self.spilled_rows = 0
+        self.dropped_rows = 0
+        self._frame: Optional[pd.DataFrame] = None
+        self._csv_bytes: Optional[bytes] = None
+
+    def __len__(self) -> int:
+        """Rows held in memory."""
+        return sum(len(c) for c in self._chunks) + len(self._buffer)
+
+    @property
+    def total_rows(self) -> int:
+        """Rows in memory plus rows spilled to disk."""
+        return len(self) + self.spilled_rows
+
+    def append(self, row: Dict[str, Any]) -> None:
+        self._buffer.append({col: row.get(col) for col in ANALYTICS_COLUMNS})
+        if len(self._buffer) >= self.chunk_size:
+            self._seal()
+        while len(self) > self.max_rows:
+            if not self._chunks:
+                self._seal()
+            oldest = self._chunks.pop(0)
+            self._chunk_csv.pop(0)
+            if self._spill is not None:
+                self._spill.write_frame(oldest)
+                self.spilled_rows += len(oldest)
+            else:
+                self.dropped_rows += len(oldest)
+        self._frame = None
+        self._csv_bytes = None
+
+    def _seal(self) -> None:
+        if self._buffer:
+            self._chunks.append(rows_to_frame(self._buffer))
+            self._chunk_csv.append(None)
+            self._buffer = []
+
+    def frame(self) -> pd.DataFrame:
+        """All in-memory rows as one typed DataFrame (rebuilt only after new rows)."""
+        if self._frame is None:
+            parts = self._chunks + ([rows_to_frame(self._buffer)] if self._buffer else [])
+            self._frame = pd.concat(parts, ignore_index=True) if parts else rows_to_frame([])
+        return self._frame
+
+    def tail(self, n: int) -> pd.DataFrame:
+        """The last ``n`` rows, without concatenating the whole store."""
+        parts, have = [], 0
+        if self._buffer:
+            parts.append(rows_to_frame(self._buffer[-n:]))
+            have = len(parts[0])
+        for chunk in reversed(self._chunks):
+            if have >= n:
+                break
+            parts.append(chunk.iloc[-(n - have):])
+            have += len(parts[-1])
+        return pd.concat(parts[::-1], ignore_index=True) if parts else rows_to_frame([])
+
+    def csv_bytes(self) -> bytes:
+        """
+        CSV of every row, spilled ones included. Sealed chunks are encoded once
+        and reused, so repeated downloads only encode the rows added since.
+        """
+        if self._csv_bytes is None:
+            out = [_csv(rows_to_frame([]), header=True)]
+            if self._spill is not None and self.spilled_rows:
+                out.append(_csv(pd.read_parquet(self._spill.directory)))
+            for i, chunk in enumerate(self._chunks):
+                if self._chunk_csv[i] is None:
+                    self._chunk_csv[i] = _csv(chunk)
+                out.append(self._chunk_csv[i])
+            if self._buffer:
+                out.append(_csv(rows_to_frame(self._buffer)))
+            self._csv_bytes = b"".join(out)
+        return self._csv_bytes
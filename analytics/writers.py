@@ -0,0 +1,73 @@
+"""
+Append-only writers that stream analytics rows to disk in batches.
+
+``CsvRowWriter`` appends to a single CSV file; ``ParquetDatasetWriter`` adds one
+compressed part file per batch to a directory, which pandas/pyarrow read back
+as a single dataset. Both write the fixed analytics schema, so files from
+different runs line up.
+"""
+
+from __future__ import annotations
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pandas as pd
+
+from analytics.rows import rows_to_frame
+
+
+class CsvRowWriter:
+    def __init__(self, path: os.PathLike):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        header = not self.path.exists() or self.path.stat().st_size == 0
+        with open(self.path, "a", newline="", encoding="utf-8") as f:
+            rows_to_frame(rows).to_csv(f, header=header, index=False)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def close(self) -> None:
+        pass
+
+
+class ParquetDatasetWriter:
+    """
+    Numbered part files ``<prefix>-NNNNN.parquet``, continuing after the highest
+    existing number. Writers in different processes sharing a directory need
+    distinct prefixes, or one can replace the other's part.
+    """
+
+    def __init__(self, directory: os.PathLike, compression: str = "zstd", prefix: str = "part"):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.compression = compression
+        self.prefix = prefix
+        part_re = re.compile(rf"{re.escape(prefix)}-(\d+)\.parquet$")
+        existing = [int(m.group(1)) for p in self.directory.iterdir() if (m := part_re.match(p.name))]
+        self._next = max(existing, default=-1) + 1
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        if rows:
+            self.write_frame(rows_to_frame(rows))
+
+    def write_frame(self, df: pd.DataFrame) -> None:
+        """Write an already typed analytics frame as the next part."""
+        final = self.directory / f"{self.prefix}-{self._next:05d}.parquet"
+        tmp = self.directory / f".{final.name}.tmp"  # dot-files are skipped by dataset readers
+        df.to_parquet(tmp, index=False, compression=self.compression)
+        os.replace(tmp, final)  # readers never see a half-written part
+        self._next += 1
+
+    def close(self) -> None:
+        pass
+
+
+def open_writer(path: os.PathLike):
+    """CSV writer for ``*.csv`` paths, Parquet dataset writer for anything else."""
+    return CsvRowWriter(path) if str(path).lower().endswith(".csv") else ParquetDatasetWriter(path)
@@ -1,23 +1,57 @@
 import datetime as dt
+import os
+import uuid
 from typing import List
 import requests
 import pandas as pd
-import numpy as np
 import streamlit as st
 import altair as alt
 
 from datetime import datetime
-from services.weather import geocode_city, get_weather
-from services.wiki import search_pages, get_summary, infer_entity_type_from_pages
+from services.weather import geocode_city, get_weather, compare_cities
+from services.wiki import search_pages, iter_summaries
 from services.news import search_hn
-from services.forex import convert_currency, get_timeseries, get_common_currencies
-from intelligence.nlp import rake_keywords, textrank_summarize, tiny_sentiment
+from services.forex import (
+    HISTORY_RANGES, convert_currency, downsample, get_common_currencies, get_panel, get_timeseries, ohlc,
+    rolling_stats,
+)
+from services.aggregate import iter_smart_aggregate
+from services.cache import TTL_SECONDS, cache_stats, init_disk_cache
+from services.http_client import coalescing_stats
+from services.metrics import REGISTRY, render_prometheus, start_metrics_server
+from services.prefetch import HISTORY, get_refresher
+from intelligence.nlp import analyze, score_many
+from analytics.rows import build_analytics_row
+from analytics.store import AnalyticsStore
+from analytics.sink import get_sink
 
 st.set_page_config(page_title="IntelliDash", page_icon="🧠", layout="wide")
 
+# Open the on-disk response cache and warm memory from it (no-op after the first run in this process)
+init_disk_cache()
+# Prometheus /metrics endpoint when INTELLIDASH_METRICS_PORT is set (once per process)
+start_metrics_server()
+
+
+def recent_queries() -> List[str]:
+    """Queries of the last week's analytics rows from all sessions, oldest first."""
+    sink = get_sink()
+    if sink is None:
+        return []
+    since = dt.date.today() - dt.timedelta(days=7)
+    return sink.query(since=since, columns=["query"], limit=HISTORY)["query"].dropna().tolist()
+
+
+# Keeps the most frequent searches cached ahead of expiry (started once per process)
+get_refresher(seed=recent_queries)
+
 # --- Analytics storage in session state (for CSV download) ---
-if "analytics_rows" not in st.session_state:
-    st.session_state["analytics_rows"] = []
+# Bounded columnar store; with INTELLIDASH_ANALYTICS_SPILL_DIR set, old rows go to Parquet instead of being dropped
+if "analytics_store" not in st.session_state:
+    spill_root = os.getenv("INTELLIDASH_ANALYTICS_SPILL_DIR")
+    st.session_state["analytics_store"] = AnalyticsStore(
+        spill_dir=os.path.join(spill_root, uuid.uuid4().hex) if spill_root else None,
+    )
 
 st.title("🧠 IntelliDash — Intelligent Multi-Source Dashboard")
 st.caption("Open-source GUI pulling data from Open-Meteo, Wikipedia, Hacker News and exchangerate.host, with light NLP.")
@@ -38,242 +72,206 @@ with st.sidebar:
     max_news = st.slider("Max news results", 5, 30, 10, step=5)
     max_wiki = st.slider("Max wiki results", 3, 10, 5, step=1)
     max_sum_sent = st.slider("Summary sentences", 1, 6, 3, step=1)
-
-
-def smart_aggregate(query: str, max_news: int, max_wiki: int) -> dict:
-    out = {
-        "news": [],
-        "wiki": [],
-        "weather": None,
-        "fx": None,
-        "geo": None,
-        "errors": [],
-        "query_type": "Abstract"
-     }
-    if not query:
-        return out
-    # Wiki
-    try:
-        wp = search_pages(query, limit=max_wiki)
-        out["wiki"] = wp
-        # NEW: infer if the top page looks like a place/person/etc.
-        out["query_type"] = infer_entity_type_from_pages(wp)
-    except Exception as e:
-        out["errors"].append(f"wiki: {e}")
-    # News
-    try:
-        hn = search_hn(query, hits_per_page=max_news)
-        out["news"] = hn
-    except Exception as e:
-        out["errors"].append(f"news: {e}")
-    # Geo/weather si parece ciudad
-    try:
-        if out["query_type"] == "place":
-            g = geocode_city(query)
-            if g:
-                out["geo"] = g
-                w = get_weather(g["latitude"], g["longitude"])
-                out["weather"] = w
-    except Exception as e:
-        out["errors"].append(f"weather: {e}")
-    # --- FX: only when query is like "USD-EUR" ---
-    try:
-        base = target = None
-
-        # Normalize query: strip spaces and uppercase
-        q_norm = query.strip().upper()
-
-        # Expect exactly "XXX-YYY"
-        if "-" in q_norm:
-            parts = [p.strip() for p in q_norm.split("-")]
-            if len(parts) == 2 and all(len(p) == 3 and p.isalpha() for p in parts):
-                base, target = parts
-
-        if base and target:
-            fx_resp = convert_currency(1.0, base, target)
-            # fx_resp is the raw API JSON from exchangerate.host
-            # we only care about the numeric result here
-            if fx_resp and "result" in fx_resp:
-                out["fx"] = {
-                    "base": base,
-                    "target": target,
-                    "result": fx_resp["result"],
-                }
-
-    except Exception as e:
-        out["errors"].append(f"fx: {e}")
-
-    return out
+    lazy_tabs = st.checkbox(
+        "Load tabs on demand", value=True,
+        help="Wikipedia/News/Weather/FX tabs only fetch data once you open them with their Load button.",
+    )
+
+    cs = cache_stats()
+    st.caption(
+        f"API cache: {cs['hits']} hits / {cs['disk_hits']} disk hits / {cs['misses']} misses, "
+        f"{cs['entries']} entries ({cs['bytes'] / 1024:.0f} KiB), {cs['disk_entries']} on disk, "
+        f"{sum(cs['revalidated'].values())} served stale while refreshing"
+    )
+    coalesced = sum(c["coalesced"] for c in coalescing_stats().values())
+    st.caption(f"Identical in-flight API requests coalesced: {coalesced}")
+
+    with st.expander("Latency by function"):
+        latency = pd.DataFrame(REGISTRY.latency_summary())
+        if latency.empty:
+            st.caption("No calls recorded yet.")
+        else:
+            st.dataframe(
+                (latency.set_index("fn")[["count", "p50", "p99"]] * [1, 1000, 1000]).round(1)
+                .rename(columns={"p50": "p50 ms", "p99": "p99 ms"}),
+                use_container_width=True,
+            )
+        st.download_button("Download metrics (Prometheus text)", render_prometheus(),
+                           file_name="intellidash_metrics.txt", mime="text/plain", key="download_metrics")
 
 
 import time
-from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # ... (imports)
 
+ANALYTICS_TABLE_ROWS = 200
+
+
 # --- NEW: helper to log analytics rows for CSV download ---
 def add_analytics_row(raw_query: str, res: dict) -> None:
     """
     Take the aggregated smart search result and store a flat row
-    that can later be downloaded as CSV.
-    Now logs ALL queries, with extra fields for weather, news, wiki, etc.
+    that can later be downloaded as CSV (see analytics/rows.py for the fields).
+    The row also goes to the process-wide sink shared by all sessions.
     """
-    query_type = res.get("query_type", "Abstract")
-    geo = res.get("geo")
-    weather = res.get("weather")
-    wiki_pages = res.get("wiki") or []
-    news_hits = res.get("news") or []
-    
-    # Execution time (injected into res by the caller)
-    exec_time = res.get("execution_time", 0.0)
-
-    # Weather details
-    cur = {}
-    daily = {}
-    if weather:
-        cur = weather.get("current_weather", {}) or {}
-        daily = weather.get("daily", {}) or {}
-
-    # Extract daily metrics (arrays -> single value)
-    def get_daily_val(key):
-        vals = daily.get(key)
-        return vals[0] if vals else None
-
-    # Top wiki page
-    top_wiki = wiki_pages[0] if wiki_pages else {}
-    wiki_title = top_wiki.get("title")
-    # Wiki summary length (from the summary extract we might have fetched, 
-    # but 'res' only has the search results list usually. 
-    # The actual summary text is fetched in 'section_wiki' or 'smart_aggregate' logic?
-    # Wait, smart_aggregate only calls search_pages. It doesn't fetch summaries.
-    # The UI fetches summaries. We can only log what's in 'res' or 'top_wiki'.
-    # 'search_pages' returns {title, ...}. It doesn't have the full text.
-    # We'll skip summary length for now unless we fetch it here, which might be slow.
-    # Let's just log the title length as a proxy or skip it. 
-    # Actually, let's stick to what we have efficiently.
-    
-    # News metrics
-    total_points = sum(h.get("points", 0) or 0 for h in news_hits)
-    total_comments = sum(h.get("num_comments", 0) or 0 for h in news_hits)
-    
-    # Unique sources
-    domains = set()
-    for h in news_hits:
-        u = h.get("url") or h.get("story_url")
-        if u:
-            try:
-                domains.add(urlparse(u).netloc)
-            except:
-                pass
-    news_sources_count = len(domains)
-
-    # Sentiment
-    sentiments = []
-    pos_count = 0
-    neg_count = 0
-    for h in news_hits:
-        title = h.get("title") or ""
-        if title:
-            s = tiny_sentiment(title)
-            sentiments.append(s)
-            if s > 0:
-                pos_count += 1
-            elif s < 0:
-                neg_count += 1
-    avg_sentiment = float(np.mean(sentiments)) if sentiments else None
-
-    row = {
-        "timestamp": datetime.now().isoformat(timespec="seconds"),
-        "query": raw_query,
-        "query_type": query_type,
-        "execution_time_sec": round(exec_time, 4),
-        
-        # Geo
-        "place_name": geo.get("name") if geo else None,
-        "country": geo.get("country_code") if geo else None,
-        "latitude": geo.get("latitude") if geo else None,
-        "longitude": geo.get("longitude") if geo else None,
-        
-        # Weather
-        "temperature_c": cur.get("temperature"),
-        "windspeed_ms": cur.get("windspeed"),
-        "wind_direction": cur.get("winddirection"),
-        "is_day": cur.get("is_day"),
-        "weather_code": cur.get("weathercode"),
-        "daily_max_temp": get_daily_val("temperature_2m_max"),
-        "daily_min_temp": get_daily_val("temperature_2m_min"),
-        "daily_precip_sum": get_daily_val("precipitation_sum"),
-        "daily_uv_index": get_daily_val("uv_index_max"),
-
-        # Wiki
-        "wiki_title": wiki_title,
-        
-        # News
-        "news_count": len(news_hits),
-        "avg_news_sentiment": avg_sentiment,
-        "positive_news_count": pos_count,
-        "negative_news_count": neg_count,
-        "total_news_points": total_points,
-        "total_news_comments": total_comments,
-        "news_sources_count": news_sources_count,
-    }
-
-    st.session_state["analytics_rows"].append(row)
-
-
+    row = build_analytics_row(raw_query, res)
+    st.session_state["analytics_store"].append(row)
+    sink = get_sink()
+    if sink is not None:
+        sink.submit(row)
+    refresher = get_refresher()
+    if refresher is not None:
+        refresher.record(raw_query, max_news, max_wiki)
+
+
+
+
+# --- Per-session memo so reruns only refetch a section when its inputs change ---
+# Cache source whose TTL bounds each memoized section, so an open session picks up refreshed data
+MEMO_TTL_SOURCES = {
+    "wiki.pages": "wiki.search",
+    "wiki.cards": "wiki.summary",
+    "news.hits": "news.search",
+    "weather.geo": "weather.geocode",
+    "weather.forecast": "weather.forecast",
+    "weather.compare": "weather.forecast",
+    "fx.timeseries": "forex.timeseries",
+    "fx.panel": "forex.timeseries",
+}
+
+
+def memo_get(name: str, inputs: tuple):
+    """Return (True, value) if section ``name`` was computed for ``inputs`` in this session and has not expired."""
+    hit = st.session_state.setdefault("section_memo", {}).get(name)
+    if hit is not None and hit[0] == inputs and time.time() < hit[2]:
+        return True, hit[1]
+    return False, None
+
+
+def memo_set(name: str, inputs: tuple, value) -> None:
+    source = MEMO_TTL_SOURCES.get(name)
+    ttl = TTL_SECONDS[source] if source else float("inf")
+    ttl = ttl() if callable(ttl) else ttl
+    st.session_state.setdefault("section_memo", {})[name] = (inputs, value, time.time() + ttl)
+
+
+def section_memo(name: str, inputs: tuple, compute):
+    """Compute ``compute()`` once per distinct ``inputs`` for this session (failures are retried)."""
+    hit, value = memo_get(name, inputs)
+    if not hit:
+        value = compute()
+        if value is not None:
+            memo_set(name, inputs, value)
+    return value
+
+
+def open_section(name: str, label: str) -> bool:
+    """In lazy mode, only run a tab's section after the user has opened it once this session."""
+    opened = st.session_state.setdefault("opened_sections", set())
+    if not lazy_tabs or name in opened:
+        return True
+    if st.button(label, key=f"open_{name}"):
+        opened.add(name)
+        return True
+    return False
+
+
+@st.cache_resource
+def nlp_pool() -> ThreadPoolExecutor:
+    """Worker pool for per-page NLP, shared by all sessions of this process."""
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="nlp")
+
+
+def wiki_page_nlp(extract: str, max_sum_sent: int):
+    # One tokenization feeds both; memoized by content, so reruns reuse it
+    doc = analyze(extract)
+    return doc.keywords(top_k=8), doc.summary(max_sentences=max_sum_sent)
+
+
+def wiki_card_events(titles, max_sum_sent: int):
+    """Yield ("summary", title, summ) as summaries arrive, then ("nlp", title, (kws, sents)) as NLP finishes."""
+    pending = {}
+    for title, summ in iter_summaries(titles):
+        yield "summary", title, summ
+        extract = (summ or {}).get("extract", "")
+        if extract:
+            pending[nlp_pool().submit(wiki_page_nlp, extract, max_sum_sent)] = title
+    for fut in as_completed(pending):
+        yield "nlp", pending[fut], fut.result()
 
 
 def section_wiki(query: str, max_wiki: int, max_sum_sent: int):
     st.subheader("📚 Wikipedia")
-    pages = search_pages(query, limit=max_wiki)
+    pages = section_memo("wiki.pages", (query, max_wiki), lambda: search_pages(query, limit=max_wiki))
     if not pages:
         st.info("No results.")
         return
+    # Lay out every expander up front, then fill each one as its summary/NLP arrives
     cols = st.columns(2)
+    slots = {}
     for i, p in enumerate(pages):
         title = p.get("title")
         with cols[i % 2]:
             with st.expander(f"{title}"):
-                summ = get_summary(title)
-                if not summ:
+                if not title:
                     st.write("No summary available.")
                     continue
-                extract = summ.get("extract", "")
-                st.write(extract)
-                if extract:
-                    st.markdown("**Keywords**")
-                    kws = rake_keywords(extract, top_k=8)
-                    st.write(", ".join(k for k, _ in kws))
-                    st.markdown("**Auto-Summary**")
-                    sum_sents = textrank_summarize(extract, max_sentences=max_sum_sent)
-                    st.write(" ".join(sum_sents))
+                slots.setdefault(title, []).append((st.empty(), st.empty()))
+                slots[title][-1][0].caption("Loading…")
+
+    # First run streams live results; reruns with the same inputs replay the recorded ones
+    # the pages are part of the inputs: recorded cards only fit the expanders laid out above
+    inputs = (query, max_wiki, max_sum_sent, tuple(slots))
+    replay, events = memo_get("wiki.cards", inputs)
+    if not replay:
+        events = []
+    for kind, title, payload in (events if replay else wiki_card_events(slots, max_sum_sent)):
+        if not replay:
+            events.append((kind, title, payload))
+        for text_slot, nlp_slot in slots[title]:
+            if kind == "summary":
+                text_slot.write((payload or {}).get("extract", "") if payload else "No summary available.")
+                continue
+            kws, sum_sents = payload
+            with nlp_slot.container():
+                st.markdown("**Keywords**")
+                st.write(", ".join(k for k, _ in kws))
+                st.markdown("**Auto-Summary**")
+                st.write(" ".join(sum_sents))
+    if not replay:
+        memo_set("wiki.cards", inputs, events)
 
 
 def section_news(query: str, max_news: int):
     st.subheader("🗞️ Hacker News (Algolia)")
-    hits = search_hn(query, hits_per_page=max_news)
+    hits = section_memo("news.hits", (query, max_news), lambda: search_hn(query, hits_per_page=max_news))
     if not hits:
         st.info("No results.")
         return
-    for h in hits:
+    titles = tuple(h.get("title") or "" for h in hits)
+    scores = section_memo(
+        "news.sentiment", (query, max_news, titles),
+        lambda: score_many([h.get("title") or "" for h in hits]),
+    )
+    for h, s in zip(hits, scores):
         title = h.get("title")
         url = h.get("url") or h.get("story_url")
         txt = f"{title} — {url or ''}"
         st.markdown(f"- {txt}")
         if title:
-            s = tiny_sentiment(title)
             st.caption(f"Sentiment score: {s:+.2f}")
 
 
 def section_weather(query: str):
     st.subheader("⛅ Weather (Open-Meteo)")
-    g = geocode_city(query)
+    g = section_memo("weather.geo", (query,), lambda: geocode_city(query))
     if not g:
         st.info("Enter a city name to fetch weather.")
         return
 
     st.caption(f"Location resolved: {g.get('name')}, {g.get('country_code')} (lat {g.get('latitude')}, lon {g.get('longitude')})")
-    w = get_weather(g["latitude"], g["longitude"])
+    w = section_memo("weather.forecast", (query,), lambda: get_weather(g["latitude"], g["longitude"]))
     if not w:
         st.warning("Could not load weather.")
         return
@@ -334,6 +332,61 @@ def section_weather(query: str):
         st.line_chart(df)
 
 
+WEATHER_COMPARE_VARIABLES = {
+    "temperature_2m": "Temperature (°C)",
+    "relative_humidity_2m": "Relative humidity (%)",
+    "precipitation": "Precipitation (mm)",
+    "cloud_cover": "Cloud cover (%)",
+    "wind_speed_10m": "Wind speed (km/h)",
+}
+
+
+def section_weather_compare(cities_raw: str):
+    st.subheader("⛅ Compare cities (Open-Meteo)")
+    names = tuple(dict.fromkeys(c.strip() for c in cities_raw.replace("\n", ",").split(",") if c.strip()))
+    if not names:
+        st.info("Enter a few city names to compare.")
+        return
+
+    # One concurrent geocoding pass + batched multi-location forecast requests
+    df = section_memo("weather.compare", (names,), lambda: compare_cities(names))
+    if df is None or df.empty:
+        st.warning("Could not load weather for these cities.")
+        return
+    missing = [n for n in names if n not in set(df["city"])]
+    if missing:
+        st.caption("Not found: " + ", ".join(missing))
+
+    variable = st.selectbox("Variable", list(WEATHER_COMPARE_VARIABLES), format_func=WEATHER_COMPARE_VARIABLES.get)
+    chart = (
+        alt.Chart(df[["city", "time", variable]])
+        .mark_line()
+        .encode(
+            x=alt.X("time:T", title="Time (UTC)"),
+            y=alt.Y(f"{variable}:Q", title=WEATHER_COMPARE_VARIABLES[variable], scale=alt.Scale(zero=False)),
+            color=alt.Color("city:N", title="City"),
+            tooltip=["city:N", "time:T", f"{variable}:Q"],
+        )
+        .properties(height=400)
+    )
+    st.altair_chart(chart, use_container_width=True)
+
+    # Next 24 hours per city, side by side
+    next_day = df[df["time"] < df["time"].min() + pd.Timedelta(hours=24)]
+    summary = next_day.groupby("city", sort=False).agg(
+        country=("country_code", "first"),
+        temp_min=("temperature_2m", "min"),
+        temp_max=("temperature_2m", "max"),
+        precip_total=("precipitation", "sum"),
+        wind_max=("wind_speed_10m", "max"),
+    )
+    st.dataframe(summary.round(1), use_container_width=True)
+
+
+# Points sent per FX chart: about one per pixel of a full-width chart
+FX_CHART_WIDTH_PX = 800
+
+
 def section_fx():
     st.subheader("💱 FX Converter)")
 
@@ -359,71 +412,162 @@ def section_fx():
             st.caption(f"Exchange rate: 1 {base} = {js['rate']:.4f} {target}")
 
     # Histórico
-    st.markdown("### 📈 Exchange Rate (Last 7 Days)")
-    df = get_timeseries(base, target, days=7)
+    h1, h2 = st.columns([3, 2])
+    with h1:
+        span = st.radio("History", list(HISTORY_RANGES), index=0, horizontal=True, key="fx_range")
+    with h2:
+        style = st.radio("Chart", ["Line", "Candles"], horizontal=True, key="fx_chart_style")
+    days = HISTORY_RANGES[span]
+    title = f"📈 Exchange Rate (Last {span})"
+    st.markdown(f"### {title}")
+    df = section_memo("fx.timeseries", (base, target, days), lambda: get_timeseries(base, target, days=days))
     if df is not None and not df.empty:
-        chart = (
-           alt.Chart(df.reset_index())
-           .mark_line(point=True, color="#4B9CD3")
-           .encode(
-               x=alt.X("date:T", title="Date"),
-               y=alt.Y("rate:Q", title=f"Exchange Rate ({base} → {target})", scale=alt.Scale(zero=False)),
-               tooltip=[
-                   alt.Tooltip("date:T", title="Date"),
-                   alt.Tooltip("rate:Q", title=f"Rate ({base}/{target})", format=".4f"),
-               ],
-           )
-           .properties(title="📈 Exchange Rate (Last 7 Days)", width="container", height=300)
-           .interactive()
-          )
+        # Stats on the full series, then only about one point per pixel goes to the browser
+        stats = rolling_stats(df)
+        m1, m2, m3 = st.columns(3)
+        m1.metric("Last", f"{stats['rate'].iloc[-1]:.4f}")
+        m2.metric(f"Change ({span})", f"{stats['cum_return'].iloc[-1]:+.2%}")
+        vol = stats["volatility"].iloc[-1]
+        m3.metric("Volatility (20d, annualized)", f"{vol:.1%}" if pd.notna(vol) else "—")
+
+        if style == "Candles":
+            bars = ohlc(stats, FX_CHART_WIDTH_PX).reset_index()
+            base_chart = alt.Chart(bars).encode(x=alt.X("date:T", title="Date"))
+            chart = alt.layer(
+                base_chart.mark_rule().encode(
+                    y=alt.Y("low:Q", title=f"Exchange Rate ({base} → {target})", scale=alt.Scale(zero=False)),
+                    y2="high:Q",
+                ),
+                base_chart.mark_bar().encode(
+                    y="open:Q",
+                    y2="close:Q",
+                    color=alt.condition("datum.open <= datum.close", alt.value("#2E8B57"), alt.value("#C0392B")),
+                    tooltip=[alt.Tooltip("date:T", title="Period")]
+                    + [alt.Tooltip(f"{c}:Q", format=".4f") for c in ("open", "high", "low", "close")],
+                ),
+            )
+        else:
+            points = downsample(stats, FX_CHART_WIDTH_PX).reset_index()
+            lines = points.melt(
+                id_vars="date", value_vars=["rate", "sma_20", "sma_50"], var_name="series", value_name="value"
+            ).dropna()
+            chart = (
+               alt.Chart(lines)
+               .mark_line(point=days <= 31)
+               .encode(
+                   x=alt.X("date:T", title="Date"),
+                   y=alt.Y("value:Q", title=f"Exchange Rate ({base} → {target})", scale=alt.Scale(zero=False)),
+                   color=alt.Color("series:N", title=None),
+                   tooltip=[
+                       alt.Tooltip("date:T", title="Date"),
+                       alt.Tooltip("series:N"),
+                       alt.Tooltip("value:Q", title=f"Rate ({base}/{target})", format=".4f"),
+                   ],
+               )
+            )
+        chart = chart.properties(title=title, width="container", height=300).interactive()
         st.altair_chart(chart, use_container_width=True)
     else:
         st.warning("No historical data available.")
 
+    with st.expander(f"All currencies vs {base} (Last {span})"):
+        panel = section_memo("fx.panel", (base, days), lambda: get_panel(base, currencies, days))
+        if panel is not None and not panel.empty:
+            # Rebased to 100 at the first fix, each currency reduced to the chart width on its own
+            rebased = panel / panel.bfill().iloc[0] * 100
+            long = pd.concat(
+                downsample(rebased[[c]].rename(columns={c: "value"}), FX_CHART_WIDTH_PX, column="value").assign(currency=c)
+                for c in rebased.columns
+            ).reset_index()
+            chart = (
+                alt.Chart(long)
+                .mark_line()
+                .encode(
+                    x=alt.X("date:T", title="Date"),
+                    y=alt.Y("value:Q", title=f"Value of 1 {base} (start = 100)", scale=alt.Scale(zero=False)),
+                    color=alt.Color("currency:N", title="Currency"),
+                    tooltip=["currency:N", alt.Tooltip("date:T", title="Date"), alt.Tooltip("value:Q", format=".1f")],
+                )
+                .properties(width="container", height=350)
+                .interactive()
+            )
+            st.altair_chart(chart, use_container_width=True)
+        else:
+            st.info("No historical data available.")
 
-# Tabs
-tab1, tab2, tab3, tab4, tab5 = st.tabs(["Smart Search", "Wikipedia", "News", "Weather", "FX Converter"])
 
-with tab1:
-    st.header("🔎 Smart Search (multi-source + summarize)")
-    st.write("Enter a query in the sidebar and press **Run Smart Search**.")
-    if run_all and q:
-        t0 = time.time()
-        res = smart_aggregate(q, max_news, max_wiki)
-        t1 = time.time()
-        res["execution_time"] = t1 - t0
-        
-        query_type = res.get("query_type", "Abstract")
-        st.caption(f"Detected query type: **{query_type}**")
-        if res["errors"]:
-            st.warning("Some sources had errors: " + "; ".join(res["errors"]))
-        if res["wiki"]:
+def render_smart_panel(slot, source: str, res: dict, max_sum_sent: int) -> bool:
+    """Draw one Smart Search panel into its placeholder; return True if it had content."""
+    if source == "wiki" and res["wiki"]:
+        with slot.container():
             st.subheader("Top Wiki Page")
             top = res["wiki"][0]
             title = top.get("title")
             st.markdown(f"**{title}**")
-            summ = get_summary(title) or {}
+            summ = res["summaries"].get(title) or {}
             extract = summ.get("extract", "")
             if extract:
                 st.write(extract)
                 st.markdown("**Auto-Summary**")
-                st.write(" ".join(textrank_summarize(extract, max_sentences=max_sum_sent)))
-        if res["news"]:
+                st.write(" ".join(analyze(extract).summary(max_sentences=max_sum_sent)))
+        return True
+    if source == "news" and res["news"]:
+        with slot.container():
             st.subheader("News Highlights")
-            for h in res["news"][:5]:
+            for h, s in zip(res["news"][:5], res["news_sentiment"]):
                 title = h.get("title") or ""
                 url = h.get("url") or h.get("story_url") or ""
                 st.markdown(f"- {title} — {url}")
-        if res["weather"] and res["geo"] and query_type == "place":
+                if title:
+                    st.caption(f"Sentiment score: {s:+.2f}")
+        return True
+    if source == "weather" and res["weather"] and res["geo"] and res.get("query_type") == "place":
+        with slot.container():
             st.subheader("Weather Snapshot")
             cur = res["weather"].get("current_weather", {})
             st.caption(f"{res['geo'].get('name')}, {res['geo'].get('country_code')}")
             st.metric("Temp (°C)", cur.get("temperature"))
             st.metric("Wind (m/s)", cur.get("windspeed"))
-        if res["fx"]:
+        return True
+    if source == "fx" and res["fx"]:
+        with slot.container():
             st.subheader("FX 1-unit Conversion")
             info = res["fx"]
             st.write(f"1 {info['base']} = {info['result']:.4f} {info['target']}")
+        return True
+    return False
+
+
+# Tabs
+tab1, tab2, tab3, tab4, tab5 = st.tabs(["Smart Search", "Wikipedia", "News", "Weather", "FX Converter"])
+
+with tab1:
+    st.header("🔎 Smart Search (multi-source + summarize)")
+    st.write("Enter a query in the sidebar and press **Run Smart Search**.")
+    if run_all and q:
+        # One placeholder per panel, filled as each source streams in
+        status_slot = st.empty()
+        status_slot.caption("Searching…")
+        errors_slot = st.empty()
+        panels = {src: st.empty() for src in ("wiki", "news", "weather", "fx")}
+
+        t0 = time.time()
+        first_content = None
+        res = None
+        for source, res in iter_smart_aggregate(q, max_news, max_wiki):
+            if source == "news":
+                # Score every headline once; the highlights and the analytics row share these
+                res["news_sentiment"] = score_many([h.get("title") or "" for h in res["news"]])
+            if source == "wiki":
+                status_slot.caption(f"Detected query type: **{res['query_type']}**")
+            if res["errors"]:
+                errors_slot.warning("Some sources had errors: " + "; ".join(res["errors"]))
+            if render_smart_panel(panels[source], source, res, max_sum_sent) and first_content is None:
+                first_content = time.time() - t0
+        res["execution_time"] = time.time() - t0
+        res["first_content_time"] = first_content
+        status_slot.caption(f"Detected query type: **{res['query_type']}**")
+        res.setdefault("news_sentiment", score_many([]))
 
         # --- NEW: log this query into analytics + confirm to user ---
         add_analytics_row(q, res)
@@ -432,18 +576,25 @@ with tab1:
     # --- NEW: table + CSV download for analytics ---
     st.markdown("### 📊 Collected data for analytics")
 
-    if st.session_state["analytics_rows"]:
-        analytics_df = pd.DataFrame(st.session_state["analytics_rows"])
-        st.dataframe(analytics_df, use_container_width=True)
-
-        csv_bytes = analytics_df.to_csv(index=False).encode("utf-8")
-        st.download_button(
-            label="Download analytics as CSV",
-            data=csv_bytes,
-            file_name="intellidash_analytics.csv",
-            mime="text/csv",
-            key="download_analytics_csv",
-        )
+    store = st.session_state["analytics_store"]
+    if store.total_rows:
+        # Only the newest rows are rendered; the full table lives in the CSV
+        st.dataframe(store.tail(ANALYTICS_TABLE_ROWS), use_container_width=True)
+        if store.total_rows > ANALYTICS_TABLE_ROWS:
+            st.caption(f"Showing the latest {ANALYTICS_TABLE_ROWS} of {store.total_rows} rows.")
+        if store.dropped_rows:
+            st.caption(f"{store.dropped_rows} oldest rows were dropped to keep the session bounded.")
+
+        # The CSV is encoded only when asked for, and only for that run: later reruns
+        # (e.g. after the next search) do not re-read the spilled rows again
+        if st.button("Prepare CSV download", key="prepare_analytics_csv"):
+            st.download_button(
+                label="Download analytics as CSV",
+                data=store.csv_bytes(),
+                file_name="intellidash_analytics.csv",
+                mime="text/csv",
+                key="download_analytics_csv",
+            )
 
         st.caption(
             "You can open this CSV in Excel/Google Sheets to build graphs, "
@@ -452,18 +603,38 @@ with tab1:
     else:
         st.info("Run Smart Search on a few cities (place queries) to start building the analytics dataset.")
 
+    sink = get_sink()
+    if sink is not None:
+        with st.expander("Queries from all sessions (last 7 days)"):
+            if st.button("Load shared analytics", key="load_shared_analytics"):
+                shared = sink.query(since=dt.date.today() - dt.timedelta(days=7))
+                st.caption(f"{len(shared)} rows written by all sessions; newest rows may take a few seconds to appear.")
+                if not shared.empty:
+                    st.dataframe(shared["query"].value_counts().head(20).rename("searches"), use_container_width=True)
+                    st.dataframe(shared.tail(ANALYTICS_TABLE_ROWS), use_container_width=True)
+
 with tab2:
     query = st.text_input("Search Wikipedia:", value="Artificial intelligence")
-    section_wiki(query, max_wiki, max_sum_sent)
+    if open_section("wiki", "Load Wikipedia results"):
+        section_wiki(query, max_wiki, max_sum_sent)
 
 with tab3:
     query = st.text_input("Search Hacker News:", value="AI")
-    section_news(query, max_news)
+    if open_section("news", "Load news"):
+        section_news(query, max_news)
 
 with tab4:
-    city = st.text_input("City:", value="Barcelona")
-    section_weather(city)
+    weather_mode = st.radio("Mode", ["Single city", "Compare cities"], horizontal=True, key="weather_mode")
+    if weather_mode == "Single city":
+        city = st.text_input("City:", value="Barcelona")
+        if open_section("weather", "Load weather"):
+            section_weather(city)
+    else:
+        cities_raw = st.text_area("Cities (comma or newline separated):", value="Barcelona, Madrid, Paris, London, Berlin")
+        if open_section("weather_compare", "Load comparison"):
+            section_weather_compare(cities_raw)
 
 with tab5:
-    section_fx()
+    if open_section("fx", "Load FX converter"):
+        section_fx()
 
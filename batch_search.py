@@ -0,0 +1,259 @@
+"""
+Headless Smart Search over a file of queries.
+
+Runs smart_aggregate for every query in a JSONL/CSV/text file with bounded
+concurrency and per-host rate limits, and streams the analytics rows (same
+fields as the dashboard's CSV download) to CSV or a Parquet dataset in batches.
+Finished queries are recorded in a checkpoint file, so an interrupted run picks
+up where it stopped when started again with the same arguments. Queries where a
+source timed out are neither written nor checkpointed, so a re-run retries them.
+
+    python batch_search.py cities.csv -o out/cities.parquet --concurrency 8
+    python batch_search.py queries.jsonl --field query -o analytics.csv
+"""
+
+from __future__ import annotations
+import argparse
+import csv
+import functools
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from analytics.rows import build_analytics_row
+from analytics.writers import open_writer
+from services import aggregate, ratelimit
+
+# Requests per second per upstream host unless overridden with --rate HOST=RPS
+DEFAULT_RATES: Dict[str, float] = {
+    "en.wikipedia.org": 10.0,
+    "hn.algolia.com": 5.0,
+    "geocoding-api.open-meteo.com": 5.0,
+    "api.open-meteo.com": 5.0,
+    "api.frankfurter.app": 5.0,
+}
+
+
+def batch_deadlines(concurrency: int, rates: Dict[str, float], max_wiki: int = 5) -> Dict[str, float]:
+    """
+    The UI's per-source deadlines plus the longest a search may wait for rate
+    limit tokens while ``concurrency`` searches run at once: each makes up to
+    ``max_wiki + 2`` calls to one host (Wikipedia search, summaries, classify),
+    counted against the slowest limited host to be safe.
+    """
+    limited = [rps for rps in rates.values() if rps > 0]
+    queued = concurrency * (max_wiki + 2) / min(limited) if limited else 0.0
+    return {source: budget + queued for source, budget in aggregate.SOURCE_DEADLINES.items()}
+
+
+def read_queries(path: os.PathLike, field: str = "query", header: bool = True) -> Iterator[str]:
+    """
+    Yield queries lazily from ``path``: JSONL (``field`` of each object, or a bare
+    JSON string per line), CSV (the ``field`` column, or the first column of a
+    file without a header row when ``header`` is False) or plain text (one query
+    per line). Blank entries are yielded as "" so line numbers stay stable.
+    Raises ``ValueError`` right away when a CSV header has no ``field`` column.
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix == ".csv" and header:
+        _csv_column(path, field)  # fail before any query runs, not halfway through a batch
+    return _iter_queries(path, suffix, field, header)
+
+
+def _csv_column(path: Path, field: str) -> int:
+    with open(path, newline="", encoding="utf-8") as f:
+        names = next(csv.reader(f), None) or []
+    if field not in names:
+        raise ValueError(
+            f"{path}: no {field!r} column in the CSV header {names}; "
+            "choose the column with --field, or pass --no-header for a file without a header row"
+        )
+    return names.index(field)
+
+
+def _iter_queries(path: Path, suffix: str, field: str, header: bool) -> Iterator[str]:
+    with open(path, newline="", encoding="utf-8") as f:
+        if suffix in (".jsonl", ".ndjson", ".json"):
+            for line in f:
+                if not line.strip():
+                    yield ""
+                    continue
+                obj = json.loads(line)
+                yield str(obj.get(field) or "") if isinstance(obj, dict) else str(obj)
+        elif suffix == ".csv":
+            reader = csv.reader(f)
+            col = 0
+            if header:
+                col = _csv_column(path, field)
+                next(reader, None)
+            for rec in reader:
+                yield rec[col] if len(rec) > col else ""
+        else:
+            for line in f:
+                yield line.strip()
+
+
+class Checkpoint:
+    """Indices of finished queries, appended to a text file after each flushed batch."""
+
+    def __init__(self, path: os.PathLike):
+        self.path = Path(path)
+
+    def load(self) -> Set[int]:
+        if not self.path.exists():
+            return set()
+        with open(self.path, encoding="utf-8") as f:
+            return {int(line) for line in f if line.strip()}
+
+    def mark(self, indices: Iterable[int]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(f"{i}\n" for i in indices)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _search(index: int, query: str, max_news: int, max_wiki: int, search: Callable) -> Tuple[int, dict, List[str]]:
+    t0 = time.time()
+    res = search(query, max_news, max_wiki)
+    res["execution_time"] = time.time() - t0
+    timeouts = [e for e in res.get("errors") or [] if "timed out" in e]
+    return index, build_analytics_row(query, res), timeouts
+
+
+def run_batch(
+    queries: Iterable[str],
+    writer,
+    checkpoint: Optional[Checkpoint] = None,
+    concurrency: int = 4,
+    batch_size: int = 100,
+    max_news: int = 10,
+    max_wiki: int = 5,
+    search: Optional[Callable] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> Dict[str, int]:
+    """
+    Run ``search`` for each query with at most ``concurrency`` in flight and write
+    rows in batches of ``batch_size``. Only a bounded window of queries and one
+    batch of rows are held in memory. A row may be written twice if the process
+    dies between writing a batch and checkpointing it. Searches where a source
+    timed out are counted in ``timed_out`` and left for the next run.
+    """
+    search = search or aggregate.smart_aggregate
+    done = checkpoint.load() if checkpoint else set()
+    stats = {"written": 0, "skipped": 0, "failed": 0, "timed_out": 0}
+    buffer, buffer_idx = [], []
+
+    def flush(limit: Optional[int] = None):
+        if buffer:
+            n = len(buffer) if limit is None else min(limit, len(buffer))
+            writer.write(buffer[:n])
+            if checkpoint:
+                checkpoint.mark(buffer_idx[:n])
+            stats["written"] += n
+            del buffer[:n]
+            del buffer_idx[:n]
+            if progress:
+                progress(stats["written"], stats["failed"])
+
+    def collect(futures):
+        for fut in futures:
+            try:
+                index, row, timeouts = fut.result()
+            except Exception as e:
+                stats["failed"] += 1
+                print(f"query #{pending[fut]} failed: {e}", file=sys.stderr)
+            else:
+                if timeouts:
+                    # a partial row would look complete; not checkpointed, so a re-run retries it
+                    stats["timed_out"] += 1
+                    print(f"query #{index} timed out, retry later: {'; '.join(timeouts)}", file=sys.stderr)
+                else:
+                    buffer.append(row)
+                    buffer_idx.append(index)
+            del pending[fut]
+        # several queries can finish at once; still write exactly batch_size rows per part
+        while len(buffer) >= batch_size:
+            flush(batch_size)
+
+    pending = {}
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch-search") as pool:
+        for index, query in enumerate(queries):
+            if index in done or not query.strip():
+                stats["skipped"] += 1
+                continue
+            pending[pool.submit(_search, index, query, max_news, max_wiki, search)] = index
+            if len(pending) >= 2 * concurrency:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(finished)
+    flush()
+    writer.close()
+    return stats
+
+
+def _parse_rate(value: str) -> Tuple[str, float]:
+    host, _, rps = value.partition("=")
+    if not host or not rps:
+        raise argparse.ArgumentTypeError("expected HOST=REQUESTS_PER_SECOND")
+    return host, float(rps)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run Smart Search headlessly over a file of queries.")
+    parser.add_argument("input", help="queries file (.jsonl, .csv or one query per line)")
+    parser.add_argument("-o", "--output", required=True, help="output .csv file or Parquet dataset directory")
+    parser.add_argument("--field", default="query", help="JSON key / CSV column holding the query")
+    parser.add_argument("--no-header", action="store_true", help="the CSV has no header row: queries are in its first column")
+    parser.add_argument("--concurrency", type=int, default=4, help="queries in flight at once")
+    parser.add_argument("--batch-size", type=int, default=100, help="rows per write/checkpoint")
+    parser.add_argument("--max-news", type=int, default=10)
+    parser.add_argument("--max-wiki", type=int, default=5)
+    parser.add_argument("--rate", type=_parse_rate, action="append", default=[],
+                        metavar="HOST=RPS", help="per-host rate limit (repeatable; 0 disables)")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: <output>.checkpoint)")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    args = parser.parse_args(argv)
+    try:
+        queries = read_queries(args.input, args.field, header=not args.no_header)
+    except ValueError as e:
+        parser.error(str(e))
+
+    rates = {**DEFAULT_RATES, **dict(args.rate)}
+    for host, rps in rates.items():
+        ratelimit.set_rate_limit(host, rps)
+    # The UI's deadlines would expire while searches queue for rate limit tokens
+    deadlines = batch_deadlines(args.concurrency, rates, args.max_wiki)
+    # Each search fans out to up to four sources on the shared aggregate pool
+    aggregate.resize_pool(max(16, 4 * args.concurrency))
+
+    checkpoint = Checkpoint(args.checkpoint or f"{args.output.rstrip('/')}.checkpoint")
+    if args.restart and checkpoint.path.exists():
+        checkpoint.path.unlink()
+
+    def progress(written, failed):
+        print(f"{written} rows written, {failed} failed", file=sys.stderr)
+
+    stats = run_batch(
+        queries,
+        open_writer(args.output),
+        checkpoint=checkpoint,
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        max_news=args.max_news,
+        max_wiki=args.max_wiki,
+        search=functools.partial(aggregate.smart_aggregate, deadlines=deadlines),
+        progress=progress,
+    )
+    print(json.dumps(stats))
+    return 1 if stats["failed"] or stats["timed_out"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
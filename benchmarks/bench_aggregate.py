@@ -0,0 +1,102 @@
+"""
+End-to-end smart_aggregate latency and throughput under concurrency, against
+the local stub server (no network).
+
+Run from the repo root:  python -m benchmarks.bench_aggregate [--concurrency 1 8 32] [--latency 0.05]
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Sequence
+
+os.environ.setdefault("INTELLIDASH_CACHE_DIR", "off")  # measure upstream work, not a warm disk cache
+
+import numpy as np
+
+from benchmarks.stub_server import StubServer, point_services_at, restore_services
+from services import aggregate
+from services.cache import clear_cache
+from services.metrics import REGISTRY
+
+
+def make_queries(n: int, fx_every: int = 5) -> List[str]:
+    """Distinct place queries (so each one misses the cache), with an FX pair every ``fx_every``."""
+    return ["USD-EUR" if fx_every and i % fx_every == fx_every - 1 else f"Barcelona {i}" for i in range(n)]
+
+
+def run_load(queries: Sequence[str], concurrency: int, max_news: int = 10, max_wiki: int = 5) -> Dict[str, Any]:
+    """Run every query through smart_aggregate with ``concurrency`` in flight; latency stats in seconds."""
+    def one(q):
+        t0 = time.perf_counter()
+        res = aggregate.smart_aggregate(q, max_news, max_wiki)
+        return time.perf_counter() - t0, len(res["errors"])
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, queries))
+    wall = time.perf_counter() - t0
+    lat = np.array([r[0] for r in results])
+    return {
+        "concurrency": concurrency,
+        "queries": len(queries),
+        "errors": int(sum(r[1] for r in results)),
+        "wall_sec": wall,
+        "throughput_qps": len(queries) / wall,
+        "latency_mean_sec": float(lat.mean()),
+        "latency_p50_sec": float(np.percentile(lat, 50)),
+        "latency_p95_sec": float(np.percentile(lat, 95)),
+        "latency_p99_sec": float(np.percentile(lat, 99)),
+    }
+
+
+def run(concurrency: Sequence[int] = (1, 8, 32), n_queries: int = 200, latency: float = 0.05,
+        jitter: float = 0.02, warm: bool = False) -> List[Dict[str, Any]]:
+    """
+    One result per concurrency level. Cold runs clear the response cache first;
+    ``warm`` repeats the same queries so they are served from memory.
+    """
+    results = []
+    with StubServer(latency, jitter) as server:
+        originals = point_services_at(server.url)
+        try:
+            for c in concurrency:
+                aggregate.resize_pool(max(16, 4 * c))
+                clear_cache()
+                REGISTRY.reset()
+                queries = make_queries(n_queries)
+                if warm:
+                    run_load(queries, c)
+                before = server.requests
+                stats = run_load(queries, c)
+                stats.update(
+                    warm=warm,
+                    upstream_requests=server.requests - before,
+                    stub_latency_sec=latency,
+                    stub_jitter_sec=jitter,
+                    functions={r["fn"]: {k: r[k] for k in ("count", "p50", "p99")} for r in REGISTRY.latency_summary()},
+                )
+                results.append(stats)
+        finally:
+            restore_services(originals)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="stub seconds per upstream response")
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--warm", action="store_true", help="measure cache-warm repeats instead of cold queries")
+    args = parser.parse_args()
+
+    for r in run(args.concurrency, args.queries, args.latency, args.jitter, args.warm):
+        print(json.dumps({k: v for k, v in r.items() if k != "functions"}))
+
+
+if __name__ == "__main__":
+    main()
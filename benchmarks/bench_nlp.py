@@ -0,0 +1,66 @@
+"""
+Microbenchmarks for rake_keywords, textrank_summarize and tiny_sentiment on
+growing text sizes, built from the recorded Wikipedia/HN fixture text.
+
+Run from the repo root:  python -m benchmarks.bench_nlp [--sizes 1000 10000 100000]
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import random
+import timeit
+from typing import Any, Dict, List, Sequence
+
+from benchmarks.stub_server import load_fixture
+from intelligence.nlp import rake_keywords, sentences, textrank_summarize, tiny_sentiment
+
+FUNCTIONS = {
+    "rake_keywords": rake_keywords,
+    "textrank_summarize": textrank_summarize,
+    "tiny_sentiment": tiny_sentiment,
+}
+
+
+def make_text(chars: int, seed: int = 0) -> str:
+    """About ``chars`` characters of shuffled real-shaped sentences (summary extract + HN titles)."""
+    pool = sentences(load_fixture("wiki_summary.json")["extract"])
+    pool += [h["title"] + "." for h in load_fixture("hn_search.json")["hits"]]
+    rng = random.Random(seed)
+    out, size = [], 0
+    while size < chars:
+        s = rng.choice(pool)
+        out.append(s)
+        size += len(s) + 1
+    return " ".join(out)
+
+
+def run(sizes: Sequence[int] = (1_000, 10_000, 100_000), repeat: int = 5) -> List[Dict[str, Any]]:
+    """Best-of-``repeat`` seconds per call, per function and text size."""
+    results = []
+    for chars in sizes:
+        text = make_text(chars)
+        number = max(1, 20_000 // chars)
+        for name, fn in FUNCTIONS.items():
+            best = min(timeit.repeat(lambda: fn(text), number=number, repeat=repeat)) / number
+            results.append({
+                "function": name,
+                "chars": len(text),
+                "sentences": len(sentences(text)),
+                "seconds": best,
+                "chars_per_sec": len(text) / best,
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    for r in run(args.sizes, args.repeat):
+        print(json.dumps(r))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+Per-headline cost of tiny_sentiment vs. the score_many batch API.
+
+Run from the repo root:  python -m benchmarks.bench_sentiment [--n 2000]
+"""
+
+import argparse
+import random
+import timeit
+
+from intelligence.nlp import _NEG_WORDS, _POS_WORDS, score_many, tiny_sentiment
+
+FILLER = "the a new of for in on to with and show hn ask ai startup market data open source".split()
+
+
+def make_headlines(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    vocab = FILLER * 4 + sorted(_POS_WORDS) + sorted(_NEG_WORDS) + ["not", "no", "never"]
+    return [" ".join(rng.choice(vocab) for _ in range(rng.randint(4, 14))).capitalize() for _ in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--n", type=int, default=2000, help="number of headlines")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    headlines = make_headlines(args.n)
+    loop = min(timeit.repeat(lambda: [tiny_sentiment(h) for h in headlines], number=1, repeat=args.repeat))
+    batch = min(timeit.repeat(lambda: score_many(headlines), number=1, repeat=args.repeat))
+    assert score_many(headlines).tolist() == [tiny_sentiment(h) for h in headlines]
+
+    print(f"{args.n} headlines")
+    print(f"tiny_sentiment loop : {loop / args.n * 1e6:8.2f} us/headline")
+    print(f"score_many batch    : {batch / args.n * 1e6:8.2f} us/headline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Run the offline benchmark suite and write the results as JSON.
+
+    python -m benchmarks.run -o bench.json
+    python -m benchmarks.run -o new.json --baseline bench.json   # compare with an earlier run
+    python -m benchmarks.run --quick -o smoke.json                # small sizes for CI
+
+With ``--baseline``, every metric is compared with the earlier run and the
+command exits with status 1 when one got slower by more than ``--tolerance``.
+"""
+
+from __future__ import annotations
+import argparse
+import datetime as dt
+import json
+import platform
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterator, Tuple
+
+from benchmarks import bench_aggregate, bench_nlp
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def run_suite(quick: bool = False, latency: float = 0.05, jitter: float = 0.02) -> Dict[str, Any]:
+    concurrency = (1, 8) if quick else (1, 8, 32)
+    n_queries = 40 if quick else 200
+    sizes = (1_000, 10_000) if quick else (1_000, 10_000, 100_000)
+    return {
+        "meta": {
+            "timestamp": dt.datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": quick,
+        },
+        "aggregate": bench_aggregate.run(concurrency, n_queries, latency, jitter)
+                     + bench_aggregate.run(concurrency, n_queries, latency, jitter, warm=True),
+        "nlp": bench_nlp.run(sizes, repeat=3 if quick else 5),
+    }
+
+
+def _metrics(results: Dict[str, Any]) -> Iterator[Tuple[str, float, bool]]:
+    """(name, value, higher_is_better) for every comparable number."""
+    for r in results.get("aggregate", []):
+        tag = f"aggregate[c={r['concurrency']},{'warm' if r['warm'] else 'cold'}]"
+        yield f"{tag}.throughput_qps", r["throughput_qps"], True
+        yield f"{tag}.latency_p99_sec", r["latency_p99_sec"], False
+    for r in results.get("nlp", []):
+        yield f"nlp[{r['function']},{r['chars']}].seconds", r["seconds"], False
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.2) -> Tuple[list, list]:
+    """Return (rows, regressions): rows are (name, baseline, current, change) for metrics in both runs."""
+    base = {name: value for name, value, _ in _metrics(baseline)}
+    rows, regressions = [], []
+    for name, value, higher_is_better in _metrics(current):
+        if name not in base or not base[name]:
+            continue
+        change = value / base[name] - 1
+        rows.append((name, base[name], value, change))
+        if (-change if higher_is_better else change) > tolerance:
+            regressions.append(name)
+    return rows, regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite.")
+    parser.add_argument("-o", "--output", default="bench.json", help="where to write the JSON results")
+    parser.add_argument("--baseline", help="earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown vs. baseline (0.2 = 20%%)")
+    parser.add_argument("--quick", action="store_true", help="fewer queries and smaller texts")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub seconds per upstream response")
+    parser.add_argument("--jitter", type=float, default=0.02)
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.quick, args.latency, args.jitter)
+    Path(args.output).write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+    print(f"results written to {args.output}", file=sys.stderr)
+
+    if not args.baseline:
+        return 0
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+    rows, regressions = compare(results, baseline, args.tolerance)
+    for name, old, new, change in rows:
+        print(f"{name:55s} {old:12.6g} -> {new:12.6g}  {change:+7.1%}")
+    if regressions:
+        print(f"{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}: {', '.join(regressions)}",
+              file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
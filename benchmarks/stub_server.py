@@ -0,0 +1,187 @@
+"""
+Local stand-in for Wikipedia, HN Algolia, Open-Meteo and Frankfurter.
+
+Replays the recorded responses in ``benchmarks/fixtures`` with an injected
+latency per upstream, so benchmarks measure our code (pooling, fan-out, caching,
+parsing, NLP) against realistic payloads without touching the network. The
+Wikipedia search and summary responses echo the requested query/title, so every
+query follows the real search -> summary -> geocode -> forecast chain.
+
+    python -m benchmarks.stub_server --port 8765 --latency 0.05 --jitter 0.02
+"""
+
+from __future__ import annotations
+import argparse
+import copy
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+from urllib.parse import parse_qs, unquote, urlsplit
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+# path prefix -> (upstream, fixture file)
+ROUTES = {
+    "/wiki/w/rest.php/v1/search/title": ("wiki", "wiki_search.json"),
+    "/wiki/api/rest_v1/page/summary/": ("wiki", "wiki_summary.json"),
+    "/hn/api/v1/search": ("hn", "hn_search.json"),
+    "/geo/v1/search": ("geo", "geocode.json"),
+    "/meteo/v1/forecast": ("meteo", "forecast.json"),
+    "/fx/": ("fx", "fx_latest.json"),
+}
+UPSTREAMS = ("wiki", "hn", "geo", "meteo", "fx")
+
+
+def load_fixture(name: str) -> dict:
+    with open(FIXTURES / name, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class StubServer:
+    """
+    Threaded HTTP server replaying the fixtures. ``latency`` is seconds per
+    response, either one value or a dict per upstream ("wiki", "hn", "geo",
+    "meteo", "fx"); each response also sleeps a uniform random ``jitter``.
+    """
+
+    def __init__(self, latency: Union[float, Dict[str, float]] = 0.0, jitter: float = 0.0,
+                 port: int = 0, seed: Optional[int] = 0):
+        self.latency = latency if isinstance(latency, dict) else {u: latency for u in UPSTREAMS}
+        self.jitter = jitter
+        self._requests = 0
+        self._requests_lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._bodies = {prefix: load_fixture(name) for prefix, (_, name) in ROUTES.items()}
+        self._raw = {prefix: json.dumps(body).encode("utf-8") for prefix, body in self._bodies.items()}
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def requests(self) -> int:
+        """Requests answered so far (handler threads count under a lock, so none is lost under load)."""
+        with self._requests_lock:
+            return self._requests
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _delay(self, upstream: str) -> float:
+        with self._rng_lock:
+            extra = self._rng.uniform(0, self.jitter) if self.jitter else 0.0
+        return self.latency.get(upstream, 0.0) + extra
+
+    def _body(self, prefix: str, path: str, query: Dict[str, list]) -> bytes:
+        if prefix == "/wiki/w/rest.php/v1/search/title":
+            body = copy.deepcopy(self._bodies[prefix])
+            q = (query.get("q") or [""])[0]
+            body["pages"][0].update(title=q, key=q.replace(" ", "_"))
+            body["pages"] = body["pages"][: int((query.get("limit") or [5])[0])]
+        elif prefix == "/wiki/api/rest_v1/page/summary/":
+            body = dict(self._bodies[prefix], title=unquote(path[len(prefix):]))
+        elif prefix == "/meteo/v1/forecast" and "," in (query.get("latitude") or [""])[0]:
+            # multi-location request: one forecast per coordinate pair
+            body = [self._bodies[prefix]] * len(query["latitude"][0].split(","))
+        else:
+            return self._raw[prefix]
+        return json.dumps(body).encode("utf-8")
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real upstreams
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                for prefix, (upstream, _) in ROUTES.items():
+                    if parts.path.startswith(prefix):
+                        break
+                else:
+                    self.send_error(404)
+                    return
+                with server._requests_lock:
+                    server._requests += 1
+                time.sleep(server._delay(upstream))
+                body = server._body(prefix, parts.path, parse_qs(parts.query))
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "StubServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="stub-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def point_services_at(base_url: str) -> Dict[tuple, Any]:
+    """
+    Redirect the service modules' endpoint constants to ``base_url`` and give the
+    process a fresh in-memory FX rate store; returns the originals.
+    """
+    from services import forex, fxstore, news, weather, wiki
+
+    targets = {
+        (wiki, "SEARCH_URL"): f"{base_url}/wiki/w/rest.php/v1/search/title",
+        (wiki, "BASE_SUMMARY"): f"{base_url}/wiki/api/rest_v1/page/summary/",
+        (news, "BASE"): f"{base_url}/hn/api/v1/search",
+        (weather, "GEOCODE"): f"{base_url}/geo/v1/search",
+        (weather, "BASE"): f"{base_url}/meteo/v1/forecast",
+        (forex, "BASE"): f"{base_url}/fx",
+        (fxstore, "BASE"): f"{base_url}/fx",
+        # never mix recorded rates into the on-disk store
+        (fxstore, "_store"): fxstore.FxRateStore(),
+        (fxstore, "_ready"): True,
+    }
+    originals = {}
+    for (module, attr), value in targets.items():
+        originals[(module, attr)] = getattr(module, attr)
+        setattr(module, attr, value)
+    return originals
+
+
+def restore_services(originals: Dict[tuple, Any]) -> None:
+    for (module, attr), value in originals.items():
+        setattr(module, attr, value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the recorded upstream fixtures locally.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra uniform random seconds")
+    args = parser.parse_args()
+    with StubServer(args.latency, args.jitter, port=args.port) as server:
+        print(f"Serving fixtures on {server.url} (Ctrl+C to stop)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,24 @@
 """
-Lightweight NLP utilities: RAKE-style keyword extraction, simple TextRank summarization,
+Lightweight NLP utilities: RAKE-style keyword extraction, sparse TextRank summarization,
 and heuristic sentiment scoring that doesn't require heavy models.
+
+``analyze(text)`` returns a memoized Document that tokenizes once and serves all three.
 """
 
 from __future__ import annotations
-from collections import defaultdict, Counter
+from collections import defaultdict, Counter, OrderedDict
+import hashlib
 import itertools
 import math
 import re
-from typing import List, Tuple
+import threading
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import scipy as sp
+import scipy.sparse
 
-import networkx as nx
+from telemetry.registry import timed
 
 _WORD_RE = re.compile(r"[A-Za-zÀ-ÿ0-9]+(?:'[A-Za-zÀ-ÿ0-9]+)?")
 _STOPWORDS = set("""a about above after again against all am an and any are aren't as at be because been before being below
@@ -23,14 +31,17 @@ up very was wasn't we we'd we'll we're we've were weren't what what's when when'
 why's with won't would wouldn't you you'd you'll you're you've your yours yourself yourselves""".split())
 
 def tokenize(text: str) -> List[str]:
-    return [m.group(0).lower() for m in _WORD_RE.finditer(text)]
+    return [w.lower() for w in _WORD_RE.findall(text)]
 
 def sentences(text: str) -> List[str]:
     parts = re.split(r"(?<=[.!?])\s+", text.strip())
     return [p.strip() for p in parts if p.strip()]
 
 def rake_keywords(text: str, top_k: int = 10):
-    words = tokenize(text)
+    return _rake(tokenize(text), top_k)
+
+@timed("nlp.keywords")
+def _rake(words: List[str], top_k: int):
     phrases, phrase = [], []
     for w in words:
         if w in _STOPWORDS:
@@ -55,93 +66,247 @@ def rake_keywords(text: str, top_k: int = 10):
         if len(out) >= top_k: break
     return out
 
-def textrank_summarize(text: str, max_sentences: int = 3):
+def _similarity_matrix(token_sets: List[set]) -> sp.sparse.csr_array:
+    """
+    Sparse sentence x sentence Jaccard similarities. Built from a binary
+    sentence x token incidence matrix, so only pairs sharing a token are touched.
+    """
+    vocab: Dict[str, int] = {}
+    n = len(token_sets)
+    sizes = np.fromiter(map(len, token_sets), dtype=np.intp, count=n)
+    indptr = np.zeros(n + 1, dtype=np.intp)
+    np.cumsum(sizes, out=indptr[1:])
+    indices = np.fromiter(
+        (vocab.setdefault(t, len(vocab)) for toks in token_sets for t in toks),
+        dtype=np.intp, count=int(indptr[-1]),
+    )
+    M = sp.sparse.csr_array((np.ones(len(indices)), indices, indptr), shape=(n, len(vocab)))
+    # Intersections for every pair sharing a token; Jaccard = |a & b| / (|a| + |b| - |a & b|)
+    S = M @ M.T
+    rows = np.repeat(np.arange(n), np.diff(S.indptr))
+    inter = S.data
+    S.data = inter / (sizes[rows] + sizes[S.indices] - inter)
+    S.setdiag(0)
+    S.eliminate_zeros()
+    return S
+
+
+def _pagerank(W: sp.sparse.csr_array, alpha: float = 0.85, tol: float = 1e-6, max_iter: int = 100) -> np.ndarray:
+    """
+    Weighted PageRank by power iteration (same update and stopping rule as
+    networkx.pagerank) on a symmetric similarity matrix. Returns the last
+    iterate if ``max_iter`` is reached.
+    """
+    n = W.shape[0]
+    out_weight = np.asarray(W.sum(axis=1)).ravel()
+    dangling = out_weight == 0
+    inv = np.zeros(n)
+    inv[~dangling] = 1.0 / out_weight[~dangling]
+    p = np.full(n, 1.0 / n)
+    x = p
+    for _ in range(max_iter):
+        xlast = x
+        # x @ (D^-1 W) == W @ (x / D) because W is symmetric
+        x = alpha * (W @ (x * inv) + x[dangling].sum() * p) + (1 - alpha) * p
+        if np.abs(x - xlast).sum() < n * tol:
+            break
+    return x
+
+
+def textrank_summarize(text: str, max_sentences: int = 3, tol: float = 1e-6, max_iter: int = 100):
     sents = sentences(text)
+    return _textrank(sents, [set(tokenize(s)) for s in sents], max_sentences, tol, max_iter)
+
+@timed("nlp.textrank")
+def _textrank(sents: List[str], token_sets: List[set], max_sentences: int, tol: float, max_iter: int):
     if not sents: return []
-    import networkx as nx
-    G = nx.Graph()
-    for i in range(len(sents)):
-        G.add_node(i)
-    token_sets = [set(tokenize(s)) for s in sents]
-    for i in range(len(sents)):
-        for j in range(i+1, len(sents)):
-            a, b = token_sets[i], token_sets[j]
-            if not a or not b: continue
-            inter, union = len(a & b), len(a | b)
-            if union == 0: continue
-            sim = inter/union
-            if sim > 0: G.add_edge(i, j, weight=sim)
-    if G.number_of_edges()==0: return sents[:max_sentences]
-    ranks = nx.pagerank(G, weight='weight')
-    ordered = sorted(range(len(sents)), key=lambda i: ranks.get(i,0), reverse=True)
+    W = _similarity_matrix(token_sets)
+    if W.nnz == 0: return sents[:max_sentences]
+    ranks = _pagerank(W, tol=tol, max_iter=max_iter).tolist()
+    ordered = sorted(range(len(sents)), key=lambda i: ranks[i], reverse=True)
     selected = sorted(ordered[:max_sentences])
     return [sents[i] for i in selected]
 
-def tiny_sentiment(text: str) -> float:
-    """
-    Heuristic sentiment analysis with an expanded lexicon and basic negation handling.
-    Returns a score between -1.0 (negative) and 1.0 (positive).
-    """
-    # Expanded lexicon
-    pos_words = {
-        "good", "great", "excellent", "positive", "benefit", "win", "success", "safe", "fast", "easy", "love", "like", 
-        "improvement", "growth", "bullish", "sunny", "clear", "best", "amazing", "awesome", "nice", "cool", "happy", 
-        "joy", "gain", "profit", "up", "boom", "strong", "rich", "fresh", "clean", "bright", "smooth", "smart", "wise", 
-        "pure", "free", "top", "hot", "hit", "pro", "plus", "award", "star", "hero", "secure", "stable", "trust", 
-        "faith", "hope", "luck", "peace", "calm", "simple", "quick", "swift", "agile", "fit", "bold", "brave", "kind", 
-        "sweet", "fun", "funny", "humor", "laugh", "smile", "grin", "joke", "wit", "art", "beauty", "soul", "mind", 
-        "heart", "spirit", "life", "live", "born", "grow", "heal", "cure", "fix", "solve", "save", "help", "aid", 
-        "support", "gift", "prize", "bonus", "deal", "cheap", "gold", "gem", "jewel", "pearl", "silk", "soft", "warm", 
-        "shine", "light", "sun", "sky", "moon", "sea", "beach", "ocean", "river", "hill", "mountain", "peak", "high", 
-        "rise", "fly", "soar", "wing", "bird", "friend", "pal", "mate", "buddy", "family", "home", "house", "health", 
-        "gym", "run", "walk", "play", "game", "sport", "glad", "merry", "jolly", "fortune", "chance", "destiny", 
-        "truth", "fact", "real", "true", "right", "just", "fair", "goal", "aim", "target", "value", "worth", "innovative",
-        "breakthrough", "revolutionary", "upgrade", "new", "launch", "release", "announce", "reveal", "unveil"
-    }
-    
-    neg_words = {
-        "bad", "poor", "terrible", "negative", "loss", "fail", "risk", "slow", "hard", "hate", "dislike", "issue", 
-        "decline", "bearish", "storm", "rainy", "cloudy", "worst", "awful", "horrible", "nasty", "ugly", "sad", 
-        "unhappy", "grief", "pain", "hurt", "harm", "kill", "die", "dead", "death", "sick", "ill", "disease", "virus", 
-        "flu", "cold", "fever", "cough", "ache", "wound", "cut", "break", "broke", "broken", "smash", "crash", "burn", 
-        "fire", "hell", "demon", "devil", "evil", "sin", "crime", "jail", "prison", "war", "fight", "battle", "murder", 
-        "rob", "steal", "lie", "cheat", "fake", "false", "wrong", "error", "fault", "bug", "defect", "flaw", "weak", 
-        "dull", "dark", "dim", "gloom", "shade", "shadow", "cloud", "rain", "snow", "ice", "waste", "junk", "scrap", 
-        "rot", "decay", "poison", "toxic", "acid", "sour", "bitter", "tear", "cry", "scream", "yell", "shout", "anger", 
-        "rage", "fear", "dread", "panic", "scare", "terror", "horror", "ghost", "monster", "beast", "enemy", "foe", 
-        "rival", "opponent", "disgust", "shame", "guilt", "vice", "mistake", "debt", "cost", "price", "pay", "bill", 
-        "tax", "fine", "fee", "penalty", "lock", "ban", "stop", "end", "quit", "leave", "go", "away", "off", "down", 
-        "fall", "drop", "sink", "low", "bottom", "under", "below", "less", "minus", "lose", "lost", "miss", "crisis",
-        "crash", "collapse", "recession", "depression", "inflation", "shortage", "outage", "leak", "hack", "breach",
-        "scam", "fraud", "lawsuit", "sue", "court", "trial", "judge", "jury", "verdict", "guilty", "charge", "arrest"
-    }
-
-    negations = {"not", "no", "never", "neither", "nor", "none", "nobody", "nowhere", "nothing", "hardly", "scarcely", "barely", "doesn't", "isn't", "wasn't", "shouldn't", "wouldn't", "couldn't", "won't", "can't", "don't"}
-
-    toks = tokenize(text)
+# Sentiment lexicon, built once at import (expanded word lists + basic negations)
+_POS_WORDS = frozenset({
+    "good", "great", "excellent", "positive", "benefit", "win", "success", "safe", "fast", "easy", "love", "like", 
+    "improvement", "growth", "bullish", "sunny", "clear", "best", "amazing", "awesome", "nice", "cool", "happy", 
+    "joy", "gain", "profit", "up", "boom", "strong", "rich", "fresh", "clean", "bright", "smooth", "smart", "wise", 
+    "pure", "free", "top", "hot", "hit", "pro", "plus", "award", "star", "hero", "secure", "stable", "trust", 
+    "faith", "hope", "luck", "peace", "calm", "simple", "quick", "swift", "agile", "fit", "bold", "brave", "kind", 
+    "sweet", "fun", "funny", "humor", "laugh", "smile", "grin", "joke", "wit", "art", "beauty", "soul", "mind", 
+    "heart", "spirit", "life", "live", "born", "grow", "heal", "cure", "fix", "solve", "save", "help", "aid", 
+    "support", "gift", "prize", "bonus", "deal", "cheap", "gold", "gem", "jewel", "pearl", "silk", "soft", "warm", 
+    "shine", "light", "sun", "sky", "moon", "sea", "beach", "ocean", "river", "hill", "mountain", "peak", "high", 
+    "rise", "fly", "soar", "wing", "bird", "friend", "pal", "mate", "buddy", "family", "home", "house", "health", 
+    "gym", "run", "walk", "play", "game", "sport", "glad", "merry", "jolly", "fortune", "chance", "destiny", 
+    "truth", "fact", "real", "true", "right", "just", "fair", "goal", "aim", "target", "value", "worth", "innovative",
+    "breakthrough", "revolutionary", "upgrade", "new", "launch", "release", "announce", "reveal", "unveil"
+})
+
+_NEG_WORDS = frozenset({
+    "bad", "poor", "terrible", "negative", "loss", "fail", "risk", "slow", "hard", "hate", "dislike", "issue", 
+    "decline", "bearish", "storm", "rainy", "cloudy", "worst", "awful", "horrible", "nasty", "ugly", "sad", 
+    "unhappy", "grief", "pain", "hurt", "harm", "kill", "die", "dead", "death", "sick", "ill", "disease", "virus", 
+    "flu", "cold", "fever", "cough", "ache", "wound", "cut", "break", "broke", "broken", "smash", "crash", "burn", 
+    "fire", "hell", "demon", "devil", "evil", "sin", "crime", "jail", "prison", "war", "fight", "battle", "murder", 
+    "rob", "steal", "lie", "cheat", "fake", "false", "wrong", "error", "fault", "bug", "defect", "flaw", "weak", 
+    "dull", "dark", "dim", "gloom", "shade", "shadow", "cloud", "rain", "snow", "ice", "waste", "junk", "scrap", 
+    "rot", "decay", "poison", "toxic", "acid", "sour", "bitter", "tear", "cry", "scream", "yell", "shout", "anger", 
+    "rage", "fear", "dread", "panic", "scare", "terror", "horror", "ghost", "monster", "beast", "enemy", "foe", 
+    "rival", "opponent", "disgust", "shame", "guilt", "vice", "mistake", "debt", "cost", "price", "pay", "bill", 
+    "tax", "fine", "fee", "penalty", "lock", "ban", "stop", "end", "quit", "leave", "go", "away", "off", "down", 
+    "fall", "drop", "sink", "low", "bottom", "under", "below", "less", "minus", "lose", "lost", "miss", "crisis",
+    "crash", "collapse", "recession", "depression", "inflation", "shortage", "outage", "leak", "hack", "breach",
+    "scam", "fraud", "lawsuit", "sue", "court", "trial", "judge", "jury", "verdict", "guilty", "charge", "arrest"
+})
+
+_NEGATIONS = frozenset({"not", "no", "never", "neither", "nor", "none", "nobody", "nowhere", "nothing", "hardly", "scarcely", "barely", "doesn't", "isn't", "wasn't", "shouldn't", "wouldn't", "couldn't", "won't", "can't", "don't"})
+
+
+def _polarity(tok: str) -> int:
+    if tok in _POS_WORDS:
+        return 1
+    if tok in _NEG_WORDS:
+        return -1
+    return 0
+
+
+@timed("nlp.sentiment")
+def _score_tokens(toks: List[str]) -> float:
     if not toks: return 0.0
-    
+
     score = 0.0
     # Look at words in context of previous word for negation
     for i, t in enumerate(toks):
-        val = 0
-        if t in pos_words:
-            val = 1
-        elif t in neg_words:
-            val = -1
-            
+        val = _polarity(t)
+
         # Check negation
-        if i > 0 and toks[i-1] in negations:
+        if i > 0 and toks[i-1] in _NEGATIONS:
             val *= -1
-            
+
         score += val
 
     # Normalize: divide by a factor related to length, but dampen it so short sentences can have high impact
     # Using sqrt(len) helps balance short vs long texts better than linear division
     norm_factor = math.sqrt(len(toks))
     if norm_factor < 1: norm_factor = 1
-    
+
     final_score = score / norm_factor
-    
+
     # Clamp between -1 and 1
     return max(-1.0, min(1.0, final_score))
+
+
+def tiny_sentiment(text: str) -> float:
+    """
+    Heuristic sentiment analysis with an expanded lexicon and basic negation handling.
+    Returns a score between -1.0 (negative) and 1.0 (positive).
+    """
+    return _score_tokens(tokenize(text))
+
+
+@timed("nlp.score_many")
+def score_many(texts: Sequence[str]) -> np.ndarray:
+    """
+    Batch version of tiny_sentiment: one score per text, identical to calling it
+    on each. Repeated texts are tokenized and scored only once, and the lexicon
+    lookups, negation flips and length normalization run as array operations
+    over all tokens of the batch.
+    """
+    uniq: Dict[str, int] = {}
+    index = np.fromiter((uniq.setdefault(t or "", len(uniq)) for t in texts), dtype=np.intp, count=len(texts))
+    token_lists = [tokenize(t) for t in uniq]
+    lengths = np.fromiter(map(len, token_lists), dtype=np.intp, count=len(token_lists))
+    flat = list(itertools.chain.from_iterable(token_lists))
+
+    pol = np.fromiter(map(_polarity, flat), dtype=np.float64, count=len(flat))
+    # A token is flipped when the previous token *of the same text* is a negation
+    neg = np.fromiter((t in _NEGATIONS for t in flat), dtype=bool, count=len(flat))
+    starts = np.cumsum(lengths) - lengths
+    nonempty = lengths > 0
+    flip = np.zeros(len(flat), dtype=bool)
+    flip[1:] = neg[:-1]
+    flip[starts[nonempty]] = False
+    pol[flip] *= -1
+
+    sums = np.zeros(len(token_lists))
+    if flat:
+        sums[nonempty] = np.add.reduceat(pol, starts[nonempty])
+    norm = np.maximum(np.sqrt(lengths), 1.0)
+    scores = np.clip(sums / norm, -1.0, 1.0)
+    return scores[index]
+
+
+class Document:
+    """
+    A text tokenized and split into sentences once, then shared by RAKE,
+    TextRank and sentiment. Tokens are kept as a compact int32 id stream over a
+    per-document vocabulary, with sentence boundaries as offsets into it.
+    Each result is computed once per parameter set.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.sentences = sentences(text)
+        vocab: Dict[str, int] = {}
+        per_sentence = [tokenize(s) for s in self.sentences]
+        # Sentences split on whitespace only, so their tokens concatenate to tokenize(text)
+        self.token_ids = np.fromiter(
+            (vocab.setdefault(t, len(vocab)) for toks in per_sentence for t in toks),
+            dtype=np.int32, count=sum(map(len, per_sentence)),
+        )
+        self.vocab = list(vocab)
+        self.offsets = np.zeros(len(per_sentence) + 1, dtype=np.int64)
+        np.cumsum([len(t) for t in per_sentence], out=self.offsets[1:])
+        self._results: Dict[tuple, object] = {}
+
+    @property
+    def tokens(self) -> List[str]:
+        return [self.vocab[i] for i in self.token_ids.tolist()]
+
+    def _sentence_token_sets(self) -> List[set]:
+        ids = self.token_ids.tolist()
+        bounds = self.offsets.tolist()
+        return [set(ids[a:b]) for a, b in zip(bounds, bounds[1:])]
+
+    def _memo(self, key: tuple, compute):
+        if key not in self._results:
+            self._results[key] = compute()
+        return self._results[key]
+
+    def keywords(self, top_k: int = 10) -> List[Tuple[str, float]]:
+        return self._memo(("keywords", top_k), lambda: _rake(self.tokens, top_k))
+
+    def summary(self, max_sentences: int = 3, tol: float = 1e-6, max_iter: int = 100) -> List[str]:
+        return self._memo(
+            ("summary", max_sentences, tol, max_iter),
+            lambda: _textrank(self.sentences, self._sentence_token_sets(), max_sentences, tol, max_iter),
+        )
+
+    def sentiment(self) -> float:
+        return self._memo(("sentiment",), lambda: _score_tokens(self.tokens))
+
+
+_DOC_CACHE_SIZE = 256
+_doc_cache: "OrderedDict[bytes, Document]" = OrderedDict()
+_doc_lock = threading.Lock()
+
+
+@timed("nlp.analyze")
+def analyze(text: str) -> Document:
+    """Return the Document for ``text``, reusing an earlier one with the same content hash."""
+    key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+    with _doc_lock:
+        doc = _doc_cache.get(key)
+        if doc is not None:
+            _doc_cache.move_to_end(key)
+            return doc
+    doc = Document(text)
+    with _doc_lock:
+        doc = _doc_cache.setdefault(key, doc)
+        _doc_cache.move_to_end(key)
+        while len(_doc_cache) > _DOC_CACHE_SIZE:
+            _doc_cache.popitem(last=False)
+    return doc
+
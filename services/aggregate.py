@@ -0,0 +1,229 @@
+"""
+Concurrent fan-out engine behind the Smart Search tab.
+
+Every independent source (Wikipedia, Hacker News, FX) starts at once on a shared
+thread pool; only the real dependency chain
+search_pages -> classify -> geocode_city -> get_weather
+runs in sequence. The top page is classified from signals the search already
+returned (see ``classify_pages``), so the weather chain starts while the
+summary is still being fetched; the summary only decides when those are
+ambiguous. Each source has its own deadline, so a slow API only costs its own
+panel: the result is returned partially filled and the timeout is reported in
+``errors``. When the local gazetteer knows the query, the forecast is
+prefetched alongside the Wikipedia search instead of after it.
+``iter_smart_aggregate`` streams each source as soon as it completes, so the UI
+can render panels progressively. How long each source took is reported in
+``timings``. Upstream trouble behind a source that still answered (an open
+circuit breaker, throttling, a stale cached value served instead) is reported
+in ``errors`` as well.
+"""
+
+from __future__ import annotations
+import contextvars
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from services import circuit
+from services.weather import geocode_city, get_weather, local_geocode
+from services.wiki import search_pages, get_summary, classify_pages, infer_entity_type_from_pages, page_title
+from services.news import search_hn
+from services.forex import convert_currency
+
+# Seconds each source may take, measured from the start of the search.
+# "weather" covers the whole wiki -> geocode -> forecast chain.
+SOURCE_DEADLINES: Dict[str, float] = {
+    "wiki": 8.0,
+    "news": 8.0,
+    "weather": 12.0,
+    "fx": 8.0,
+}
+
+# Shared by every Streamlit session in the process. Workers that overrun their
+# deadline finish in the background and their result is simply dropped.
+_POOL = ThreadPoolExecutor(
+    max_workers=int(os.getenv("INTELLIDASH_AGGREGATE_WORKERS", "16")),
+    thread_name_prefix="smart-aggregate",
+)
+
+
+def _submit(fn, *args, **kwargs) -> Future:
+    # workers run in a copy of the caller's context, e.g. to honour cache.refresh_ahead
+    return _POOL.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def _deadline(source: str, deadlines: Optional[Dict[str, float]] = None) -> float:
+    # the internal "classify" stage shares the wiki budget
+    return (deadlines or SOURCE_DEADLINES)["wiki" if source == "classify" else source]
+
+
+def resize_pool(max_workers: int) -> None:
+    """Replace the shared worker pool, e.g. to run many searches at once in batch mode."""
+    global _POOL
+    old, _POOL = _POOL, ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="smart-aggregate")
+    old.shutdown(wait=False)
+
+
+def parse_fx_pair(query: str) -> Optional[Tuple[str, str]]:
+    """Return (base, target) when the query looks like "USD-EUR", else None."""
+    q_norm = query.strip().upper()
+    if "-" not in q_norm:
+        return None
+    parts = [p.strip() for p in q_norm.split("-")]
+    if len(parts) == 2 and all(len(p) == 3 and p.isalpha() for p in parts):
+        return parts[0], parts[1]
+    return None
+
+
+def _tracked(fn: Callable[..., Any], *args, **kwargs) -> Tuple[Any, List[str]]:
+    """Run ``fn`` and return its result with the upstream failures noted meanwhile."""
+    with circuit.track() as notes:
+        return fn(*args, **kwargs), notes
+
+
+def _wiki_task(query: str, max_wiki: int, classified: Future) -> Tuple[List[Dict[str, Any]], str, Dict[str, Dict[str, Any]]]:
+    """
+    Search, classify the top page from the search results alone and publish that
+    on ``classified`` (None when ambiguous), then fetch its summary once; the
+    summary decides the type only when the cheap signals could not.
+    """
+    try:
+        pages = search_pages(query, limit=max_wiki)
+        kind = classify_pages(pages)
+        classified.set_result(kind)
+        summaries = {}
+        title = page_title(pages[0]) if pages else ""
+        if title:
+            summary = get_summary(title)
+            if summary:
+                summaries[title] = summary
+        if kind is None:
+            kind = infer_entity_type_from_pages(pages, summary=summaries.get(title, {}))
+        return pages, kind, summaries
+    finally:
+        if not classified.done():
+            classified.set_result(None)
+
+
+def _weather_task(query: str) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    g = geocode_city(query)
+    if not g:
+        return None, None
+    return g, get_weather(g["latitude"], g["longitude"])
+
+
+def _fx_task(base: str, target: str) -> Optional[Dict[str, Any]]:
+    fx_resp = convert_currency(1.0, base, target)
+    # we only care about the numeric result here
+    if fx_resp and "result" in fx_resp:
+        return {"base": base, "target": target, "result": fx_resp["result"]}
+    return None
+
+
+def empty_result() -> dict:
+    return {
+        "news": [],
+        "wiki": [],
+        "weather": None,
+        "fx": None,
+        "geo": None,
+        # title -> summary JSON already fetched during the search, for reuse by the UI/analytics
+        "summaries": {},
+        "errors": [],
+        # source -> seconds from submission until it finished, failed or timed out
+        "timings": {},
+        "query_type": "Abstract",
+    }
+
+
+def _apply(out: dict, source: str, value: Any) -> None:
+    if value is None:
+        return
+    if source == "wiki":
+        out["wiki"], out["query_type"], out["summaries"] = value
+    elif source == "weather":
+        out["geo"], out["weather"] = value
+    elif source == "news":
+        out["news"] = value
+    elif source == "fx":
+        out["fx"] = value
+
+
+def iter_smart_aggregate(
+    query: str, max_news: int, max_wiki: int, deadlines: Optional[Dict[str, float]] = None
+) -> Iterator[Tuple[str, dict]]:
+    """
+    Streaming smart_aggregate: yield ``(source, out)`` as soon as each source
+    ("wiki", "news", "weather", "fx") finishes, fails or hits its deadline.
+    ``out`` is the same result dict every time, filled in progressively; it is
+    complete after the last yield. Yields nothing for an empty query.
+    ``deadlines`` replaces ``SOURCE_DEADLINES``, e.g. for batch runs.
+    """
+    if not query:
+        return
+    out = empty_result()
+    started = time.monotonic()
+    # Internal stage: resolves with the cheap classification, ahead of the "wiki" result
+    classified: Future = Future()
+    pending: Dict[Future, str] = {
+        classified: "classify",
+        _submit(_tracked, _wiki_task, query, max_wiki, classified): "wiki",
+        _submit(_tracked, search_hn, query, hits_per_page=max_news): "news",
+    }
+    pair = parse_fx_pair(query)
+    if pair:
+        pending[_submit(_tracked, _fx_task, *pair)] = "fx"
+    hint = local_geocode(query)
+    if hint:
+        # Speculative: the weather task later joins this request (coalesced or cached)
+        # if wiki says "place"; otherwise the forecast is only cached
+        _submit(get_weather, hint["latitude"], hint["longitude"])
+    submitted = {source: started for source in pending.values()}
+
+    def start_weather():
+        if "weather" not in submitted:
+            pending[_submit(_tracked, _weather_task, query)] = "weather"
+            submitted["weather"] = time.monotonic()
+
+    while pending:
+        next_deadline = min(started + _deadline(src, deadlines) for src in pending.values())
+        done, _ = wait(pending, timeout=max(0.0, next_deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+        now = time.monotonic()
+        for fut in list(pending):
+            source = pending[fut]
+            budget = _deadline(source, deadlines)
+            if source == "classify":
+                if fut in done or now >= started + budget:
+                    del pending[fut]
+                    kind = fut.result() if fut.done() else None
+                    if kind is not None:
+                        out["query_type"] = kind
+                    if kind == "place":
+                        start_weather()
+                continue
+            if fut in done:
+                try:
+                    value, notes = fut.result()
+                    _apply(out, source, value)
+                    out["errors"].extend(f"{source}: {note}" for note in notes)
+                except Exception as e:
+                    out["errors"].append(f"{source}: {e}")
+            elif now >= started + budget:
+                fut.cancel()
+                out["errors"].append(f"{source}: timed out after {budget:.1f}s")
+            else:
+                continue
+            del pending[fut]
+            out["timings"][source] = now - submitted[source]
+            # Geo/weather only when the top wiki page looks like a place
+            if source == "wiki" and out["query_type"] == "place":
+                start_weather()
+            yield source, out
+
+
+def smart_aggregate(query: str, max_news: int, max_wiki: int, deadlines: Optional[Dict[str, float]] = None) -> dict:
+    out = empty_result()
+    for _, out in iter_smart_aggregate(query, max_news, max_wiki, deadlines):
+        pass
+    return out
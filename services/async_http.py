@@ -0,0 +1,191 @@
+"""
+Asyncio counterpart of ``services.http_client``, behind the ``*_async`` service functions.
+
+Each event loop gets one ``httpx.AsyncClient`` whose keep-alive pools are
+shared by every coroutine on that loop, so hundreds of concurrent upstream
+calls cost sockets and coroutines instead of threads. Calls per upstream host
+are capped by a semaphore (``INTELLIDASH_ASYNC_HOST_CONCURRENCY``) and go
+through the same adaptive per-host rate limits and circuit breakers as the
+blocking client. GETs are retried with exponential backoff on connection
+errors and on 429/5xx, honouring ``Retry-After``, with the pool/timeout/retry
+settings of ``http_client``. Identical in-flight GETs are coalesced; a
+cancelled caller stops waiting, and the upstream request is cancelled once
+nobody waits for it any more.
+
+``run_sync`` runs a coroutine on a shared background loop, for threaded code
+that wants to fan out many calls at once.
+"""
+
+from __future__ import annotations
+import asyncio
+import concurrent.futures
+import os
+import threading
+import time
+import weakref
+from typing import Any, Awaitable, Dict, Optional, TypeVar
+from urllib.parse import urlsplit
+
+import httpx
+
+from services import circuit, http_client, metrics, ratelimit
+from services.singleflight import AsyncSingleFlight
+
+T = TypeVar("T")
+
+# Concurrent requests per upstream host and event loop
+HOST_CONCURRENCY = int(os.getenv("INTELLIDASH_ASYNC_HOST_CONCURRENCY", "32"))
+
+
+class _LoopState:
+    """The client and per-host semaphores of one event loop."""
+
+    def __init__(self):
+        self.client = _build_client()
+        self.semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def semaphore(self, host: str) -> asyncio.Semaphore:
+        sem = self.semaphores.get(host)
+        if sem is None:
+            sem = self.semaphores[host] = asyncio.Semaphore(HOST_CONCURRENCY)
+        return sem
+
+
+_states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+_states_lock = threading.Lock()
+_inflight = AsyncSingleFlight()
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _timeout(timeout: Optional[http_client.Timeout]) -> httpx.Timeout:
+    timeout = http_client.DEFAULT_TIMEOUT if timeout is None else timeout
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect)
+    return httpx.Timeout(timeout)
+
+
+def _build_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=None,  # bounded per host by the semaphores instead
+        max_keepalive_connections=http_client.POOL_CONNECTIONS * http_client.POOL_MAXSIZE,
+    )
+    # requests follows redirects by default; keep the same behaviour
+    return httpx.AsyncClient(limits=limits, timeout=_timeout(None), follow_redirects=True)
+
+
+def _state() -> _LoopState:
+    loop = asyncio.get_running_loop()
+    with _states_lock:
+        state = _states.get(loop)
+        if state is None:
+            state = _states[loop] = _LoopState()
+        return state
+
+
+def _backoff(retry: int) -> float:
+    return http_client.BACKOFF_FACTOR * (2 ** (retry - 1))
+
+
+async def _send(client: httpx.AsyncClient, host: str, url: str, params, headers, timeout) -> httpx.Response:
+    retries = http_client.RETRIES
+    t0 = time.perf_counter()
+    for attempt in range(retries + 1):
+        await ratelimit.acquire_async(host)
+        try:
+            resp = await client.get(url, params=params, headers=headers, timeout=_timeout(timeout))
+        except httpx.TransportError as e:
+            if attempt == retries:
+                metrics.observe_error(host, e, time.perf_counter() - t0)
+                circuit.record(host, error=e)
+                raise
+            await asyncio.sleep(_backoff(attempt + 1))
+            continue
+        delay = ratelimit.parse_retry_after(resp.headers.get("Retry-After")) if resp.status_code in (429, 503) else None
+        ratelimit.observe(host, resp.status_code, delay)
+        if resp.status_code in http_client.RETRY_STATUSES and attempt < retries:
+            await asyncio.sleep(_backoff(attempt + 1) if delay is None else delay)
+            continue
+        # like the blocking client, the last 429/5xx is handed back instead of raised
+        metrics.observe_response(host, resp, time.perf_counter() - t0, retries=attempt)
+        circuit.record(host, status=resp.status_code)
+        return resp
+    raise AssertionError("unreachable")
+
+
+async def get(
+    url: str,
+    params: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[http_client.Timeout] = None,
+) -> httpx.Response:
+    """
+    GET ``url`` through this loop's pooled client, sharing identical in-flight requests.
+    Raises ``circuit.CircuitOpenError`` without sending anything while ``host`` is considered down.
+    """
+    host = urlsplit(url).netloc
+    probe = circuit.before_request(host)
+    key = (
+        url,
+        tuple(sorted((params or {}).items())),
+        tuple(sorted((headers or {}).items())),
+    )
+
+    async def send() -> httpx.Response:
+        state = _state()
+        try:
+            async with state.semaphore(host):
+                return await _send(state.client, host, url, params, headers, timeout)
+        except BaseException:
+            # cancelled or failed without an outcome: do not leave the breaker waiting for this probe
+            if probe:
+                circuit.release_probe(host)
+            raise
+
+    try:
+        resp = await _inflight.do(key, send, label=host)
+    except Exception as e:
+        circuit.note_outcome(host, error=e)
+        raise
+    circuit.note_outcome(host, status=resp.status_code)
+    return resp
+
+
+async def aclose() -> None:
+    """Close the current loop's client (a new one is created on next use)."""
+    with _states_lock:
+        state = _states.pop(asyncio.get_running_loop(), None)
+    if state is not None:
+        await state.client.aclose()
+
+
+def coalescing_stats() -> Dict[str, Dict[str, int]]:
+    """Per-host counts of async GETs sent upstream ("executed") and GETs that joined one ("coalesced")."""
+    return _inflight.stats()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="async-http", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def run_sync(coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+    """
+    Run ``coro`` on the shared background event loop and block until it finishes.
+    On ``timeout`` the coroutine is cancelled and ``TimeoutError`` is raised.
+    Must not be called from a coroutine running on that loop.
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, _background_loop())
+    try:
+        return future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise TimeoutError(f"coroutine did not finish within {timeout}s") from None
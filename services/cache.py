@@ -0,0 +1,507 @@
+"""
+Process-wide response cache for the upstream API calls.
+
+Streamlit serves every session from the same Python process, so a module-level
+cache is shared by all users: once one session has fetched "Barcelona", every
+other session gets it from memory until the entry expires.
+
+Entries expire after a per-source TTL and the cache evicts least-recently-used
+entries once it holds more than ``MAX_ENTRIES`` entries or ``MAX_BYTES`` bytes.
+Cached values are shared between callers and must be treated as read-only.
+
+Behind the memory tier sits an optional SQLite tier (``services.disk_cache``)
+that survives restarts; it is opened on first use or by ``init_disk_cache()``.
+
+Expired entries stay in memory for another ``STALE_SECONDS``. When an
+upstream host fails (see ``services.circuit``) the last known value is
+returned instead of an error or an empty result. An entry that expired less
+than ``REVALIDATE_FRACTION`` of its TTL ago (at most ``REVALIDATE_SECONDS``) is
+served right away while a background worker refreshes it
+(stale-while-revalidate), so only the first request after a long idle period
+waits for the upstream. ``refresh_ahead`` lets a scheduler
+(``services.prefetch``) refetch hot entries before they expire at all.
+"""
+
+from __future__ import annotations
+import asyncio
+import contextlib
+import contextvars
+import datetime as dt
+import functools
+import inspect
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional, Set, Tuple, Union
+from zoneinfo import ZoneInfo
+
+from services import circuit
+from services.disk_cache import DiskCache, default_path
+
+MAX_ENTRIES = int(os.getenv("INTELLIDASH_CACHE_MAX_ENTRIES", "2048"))
+MAX_BYTES = int(os.getenv("INTELLIDASH_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Seconds past expiry an entry may still be served while its upstream is failing
+STALE_SECONDS = float(os.getenv("INTELLIDASH_CACHE_STALE_SECONDS", str(24 * 60 * 60)))
+# Seconds past expiry an entry is still served immediately while it is refreshed in the background (0: off)
+REVALIDATE_SECONDS = float(os.getenv("INTELLIDASH_CACHE_REVALIDATE_SECONDS", str(60 * 60)))
+# ... and at most this fraction of the source's TTL, so short-lived data is never served much older than its TTL
+REVALIDATE_FRACTION = float(os.getenv("INTELLIDASH_CACHE_REVALIDATE_FRACTION", "1.0"))
+REFRESH_WORKERS = int(os.getenv("INTELLIDASH_CACHE_REFRESH_WORKERS", "4"))
+
+_ECB_TZ = ZoneInfo("Europe/Berlin")
+# ECB reference rates are published around 16:00 CET; Frankfurter picks them up shortly after.
+_ECB_FIX_TIME = dt.time(16, 15)
+
+
+def seconds_until_next_ecb_fix(now: Optional[dt.datetime] = None) -> float:
+    """Seconds until the next working-day ECB reference rate publication."""
+    now = (now or dt.datetime.now(dt.timezone.utc)).astimezone(_ECB_TZ)
+    nxt = dt.datetime.combine(now.date(), _ECB_FIX_TIME, tzinfo=_ECB_TZ)
+    if nxt <= now:
+        nxt += dt.timedelta(days=1)
+    while nxt.weekday() >= 5:  # no fixing on weekends
+        nxt += dt.timedelta(days=1)
+    return (nxt - now).total_seconds()
+
+
+# Seconds a cached response stays fresh, per source. Callables are evaluated on store.
+TTL_SECONDS: Dict[str, Union[float, Callable[[], float]]] = {
+    "wiki.search": 60 * 60,
+    "wiki.summary": 24 * 60 * 60,
+    "wiki.classify": 24 * 60 * 60,
+    "news.search": 5 * 60,
+    "weather.geocode": 7 * 24 * 60 * 60,
+    "weather.forecast": 10 * 60,
+    "forex.timeseries": seconds_until_next_ecb_fix,
+}
+
+
+def revalidate_window(source: str) -> float:
+    """Seconds past expiry an entry of ``source`` is served while it is refreshed in the background."""
+    ttl = TTL_SECONDS[source]
+    if callable(ttl):
+        # computed per entry (e.g. until the next ECB fix): no fixed TTL to scale, so refetch inline
+        return 0.0
+    return min(REVALIDATE_SECONDS, REVALIDATE_FRACTION * ttl)
+
+
+def _sizeof(value: Any) -> int:
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with per-entry expiry, bounded by entry count and bytes.
+    Expired entries are kept ``stale_seconds`` longer for ``get_stale``.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES, stale_seconds: float = 0.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stale_seconds = stale_seconds
+        self._data: "OrderedDict[Hashable, Tuple[Any, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Return ``(True, value)`` for a fresh entry, ``(False, None)`` otherwise."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False, None
+            value, expires_at, size = entry
+            now = time.time()
+            if expires_at <= now:
+                if expires_at + self.stale_seconds <= now:
+                    del self._data[key]
+                    self._bytes -= size
+                return False, None
+            self._data.move_to_end(key)
+            return True, value
+
+    def get_stale(self, key: Hashable) -> Tuple[bool, Any, float]:
+        """``(True, value, expires_at)`` for a fresh or recently expired entry, ``(False, None, 0.0)`` otherwise."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] + self.stale_seconds <= time.time():
+                return False, None, 0.0
+            return True, entry[0], entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: float, size: Optional[int] = None) -> None:
+        size = _sizeof(value) if size is None else size
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._data[key] = (value, time.time() + ttl, size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, _, evicted) = self._data.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+
+_CACHE = TTLCache(stale_seconds=STALE_SECONDS)
+_counters: Dict[str, Dict[str, int]] = {}
+# source -> expired entries served because the upstream call failed
+_stale_served: Dict[str, int] = {}
+# source -> expired entries served while being refreshed in the background
+_revalidated: Dict[str, int] = {}
+
+# Background refreshes of stale-while-revalidate entries, at most one per key at a time
+_REFRESH_POOL = ThreadPoolExecutor(max_workers=REFRESH_WORKERS, thread_name_prefix="cache-refresh")
+_refreshing: Set[Hashable] = set()
+_refreshing_lock = threading.Lock()
+# Keep references to async refresh tasks until they finish
+_refresh_tasks: Set[asyncio.Task] = set()
+# Seconds of remaining freshness below which cached calls refetch (see refresh_ahead)
+_refresh_horizon: contextvars.ContextVar[float] = contextvars.ContextVar("cache_refresh_horizon", default=0.0)
+_counters_lock = threading.Lock()
+
+_disk: Optional[DiskCache] = None
+_disk_ready = False
+_disk_lock = threading.Lock()
+
+
+def _count(source: str, field: str) -> None:
+    with _counters_lock:
+        c = _counters.setdefault(source, {"hits": 0, "disk_hits": 0, "misses": 0})
+        c[field] += 1
+
+
+def init_disk_cache(path: Optional[os.PathLike] = None, warm: bool = True) -> Optional[DiskCache]:
+    """Open the persistent tier once per process, warm the memory tier and start compaction."""
+    global _disk, _disk_ready
+    if _disk_ready:
+        return _disk
+    with _disk_lock:
+        if _disk_ready:
+            return _disk
+        path = path or default_path()
+        if path is not None:
+            try:
+                _disk = DiskCache(path)
+            except (OSError, sqlite3.Error):
+                _disk = None
+        if _disk is not None:
+            if warm:
+                warm_start()
+            _disk.start_compactor()
+        _disk_ready = True
+    return _disk
+
+
+def warm_start(limit: Optional[int] = None) -> int:
+    """Load the most recently used live disk entries into memory; return how many."""
+    if _disk is None:
+        return 0
+    try:
+        entries = list(_disk.iter_live(limit or _CACHE.max_entries))
+    except sqlite3.Error:
+        return 0
+    # Oldest first, so the hottest entries end up most recently used in the LRU.
+    for key, _source, value, expires_at in reversed(entries):
+        _CACHE.set(key, value, expires_at - time.time())
+    return len(entries)
+
+
+def _claim_refresh(key: Hashable) -> bool:
+    with _refreshing_lock:
+        if key in _refreshing:
+            return False
+        _refreshing.add(key)
+        return True
+
+
+def _release_refresh(key: Hashable) -> None:
+    with _refreshing_lock:
+        _refreshing.discard(key)
+
+
+@contextlib.contextmanager
+def refresh_ahead(horizon: float) -> Iterator[None]:
+    """
+    Inside the block, cached calls (also in threads started through
+    ``contextvars.copy_context``) treat entries that expire within ``horizon``
+    seconds as missing: they are fetched again and stored with a new TTL.
+    """
+    token = _refresh_horizon.set(horizon)
+    try:
+        yield
+    finally:
+        _refresh_horizon.reset(token)
+
+
+def _disk_get(key: Hashable) -> Tuple[bool, Any, float]:
+    disk = init_disk_cache()
+    if disk is None:
+        return False, None, 0.0
+    try:
+        return disk.get(key)
+    except sqlite3.Error:
+        return False, None, 0.0
+
+
+def _disk_set(key: Hashable, source: str, value: Any, expires_at: float) -> None:
+    if _disk is None:
+        return
+    try:
+        _disk.set(key, source, value, expires_at)
+    except sqlite3.Error:
+        pass
+
+
+def _not_empty(value: Any) -> bool:
+    """Default store policy: skip ``None`` and empty results so failures are retried."""
+    if value is None:
+        return False
+    empty = getattr(value, "empty", None)
+    if isinstance(empty, bool):
+        return not empty
+    try:
+        return len(value) > 0
+    except TypeError:
+        return True
+
+
+def _get(source: str, key: Hashable) -> Tuple[bool, Any]:
+    """A fresh entry from the memory tier, else the disk tier; counted per source."""
+    hit, value = _CACHE.get(key)
+    if hit:
+        _count(source, "hits")
+        return True, value
+    hit, value, expires_at = _disk_get(key)
+    if hit:
+        _count(source, "disk_hits")
+        _CACHE.set(key, value, expires_at - time.time())
+        return True, value
+    _count(source, "misses")
+    return False, None
+
+
+def _put(source: str, key: Hashable, value: Any) -> None:
+    ttl = TTL_SECONDS[source]
+    ttl = ttl() if callable(ttl) else ttl
+    _CACHE.set(key, value, ttl)
+    _disk_set(key, source, value, time.time() + ttl)
+
+
+def _revalidating(source: str, key: Hashable) -> Tuple[bool, Any]:
+    """An entry expired less than ``revalidate_window(source)`` ago, to serve while it is refreshed."""
+    window = revalidate_window(source)
+    if window <= 0:
+        return False, None
+    hit, value, expires_at = _CACHE.get_stale(key)
+    if not hit or time.time() - expires_at >= window:
+        return False, None
+    with _counters_lock:
+        _revalidated[source] = _revalidated.get(source, 0) + 1
+    return True, value
+
+
+def _lookup(source: str, key: Hashable) -> Tuple[bool, Any, bool]:
+    """
+    ``(hit, value, refresh)`` for a cached call: a fresh entry, or an expired one
+    to serve while this caller refreshes it in the background (``refresh``).
+    """
+    horizon = _refresh_horizon.get()
+    if horizon:
+        # refresh-ahead: only entries that stay fresh for a while count, and lookups are not counted
+        hit, value, expires_at = _CACHE.get_stale(key)
+        return (True, value, False) if hit and expires_at - time.time() > horizon else (False, None, False)
+    hit, value = _get(source, key)
+    if hit:
+        return True, value, False
+    hit, value = _revalidating(source, key)
+    return hit, value, hit and _claim_refresh(key)
+
+
+def _stale(source: str, key: Hashable) -> Tuple[bool, Any]:
+    """The last known value for ``key``, noted as served in place of a failed upstream call."""
+    hit, value, expires_at = _CACHE.get_stale(key)
+    if hit:
+        with _counters_lock:
+            _stale_served[source] = _stale_served.get(source, 0) + 1
+        circuit.note(f"serving cached {source} from {max(0, time.time() - expires_at):.0f}s past expiry")
+    return hit, value
+
+
+def _settle(source: str, key: Hashable, value: Any, failures: list, cache_if: Callable[[Any], bool]) -> Any:
+    """Store a fetched value, or return the stale one when an upstream failure made it empty."""
+    if failures and not cache_if(value):
+        hit, old = _stale(source, key)
+        if hit:
+            return old
+    if cache_if(value):
+        _put(source, key, value)
+    return value
+
+
+def _refresh(source: str, key: Hashable, cache_if: Callable[[Any], bool], fn: Callable, args, kwargs) -> None:
+    try:
+        value = fn(*args, **kwargs)
+        # a failed refresh stores nothing (see cache_if); the stale entry stays for the next try
+        if cache_if(value):
+            _put(source, key, value)
+    except Exception:
+        pass
+    finally:
+        _release_refresh(key)
+
+
+async def _refresh_async(source: str, key: Hashable, cache_if: Callable[[Any], bool], fn: Callable, args, kwargs) -> None:
+    try:
+        value = await fn(*args, **kwargs)
+        if cache_if(value):
+            _put(source, key, value)
+    except Exception:
+        pass
+    finally:
+        _release_refresh(key)
+
+
+def _fetch(source: str, key: Hashable, cache_if: Callable[[Any], bool], fn: Callable, args, kwargs) -> Any:
+    with circuit.track() as failures:
+        try:
+            value = fn(*args, **kwargs)
+        except Exception:
+            hit, value = _stale(source, key)
+            if hit:
+                return value
+            raise
+    return _settle(source, key, value, failures, cache_if)
+
+
+async def _fetch_async(source: str, key: Hashable, cache_if: Callable[[Any], bool], fn: Callable, args, kwargs) -> Any:
+    with circuit.track() as failures:
+        try:
+            value = await fn(*args, **kwargs)
+        except Exception:
+            hit, value = _stale(source, key)
+            if hit:
+                return value
+            raise
+    return _settle(source, key, value, failures, cache_if)
+
+
+def cached(source: str, cache_if: Callable[[Any], bool] = _not_empty):
+    """
+    Memoize a service function in the shared cache with the TTL of ``source``.
+    Coroutine functions are supported; a sync and an async function with the
+    same ``source`` and parameter names share entries.
+    """
+    def decorator(fn):
+        sig = inspect.signature(fn)
+
+        def key_of(args, kwargs) -> Hashable:
+            bound = sig.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return (source, tuple(bound.arguments.items()))
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                key = key_of(args, kwargs)
+                hit, value, refresh = _lookup(source, key)
+                if refresh:
+                    task = asyncio.get_running_loop().create_task(_refresh_async(source, key, cache_if, fn, args, kwargs))
+                    _refresh_tasks.add(task)
+                    task.add_done_callback(_refresh_tasks.discard)
+                if hit:
+                    return value
+                return await _fetch_async(source, key, cache_if, fn, args, kwargs)
+
+            async_wrapper.uncached = fn
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = key_of(args, kwargs)
+            hit, value, refresh = _lookup(source, key)
+            if refresh:
+                _REFRESH_POOL.submit(_refresh, source, key, cache_if, fn, args, kwargs)
+            if hit:
+                return value
+            return _fetch(source, key, cache_if, fn, args, kwargs)
+
+        wrapper.uncached = fn
+        return wrapper
+    return decorator
+
+
+def lookup(source: str, key: Hashable) -> Tuple[bool, Any]:
+    """``(True, value)`` if a value was stored for ``key`` with ``store``, without computing anything."""
+    return _get(source, (source, key))
+
+
+def store(source: str, key: Hashable, value: Any) -> None:
+    """Keep a derived value (e.g. a classification) for the TTL of ``source`` in both tiers."""
+    _put(source, (source, key), value)
+
+
+def cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters per source plus the cache's current size."""
+    with _counters_lock:
+        sources = {s: dict(c) for s, c in _counters.items()}
+        stale_served = dict(_stale_served)
+        revalidated = dict(_revalidated)
+    hits = sum(c["hits"] for c in sources.values())
+    disk_hits = sum(c["disk_hits"] for c in sources.values())
+    misses = sum(c["misses"] for c in sources.values())
+    lookups = hits + disk_hits + misses
+    stats = {
+        "hits": hits,
+        "disk_hits": disk_hits,
+        "misses": misses,
+        "hit_ratio": (hits + disk_hits) / lookups if lookups else 0.0,
+        "entries": len(_CACHE),
+        "bytes": _CACHE.nbytes,
+        "evictions": _CACHE.evictions,
+        "disk_entries": 0,
+        "disk_bytes": 0,
+        "sources": sources,
+        "stale_served": stale_served,
+        "revalidated": revalidated,
+    }
+    if _disk is not None:
+        try:
+            stats["disk_entries"] = len(_disk)
+            stats["disk_bytes"] = _disk.nbytes()
+        except sqlite3.Error:
+            pass
+    return stats
+
+
+def clear_cache() -> None:
+    """Drop every cached response (both tiers) and reset the counters."""
+    _CACHE.clear()
+    if _disk is not None:
+        _disk.clear()
+    _CACHE.evictions = 0
+    with _counters_lock:
+        _counters.clear()
+        _stale_served.clear()
+        _revalidated.clear()
@@ -0,0 +1,179 @@
+"""
+Per-host circuit breakers and upstream-failure notes.
+
+A host whose requests keep failing (connection errors, timeouts, and 429/5xx
+left after retries) is opened after ``FAILURE_THRESHOLD`` consecutive
+failures: for ``RESET_TIMEOUT`` seconds every request to it fails fast with
+``CircuitOpenError`` instead of holding a worker for the full timeout. Then a
+single probe is let through ("half-open"); its success closes the circuit and
+its failure opens it again. A probe that ends without an outcome (cancelled,
+or an unexpected error) gives its slot back via ``release_probe``, and one
+that is never heard of again is replaced after ``RESET_TIMEOUT``.
+
+Failures are also noted in the current context (see ``track``), so the cache
+can serve a stale entry instead of an empty result and smart_aggregate can say
+why a source is degraded. The notes follow the caller's thread or asyncio task.
+"""
+
+from __future__ import annotations
+import contextlib
+import contextvars
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+import requests
+
+FAILURE_THRESHOLD = int(os.getenv("INTELLIDASH_BREAKER_FAILURES", "5"))
+RESET_TIMEOUT = float(os.getenv("INTELLIDASH_BREAKER_RESET", "30"))
+# Statuses that mean the host is unavailable (or throttling us), not that the answer is empty
+FAILURE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of sending a request to a host whose circuit is open."""
+
+    def __init__(self, host: str, retry_in: float):
+        super().__init__(f"{host}: circuit open, retrying in {retry_in:.0f}s")
+        self.host = host
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Closed -> open after ``threshold`` consecutive failures -> half-open after ``reset_timeout`` -> closed on success."""
+
+    def __init__(self, threshold: int = FAILURE_THRESHOLD, reset_timeout: float = RESET_TIMEOUT):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    def admit(self) -> Optional[bool]:
+        """
+        None if no request may go out now, True if this one is the half-open
+        probe (only one at a time), False for a normal request.
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return False
+            now = time.monotonic()
+            if self.state == OPEN and now - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == HALF_OPEN and self._probing and now - self._probe_started >= self.reset_timeout:
+                self._probing = False  # the probe's lease ran out: assume it was lost
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing, self._probe_started = True, now
+                return True
+            return None
+
+    def allow(self) -> bool:
+        """Whether a request may go out now (in half-open state, only one probe at a time)."""
+        return self.admit() is not None
+
+    def release_probe(self) -> None:
+        """Let another probe through after this one ended without a recorded outcome."""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probing = False
+
+    def retry_in(self) -> float:
+        with self._lock:
+            return max(0.0, self.opened_at + self.reset_timeout - time.monotonic()) if self.state == OPEN else 0.0
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state, self.failures, self._probing = CLOSED, 0, False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.threshold:
+                self.state, self.opened_at, self._probing = OPEN, time.monotonic(), False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_lock = threading.Lock()
+_notes: contextvars.ContextVar[Optional[List[str]]] = contextvars.ContextVar("upstream_notes", default=None)
+
+
+def breaker(host: str) -> CircuitBreaker:
+    b = _breakers.get(host)
+    if b is None:
+        with _lock:
+            b = _breakers.setdefault(host, CircuitBreaker())
+    return b
+
+
+def before_request(host: str) -> bool:
+    """
+    Raise ``CircuitOpenError`` (and note it) when ``host`` must not be called right now.
+    Returns True if the request is the half-open probe: it must end in ``record`` or ``release_probe``.
+    """
+    b = breaker(host)
+    probe = b.admit()
+    if probe is None:
+        error = CircuitOpenError(host, b.retry_in())
+        note(str(error))
+        raise error
+    return probe
+
+
+def release_probe(host: str) -> None:
+    breaker(host).release_probe()
+
+
+def record(host: str, status: Optional[int] = None, error: Optional[BaseException] = None) -> None:
+    """Feed one upstream outcome (a response status, or the exception raised instead) to ``host``'s breaker."""
+    if error is not None or status in FAILURE_STATUSES:
+        breaker(host).record_failure()
+    else:
+        breaker(host).record_success()
+
+
+def note_outcome(host: str, status: Optional[int] = None, error: Optional[BaseException] = None) -> None:
+    """Note a failed upstream call in the caller's context; successes are not noted."""
+    if error is not None:
+        note(f"{host}: {type(error).__name__}")
+    elif status in FAILURE_STATUSES:
+        note(f"{host}: HTTP {status}" + (" (throttled)" if status == 429 else ""))
+
+
+def note(message: str) -> None:
+    notes = _notes.get()
+    if notes is not None and message not in notes:
+        notes.append(message)
+
+
+@contextlib.contextmanager
+def track() -> Iterator[List[str]]:
+    """Collect the upstream failures noted inside the block; they are passed on to an enclosing ``track``."""
+    parent = _notes.get()
+    notes: List[str] = []
+    token = _notes.set(notes)
+    try:
+        yield notes
+    finally:
+        _notes.reset(token)
+        if parent is not None:
+            parent.extend(n for n in notes if n not in parent)
+
+
+def status() -> Dict[str, Dict[str, Any]]:
+    """State, consecutive failures and seconds until the next probe, per host seen so far."""
+    with _lock:
+        items = list(_breakers.items())
+    return {host: {"state": b.state, "failures": b.failures, "retry_in": round(b.retry_in(), 1)} for host, b in items}
+
+
+def reset() -> None:
+    """Forget every breaker (all hosts closed)."""
+    with _lock:
+        _breakers.clear()
@@ -0,0 +1,167 @@
+"""
+Persistent second cache tier backed by a local SQLite file.
+
+Sits behind the in-memory cache in ``services.cache``: responses are pickled with
+their absolute expiry time, so geocoding results and Wikipedia summaries survive
+container restarts and redeploys. On boot the most recently used entries are
+loaded back into memory (warm start), and a background thread periodically drops
+expired rows and trims the file down to its size cap.
+"""
+
+from __future__ import annotations
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Hashable, Iterator, Optional, Tuple
+
+MAX_BYTES = int(os.getenv("INTELLIDASH_DISK_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+COMPACT_INTERVAL = float(os.getenv("INTELLIDASH_DISK_CACHE_COMPACT_INTERVAL", "600"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key         TEXT PRIMARY KEY,
+    pkey        BLOB NOT NULL,
+    source      TEXT NOT NULL,
+    value       BLOB NOT NULL,
+    size        INTEGER NOT NULL,
+    expires_at  REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at);
+CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires_at);
+"""
+
+
+def default_path() -> Optional[Path]:
+    """Location of the cache file, or None when ``INTELLIDASH_CACHE_DIR=off``."""
+    root = os.getenv("INTELLIDASH_CACHE_DIR", str(Path(__file__).resolve().parent.parent / ".cache"))
+    if not root or root.lower() in ("0", "off", "false", "none"):
+        return None
+    return Path(root) / "responses.sqlite"
+
+
+class DiskCache:
+    """Size-capped key/value store of pickled responses with expiry."""
+
+    def __init__(self, path: Path, max_bytes: int = MAX_BYTES):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._stop = threading.Event()
+        self._compactor: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _key(key: Hashable) -> str:
+        return repr(key)
+
+    def get(self, key: Hashable) -> Tuple[bool, Any, float]:
+        """Return ``(True, value, expires_at)`` for a live entry, ``(False, None, 0)`` otherwise."""
+        now = time.time()
+        k = self._key(key)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM entries WHERE key = ?", (k,)
+            ).fetchone()
+            if row is None or row[1] <= now:
+                return False, None, 0.0
+            self._conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, k))
+        try:
+            return True, pickle.loads(row[0]), row[1]
+        except Exception:
+            self.delete(key)
+            return False, None, 0.0
+
+    def set(self, key: Hashable, source: str, value: Any, expires_at: float) -> None:
+        try:
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            pkey = pickle.dumps(key, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return
+        if len(blob) > self.max_bytes:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, pkey, source, value, size, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self._key(key), pkey, source, blob, len(blob), expires_at, time.time()),
+            )
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (self._key(key),))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.execute("PRAGMA incremental_vacuum")
+
+    def nbytes(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def iter_live(self, limit: int) -> Iterator[Tuple[Hashable, str, Any, float]]:
+        """Yield up to ``limit`` unexpired ``(key, source, value, expires_at)``, most recently used first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT pkey, source, value, expires_at FROM entries WHERE expires_at > ? "
+                "ORDER BY accessed_at DESC LIMIT ?",
+                (time.time(), limit),
+            ).fetchall()
+        for pkey, source, value, expires_at in rows:
+            try:
+                yield pickle.loads(pkey), source, pickle.loads(value), expires_at
+            except Exception:
+                continue
+
+    def compact(self) -> int:
+        """Drop expired rows, trim least-recently-used rows down to the size cap; return rows removed."""
+        with self._lock:
+            removed = self._conn.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),)).rowcount
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                freed = 0
+                victims = []
+                for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY accessed_at"):
+                    victims.append((key,))
+                    freed += size
+                    if freed >= excess:
+                        break
+                self._conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+                removed += len(victims)
+            if removed:
+                self._conn.execute("PRAGMA incremental_vacuum")
+        return removed
+
+    def start_compactor(self, interval: float = COMPACT_INTERVAL) -> None:
+        """Run ``compact()`` every ``interval`` seconds on a daemon thread."""
+        if self._compactor is not None:
+            return
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.compact()
+                except sqlite3.Error:
+                    pass
+
+        self._compactor = threading.Thread(target=loop, name="disk-cache-compactor", daemon=True)
+        self._compactor.start()
+
+    def close(self) -> None:
+        self._stop.set()
+        with self._lock:
+            self._conn.close()
@@ -1,63 +1,232 @@
-import requests
+import asyncio
+from services import async_http, http_client
+from services.cache import cached
+from services.fxstore import get_fx_store
+from services.metrics import timed
+import numpy as np
 import pandas as pd
 import datetime as dt
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Sequence
 
 BASE = "https://api.frankfurter.app"
 
-def convert_currency(amount: float, base: str, target: str) -> Dict[str, Any]:
-    """Convierte divisas usando api.frankfurter.app (sin API key)."""
-    try:
-        # Evitar error si las divisas son iguales
-        if base.upper() == target.upper():
-            return {
-                "success": True,
-                "result": amount,
-                "rate": 1.0,
-                "query": {"from": base.upper(), "to": target.upper()},
-            }
-
-        url = f"{BASE}/latest"
-        params = {"from": base.upper(), "to": target.upper()}
-        r = requests.get(url, params=params, timeout=10)
-        js = r.json()
-
-        if "rates" not in js or target.upper() not in js["rates"]:
-            return {"success": False, "error": "Invalid response", "raw": js}
-
-        rate = js["rates"][target.upper()]
-        result = amount * rate
+# Rangos del histórico ofrecidos en la interfaz (días)
+HISTORY_RANGES: Dict[str, int] = {"7D": 7, "1M": 31, "6M": 183, "1Y": 365, "5Y": 5 * 365, "10Y": 10 * 365}
+# Días de cotización por año, para anualizar la volatilidad
+TRADING_DAYS = 252
+# Frecuencias de las velas OHLC, de la más fina a la más gruesa, con su duración aproximada en días
+OHLC_FREQUENCIES: Dict[str, float] = {"D": 1, "W": 7, "MS": 30.44, "QS": 91.31, "YS": 365.25}
+
+def _local_conversion(amount: float, base: str, target: str) -> Optional[Dict[str, Any]]:
+    """Conversión sin red: divisas iguales, o ambas conocidas por el almacén local."""
+    # Evitar error si las divisas son iguales
+    if base.upper() == target.upper():
+        return {
+            "success": True,
+            "result": amount,
+            "rate": 1.0,
+            "query": {"from": base.upper(), "to": target.upper()},
+        }
+
+    # Computed from the local rate store when it knows both currencies
+    store = get_fx_store()
+    found = store.rate(base, target) if store is not None else None
+    if found is not None:
+        rate, date = found
         return {
             "success": True,
-            "result": result,
+            "result": amount * rate,
             "rate": rate,
+            "date": date.isoformat(),
             "query": {"from": base.upper(), "to": target.upper()},
         }
+    return None
+
+def _latest_request(base: str, target: str):
+    return f"{BASE}/latest", {"from": base.upper(), "to": target.upper()}
+
+def _conversion(js: Dict[str, Any], amount: float, base: str, target: str) -> Dict[str, Any]:
+    if "rates" not in js or target.upper() not in js["rates"]:
+        return {"success": False, "error": "Invalid response", "raw": js}
+
+    rate = js["rates"][target.upper()]
+    result = amount * rate
+    return {
+        "success": True,
+        "result": result,
+        "rate": rate,
+        "query": {"from": base.upper(), "to": target.upper()},
+    }
+
+@timed("forex.convert_currency")
+def convert_currency(amount: float, base: str, target: str) -> Dict[str, Any]:
+    """Convierte divisas usando api.frankfurter.app (sin API key)."""
+    try:
+        local = _local_conversion(amount, base, target)
+        if local is not None:
+            return local
+        url, params = _latest_request(base, target)
+        return _conversion(http_client.get(url, params=params).json(), amount, base, target)
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+@timed("forex.convert_currency_async")
+async def convert_currency_async(amount: float, base: str, target: str) -> Dict[str, Any]:
+    """Versión asíncrona de convert_currency."""
+    try:
+        # El almacén local es síncrono y solo va a la red una vez por fijación del BCE
+        local = await asyncio.to_thread(_local_conversion, amount, base, target)
+        if local is not None:
+            return local
+        url, params = _latest_request(base, target)
+        return _conversion((await async_http.get(url, params=params)).json(), amount, base, target)
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+@timed("forex.get_timeseries")
 def get_timeseries(base: str, target: str, days: int = 7) -> Optional[pd.DataFrame]:
-    """Obtiene tasas históricas reales de los últimos X días."""
+    """Obtiene tasas históricas reales de los últimos X días (del almacén local si está activo)."""
+    store = get_fx_store()
+    df = store.history(base, target, days) if store is not None else None
+    return df if df is not None else _timeseries_api(base, target, days)
+
+@timed("forex.get_timeseries_async")
+async def get_timeseries_async(base: str, target: str, days: int = 7) -> Optional[pd.DataFrame]:
+    """Versión asíncrona de get_timeseries."""
+    store = get_fx_store()
+    df = await asyncio.to_thread(store.history, base, target, days) if store is not None else None
+    return df if df is not None else await _timeseries_api_async(base, target, days)
+
+def _timeseries_request(base: str, target: str, days: int):
+    end = dt.date.today()
+    start = end - dt.timedelta(days=days)
+    return f"{BASE}/{start.isoformat()}..{end.isoformat()}", {"from": base.upper(), "to": target.upper()}
+
+def _series(js: Dict[str, Any], target: str) -> Optional[pd.DataFrame]:
+    if "rates" not in js:
+        return None
+
+    rates = js["rates"]
+    df = pd.DataFrame({
+        "date": pd.to_datetime(list(rates.keys())),
+        "rate": [v[target.upper()] for v in rates.values()],
+    }).set_index("date").sort_index()
+    return df
+
+@cached("forex.timeseries")
+def _timeseries_api(base: str, target: str, days: int = 7) -> Optional[pd.DataFrame]:
     try:
-        end = dt.date.today()
-        start = end - dt.timedelta(days=days)
-        url = f"{BASE}/{start.isoformat()}..{end.isoformat()}"
-        params = {"from": base.upper(), "to": target.upper()}
-        r = requests.get(url, params=params, timeout=10)
-        js = r.json()
-
-        if "rates" not in js:
-            return None
-
-        rates = js["rates"]
-        df = pd.DataFrame({
-            "date": pd.to_datetime(list(rates.keys())),
-            "rate": [v[target.upper()] for v in rates.values()],
-        }).set_index("date").sort_index()
-        return df
+        url, params = _timeseries_request(base, target, days)
+        return _series(http_client.get(url, params=params).json(), target)
     except Exception:
         return None
 
+@cached("forex.timeseries")
+async def _timeseries_api_async(base: str, target: str, days: int = 7) -> Optional[pd.DataFrame]:
+    try:
+        url, params = _timeseries_request(base, target, days)
+        return _series((await async_http.get(url, params=params)).json(), target)
+    except Exception:
+        return None
+
+@timed("forex.get_panel")
+def get_panel(base: str, targets: Sequence[str], days: int) -> Optional[pd.DataFrame]:
+    """Histórico de ``base`` frente a varias divisas a la vez: índice fecha, una columna por divisa."""
+    targets = [t.upper() for t in targets if t.upper() != base.upper()]
+    store = get_fx_store()
+    df = store.panel(base, targets, days) if store is not None else None
+    if df is not None:
+        return df
+    series = {t: get_timeseries(base, t, days) for t in targets}
+    frames = {t: s["rate"] for t, s in series.items() if s is not None}
+    return pd.DataFrame(frames) if frames else None
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Índices de los ``n_out`` puntos que conserva Largest-Triangle-Three-Buckets
+    (Steinarsson, 2013): el primero, el último y, en cada tramo intermedio, el que
+    forma el triángulo más grande con el punto elegido antes y la media del tramo
+    siguiente. Conserva picos y valles, a diferencia de tomar un punto cada k.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # n_out - 2 tramos entre el primer y el último punto
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        nxt_hi = edges[b + 2] if b + 2 < len(edges) else n
+        cx, cy = x[hi:nxt_hi].mean(), y[hi:nxt_hi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(area.argmax())
+        out[b + 1] = a
+    return out
+
+
+@timed("forex.downsample")
+def downsample(df: pd.DataFrame, width_px: int, column: str = "rate", points_per_px: float = 1.0) -> pd.DataFrame:
+    """
+    Reduce una serie indexada por fecha a unos ``width_px * points_per_px`` puntos
+    con LTTB sobre ``column``; las demás columnas acompañan a las filas elegidas.
+    Más puntos que píxeles no se ven en el gráfico, solo engordan el JSON.
+    """
+    df = df[df[column].notna()]
+    n_out = max(3, int(width_px * points_per_px))
+    if len(df) <= n_out:
+        return df
+    x = df.index.asi8.astype(np.float64)
+    return df.iloc[lttb_indices(x, df[column].to_numpy(dtype=np.float64), n_out)]
+
+
+def ohlc_frequency(days: int, width_px: int, px_per_candle: int = 6) -> str:
+    """La frecuencia más fina de ``OHLC_FREQUENCIES`` cuyas velas caben en ``width_px``."""
+    max_candles = max(1, width_px // px_per_candle)
+    for freq, length in OHLC_FREQUENCIES.items():
+        if days / length <= max_candles:
+            return freq
+    return "YS"
+
+
+@timed("forex.ohlc")
+def ohlc(df: pd.DataFrame, width_px: int, column: str = "rate", freq: Optional[str] = None) -> pd.DataFrame:
+    """Velas open/high/low/close de ``column`` por semana, mes... según el ancho del gráfico."""
+    if df.empty:
+        return pd.DataFrame(columns=["open", "high", "low", "close"])
+    days = (df.index.max() - df.index.min()).days + 1
+    return df[column].resample(freq or ohlc_frequency(days, width_px)).ohlc().dropna()
+
+
+@timed("forex.rolling_stats")
+def rolling_stats(
+    df: pd.DataFrame,
+    column: str = "rate",
+    windows: Sequence[int] = (20, 50),
+    vol_window: int = 20,
+) -> pd.DataFrame:
+    """
+    Añade a la serie, en operaciones vectorizadas sobre toda ella: rendimiento
+    logarítmico diario (``return``), rendimiento acumulado (``cum_return``),
+    volatilidad anualizada móvil (``volatility``) y medias móviles ``sma_<n>``.
+    Se calcula antes de reducir la serie, para que los valores sean exactos.
+    """
+    rate = df[column].to_numpy(dtype=np.float64)
+    out = pd.DataFrame({column: rate}, index=df.index)
+    log_ret = np.full_like(rate, np.nan)
+    log_ret[1:] = np.diff(np.log(rate))
+    out["return"] = log_ret
+    out["cum_return"] = rate / rate[0] - 1 if len(rate) else rate
+    out["volatility"] = out["return"].rolling(vol_window).std() * np.sqrt(TRADING_DAYS)
+    for w in windows:
+        out[f"sma_{w}"] = out[column].rolling(w).mean()
+    return out
+
+
 def get_common_currencies() -> List[str]:
     """Devuelve lista de códigos de divisas comunes."""
     return [
@@ -0,0 +1,336 @@
+"""
+Local store of ECB reference rates behind the FX converter and history chart.
+
+Frankfurter answers one request with every currency's rate for a base, so the
+store fetches all rates against EUR (the ECB's own base) once per fixing and
+keeps them as a dense date x currency NumPy matrix on disk. Any pair, including
+cross rates such as GBP->JPY, is then a column division computed locally, and
+switching pairs costs no request. Only dates the store has not seen are
+fetched: older history on demand, and the newest fix at most once per ECB
+publication (see ``seconds_until_next_ecb_fix``).
+
+Files in the store directory: ``rates.npy`` (float64, NaN where a currency has
+no fix), ``dates.npy`` (datetime64[D], ascending, publication days only) and
+``meta.json`` (base, currency columns, covered range, next refresh time).
+"""
+
+from __future__ import annotations
+import datetime as dt
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import requests
+
+from services import http_client
+from services.cache import seconds_until_next_ecb_fix
+from services.metrics import timed
+
+BASE = "https://api.frankfurter.app"
+STORE_BASE = "EUR"
+# Days per range request when backfilling history
+FETCH_CHUNK_DAYS = 360
+# How far back the first refresh of an empty store looks for the latest fix (covers long weekends)
+LATEST_LOOKBACK_DAYS = 7
+# Seconds after a failed fetch during which callers get the stored rates without another request
+FAILURE_COOLDOWN = 60.0
+
+# first and last day of a request
+DateRange = Tuple[dt.date, dt.date]
+
+
+def default_dir() -> Optional[Path]:
+    """Location of the rate store, or None when ``INTELLIDASH_FX_DIR=off``."""
+    root = os.getenv("INTELLIDASH_FX_DIR", str(Path(__file__).resolve().parent.parent / ".cache" / "fx"))
+    if not root or root.lower() in ("0", "off", "false", "none"):
+        return None
+    return Path(root)
+
+
+class FxRateStore:
+    """Thread-safe date x currency rate matrix against ``STORE_BASE``, persisted in ``directory`` (in memory if None)."""
+
+    def __init__(self, directory: Optional[os.PathLike] = None, base: str = STORE_BASE):
+        self.directory = Path(directory) if directory is not None else None
+        self.base = base
+        self.currencies: List[str] = [base]
+        self.dates = np.empty(0, dtype="datetime64[D]")
+        self.rates = np.empty((0, 1), dtype=np.float64)
+        # First day whose history is complete; later gaps are weekends/holidays, not missing data
+        self.first_day: Optional[dt.date] = None
+        # Wall-clock time before which the newest fix is not requested again
+        self.next_refresh = 0.0
+        # Wall-clock time before which nothing is requested after a failed fetch
+        self.retry_at = 0.0
+        self.requests = 0
+        # Guards the matrix; held only to read it or swap fetched rates in, never during a request
+        self._lock = threading.RLock()
+        # One fetch at a time, so concurrent callers missing the same days do not request them twice
+        self._fetch_lock = threading.Lock()
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._load()
+
+    # -- persistence -----------------------------------------------------
+
+    def _load(self) -> None:
+        try:
+            meta = json.loads((self.directory / "meta.json").read_text(encoding="utf-8"))
+            dates = np.load(self.directory / "dates.npy")
+            rates = np.load(self.directory / "rates.npy")
+        except (OSError, ValueError):
+            return
+        if meta.get("base") != self.base or rates.shape != (len(dates), len(meta["currencies"])):
+            return
+        self.currencies = meta["currencies"]
+        self.dates, self.rates = dates, rates
+        self.first_day = dt.date.fromisoformat(meta["first_day"]) if meta.get("first_day") else None
+        self.next_refresh = float(meta.get("next_refresh", 0.0))
+
+    def _save(self) -> None:
+        if self.directory is None:
+            return
+        meta = {
+            "base": self.base,
+            "currencies": self.currencies,
+            "first_day": self.first_day.isoformat() if self.first_day else None,
+            "next_refresh": self.next_refresh,
+        }
+        # Arrays first, metadata last: a reader never sees metadata for arrays that are not there yet
+        for name, arr in (("dates.npy", self.dates), ("rates.npy", self.rates)):
+            tmp = self.directory / f".{name}.tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, arr)
+            os.replace(tmp, self.directory / name)
+        tmp = self.directory / ".meta.json.tmp"
+        tmp.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(tmp, self.directory / "meta.json")
+
+    # -- fetching --------------------------------------------------------
+
+    def _fetch(self, start: dt.date, end: dt.date) -> Optional[Dict[str, Dict[str, float]]]:
+        """All rates against the store base published between ``start`` and ``end``: {date: {currency: rate}}."""
+        self.requests += 1
+        try:
+            r = http_client.get(f"{BASE}/{start.isoformat()}..{end.isoformat()}", params={"from": self.base})
+        except requests.RequestException:
+            return None
+        if r.status_code == 404:
+            return {}  # nothing published in the range yet
+        if r.status_code != 200:
+            return None
+        try:
+            js = r.json()
+        except ValueError:
+            return None
+        if js.get("base") != self.base or not isinstance(js.get("rates"), dict):
+            return {}
+        rates = js["rates"]
+        if "date" in js and not any(isinstance(v, dict) for v in rates.values()):
+            return {js["date"]: rates}  # single-day answer
+        return rates
+
+    def _merge(self, by_date: Dict[str, Dict[str, float]]) -> None:
+        if not by_date:
+            return
+        new_currencies = sorted({c for day in by_date.values() for c in day} - set(self.currencies))
+        currencies = self.currencies + new_currencies
+        col = {c: j for j, c in enumerate(currencies)}
+        fresh = np.full((len(by_date), len(currencies)), np.nan)
+        fresh[:, col[self.base]] = 1.0
+        for i, day in enumerate(by_date.values()):
+            for c, rate in day.items():
+                fresh[i, col[c]] = rate
+        fresh_dates = np.array(list(by_date), dtype="datetime64[D]")
+
+        old = np.full((len(self.dates), len(currencies)), np.nan)
+        old[:, :len(self.currencies)] = self.rates
+        # Refetched days replace what was stored for them
+        keep = ~np.isin(self.dates, fresh_dates)
+        dates = np.concatenate([self.dates[keep], fresh_dates])
+        rates = np.vstack([old[keep], fresh])
+        order = np.argsort(dates, kind="stable")
+        self.currencies, self.dates, self.rates = currencies, dates[order], rates[order]
+
+    def _fetch_range(self, start: dt.date, end: dt.date) -> Optional[List[Dict[str, Dict[str, float]]]]:
+        """Fetch ``start..end`` in chunks; None if any request failed."""
+        chunks = []
+        chunk_start = start
+        while chunk_start <= end:
+            chunk_end = min(end, chunk_start + dt.timedelta(days=FETCH_CHUNK_DAYS - 1))
+            by_date = self._fetch(chunk_start, chunk_end)
+            if by_date is None:
+                return None
+            chunks.append(by_date)
+            chunk_start = chunk_end + dt.timedelta(days=1)
+        return chunks
+
+    def _missing(self, start: dt.date, end: dt.date) -> Tuple[Optional[DateRange], Optional[DateRange]]:
+        """(history, newest) ranges still to fetch for ``start..end``, each None when not needed."""
+        with self._lock:
+            now = time.time()
+            if now < self.retry_at:
+                return None, None
+            history = None
+            if self.first_day is None:
+                history = (start, end)  # the very first fetch also covers the newest fix
+            elif start < self.first_day:
+                history = (start, self.first_day - dt.timedelta(days=1))
+            newest = self.latest_date()
+            if newest is not None and newest < end and now >= self.next_refresh:
+                return history, (newest + dt.timedelta(days=1), end)
+            return history, None
+
+    @timed("fxstore.ensure")
+    def ensure(self, start: dt.date, end: Optional[dt.date] = None) -> None:
+        """
+        Make sure every fix from ``start`` to ``end`` (today by default) is stored,
+        requesting only what is missing: history before ``first_day``, and the
+        days after the newest stored fix once the next ECB fixing is due.
+        Requests run without holding the matrix lock, so readers of stored rates
+        never wait for the network. Upstream errors leave the store as it was
+        and pause fetching for ``FAILURE_COOLDOWN``; callers then see older data.
+        """
+        today = dt.date.today()
+        end = min(end or today, today)
+        history, newest = self._missing(start, end)
+        if history is None and newest is None:
+            return
+        # stored rates still answer a caller that only lacks the newest fix: it does not queue behind another fetch
+        if not self._fetch_lock.acquire(blocking=history is not None):
+            return
+        try:
+            history, newest = self._missing(start, end)  # a concurrent fetch may have covered it
+            fetched = [(span, self._fetch_range(*span)) for span in (history, newest) if span is not None]
+            with self._lock:
+                self._apply(history, fetched)
+        finally:
+            self._fetch_lock.release()
+
+    def _apply(self, history: Optional[DateRange], fetched: List[Tuple[DateRange, Optional[list]]]) -> None:
+        """Merge fetched ranges into the matrix (under ``_lock``) and save; a failed one starts the cooldown."""
+        changed = False
+        for span, chunks in fetched:
+            if chunks is None:
+                self.retry_at = time.time() + FAILURE_COOLDOWN
+                continue
+            covers_latest = span != history or self.first_day is None
+            for by_date in chunks:
+                self._merge(by_date)
+            if span == history:
+                self.first_day = span[0]
+            if covers_latest:
+                self.next_refresh = time.time() + seconds_until_next_ecb_fix()
+            changed = True
+        if changed:
+            self._save()
+
+    def refresh(self) -> None:
+        """Bring the newest fix up to date (a no-op until the next ECB publication is due)."""
+        self.ensure(self.first_day or dt.date.today() - dt.timedelta(days=LATEST_LOOKBACK_DAYS))
+
+    # -- queries ---------------------------------------------------------
+
+    def latest_date(self) -> Optional[dt.date]:
+        return self.dates[-1].astype(dt.date) if len(self.dates) else None
+
+    def _pair(self, base: str, target: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(dates, base->target rates) over the stored days where both currencies have a fix."""
+        col = {c: j for j, c in enumerate(self.currencies)}
+        i, j = col.get(base.upper()), col.get(target.upper())
+        if i is None or j is None:
+            return None
+        rates = self.rates[:, j] / self.rates[:, i]
+        ok = ~np.isnan(rates)
+        return self.dates[ok], rates[ok]
+
+    @timed("fxstore.rate")
+    def rate(self, base: str, target: str) -> Optional[Tuple[float, dt.date]]:
+        """Latest ``base`` -> ``target`` rate and its fixing date, or None if either currency is unknown."""
+        self.refresh()
+        with self._lock:
+            pair = self._pair(base, target)
+        if pair is None or not len(pair[0]):
+            return None
+        dates, rates = pair
+        return float(rates[-1]), dates[-1].astype(dt.date)
+
+    @timed("fxstore.history")
+    def history(self, base: str, target: str, days: int = 7) -> Optional[pd.DataFrame]:
+        """Daily ``base`` -> ``target`` rates of the last ``days`` days, indexed by ``date`` (column ``rate``)."""
+        start = dt.date.today() - dt.timedelta(days=days)
+        self.ensure(start)
+        with self._lock:
+            pair = self._pair(base, target)
+        if pair is None:
+            return None
+        dates, rates = pair
+        since = dates >= np.datetime64(start, "D")
+        df = pd.DataFrame({"date": pd.to_datetime(dates[since]), "rate": rates[since]})
+        return df.set_index("date") if len(df) else None
+
+    @timed("fxstore.panel")
+    def panel(self, base: str, targets: Sequence[str], days: int) -> Optional[pd.DataFrame]:
+        """
+        ``base`` -> each of ``targets`` over the last ``days`` days as one wide frame
+        (date index, one column per known target), divided out of the matrix in one go.
+        """
+        start = dt.date.today() - dt.timedelta(days=days)
+        self.ensure(start)
+        with self._lock:
+            col = {c: j for j, c in enumerate(self.currencies)}
+            i = col.get(base.upper())
+            known = [t.upper() for t in targets if t.upper() in col]
+            if i is None or not known:
+                return None
+            since = self.dates >= np.datetime64(start, "D")
+            values = self.rates[since][:, [col[t] for t in known]] / self.rates[since][:, [i]]
+            dates = self.dates[since]
+        if not len(dates):
+            return None
+        return pd.DataFrame(values, index=pd.DatetimeIndex(pd.to_datetime(dates), name="date"), columns=known)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            latest = self.latest_date()
+            return {
+                "days": int(len(self.dates)),
+                "currencies": len(self.currencies),
+                "first_day": self.first_day.isoformat() if self.first_day else None,
+                "latest": latest.isoformat() if latest else None,
+                "requests": self.requests,
+            }
+
+
+_store: Optional[FxRateStore] = None
+_ready = False
+_lock = threading.Lock()
+
+
+def get_fx_store() -> Optional[FxRateStore]:
+    """The process-wide store in ``INTELLIDASH_FX_DIR``, opened on first use; None when disabled or unusable."""
+    global _store, _ready
+    if _ready:
+        return _store
+    with _lock:
+        if not _ready:
+            directory = default_dir()
+            if directory is not None:
+                try:
+                    _store = FxRateStore(directory)
+                except OSError:
+                    _store = None
+            _ready = True
+    return _store
+
+
+def set_fx_store(store: Optional[FxRateStore]) -> None:
+    """Use ``store`` (or none) for this process instead of ``INTELLIDASH_FX_DIR``."""
+    global _store, _ready
+    with _lock:
+        _store, _ready = store, True
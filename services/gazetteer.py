@@ -0,0 +1,301 @@
+"""
+Optional offline gazetteer that answers geocode_city without a network round trip.
+
+``build_index`` turns a GeoNames dump (``cities15000.txt``, ``allCountries.zip``,
+...; tab-separated, see https://download.geonames.org/export/dump/) into a
+directory of flat NumPy arrays: per-place columns (coordinates, population,
+country, ...) plus a sorted table of normalized names and aliases pointing at
+them. ``Gazetteer`` memory-maps those files, so opening it is instant, pages are
+shared between processes, and a lookup is a binary search over the sorted keys.
+
+Names are matched case-, accent- and whitespace-insensitively; the most
+populous place wins. ``prefix`` and ``fuzzy`` serve autocomplete-style and
+misspelled queries.
+
+    python -m services.gazetteer cities15000.zip -o .cache/gazetteer
+"""
+
+from __future__ import annotations
+import argparse
+import bisect
+import io
+import json
+import os
+import re
+import threading
+import unicodedata
+import zipfile
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+FORMAT_VERSION = 1
+# Leading bytes of every key kept in a fixed-width array, searched with np.searchsorted
+_HEAD = 8
+
+# GeoNames "geoname" table columns used here
+_ID, _NAME, _ASCII, _ALT, _LAT, _LON, _FCLASS, _FCODE, _CC = 0, 1, 2, 3, 4, 5, 6, 7, 8
+_POP, _ELEV, _DEM, _TZ = 14, 15, 16, 17
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize(name: str) -> str:
+    """Case-fold, strip accents and collapse whitespace: "  São  Paulo" -> "sao paulo"."""
+    decomposed = unicodedata.normalize("NFKD", name.casefold())
+    return _SPACE_RE.sub(" ", "".join(c for c in decomposed if not unicodedata.combining(c))).strip()
+
+
+def _open_dump(path: Path) -> io.TextIOBase:
+    if path.suffix.lower() == ".zip":
+        zf = zipfile.ZipFile(path)
+        member = next(n for n in zf.namelist() if n.endswith(".txt") and not n.startswith("readme"))
+        return io.TextIOWrapper(zf.open(member), encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+def _iter_places(path: Path, feature_classes: str, min_population: int) -> Iterator[List[str]]:
+    with _open_dump(path) as f:
+        for line in f:
+            rec = line.rstrip("\n").split("\t")
+            if len(rec) < 18 or rec[_FCLASS] not in feature_classes:
+                continue
+            if int(rec[_POP] or 0) < min_population:
+                continue
+            yield rec
+
+
+def build_index(dump: os.PathLike, out_dir: os.PathLike, feature_classes: str = "P", min_population: int = 0) -> int:
+    """Write the gazetteer arrays for ``dump`` into ``out_dir``; return the number of places."""
+    ids, lats, lons, pops, elevs, ccs, fcodes, tz_ids, names = [], [], [], [], [], [], [], [], []
+    timezones: Dict[str, int] = {}
+    key_list: List[Tuple[bytes, int, int]] = []  # (normalized key, -population, place)
+    for rec in _iter_places(Path(dump), feature_classes, min_population):
+        place = len(ids)
+        pop = int(rec[_POP] or 0)
+        ids.append(int(rec[_ID]))
+        lats.append(float(rec[_LAT]))
+        lons.append(float(rec[_LON]))
+        pops.append(pop)
+        elev = rec[_ELEV] or rec[_DEM]
+        elevs.append(float(elev) if elev and elev != "-9999" else np.nan)
+        ccs.append(rec[_CC])
+        fcodes.append(rec[_FCODE])
+        tz_ids.append(timezones.setdefault(rec[_TZ], len(timezones)))
+        names.append(rec[_NAME])
+        aliases = {rec[_NAME], rec[_ASCII], *(rec[_ALT].split(",") if rec[_ALT] else ())}
+        for key in {normalize(a) for a in aliases if a}:
+            if key:
+                key_list.append((key.encode("utf-8"), -pop, place))
+
+    key_list.sort()
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    blob, offsets = _pack([k for k, _, _ in key_list])
+    name_blob, name_offsets = _pack([n.encode("utf-8") for n in names])
+    arrays = {
+        "id": np.asarray(ids, dtype=np.int64),
+        "latitude": np.asarray(lats, dtype=np.float64),
+        "longitude": np.asarray(lons, dtype=np.float64),
+        "population": np.asarray(pops, dtype=np.int64),
+        "elevation": np.asarray(elevs, dtype=np.float32),
+        "country_code": np.asarray(ccs, dtype="S2"),
+        "feature_code": np.asarray(fcodes, dtype="S10"),
+        "timezone": np.asarray(tz_ids, dtype=np.int32),
+        "name_blob": name_blob,
+        "name_offsets": name_offsets,
+        "key_blob": blob,
+        "key_offsets": offsets,
+        "key_head": np.asarray([k[:_HEAD] for k, _, _ in key_list], dtype=f"S{_HEAD}"),
+        "key_place": np.asarray([p for _, _, p in key_list], dtype=np.int32),
+    }
+    for name, arr in arrays.items():
+        np.save(out / f"{name}.npy", arr)
+    meta = {"version": FORMAT_VERSION, "places": len(ids), "keys": len(key_list), "timezones": list(timezones)}
+    (out / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+    return len(ids)
+
+
+def _pack(items: Sequence[bytes]) -> Tuple[np.ndarray, np.ndarray]:
+    offsets = np.zeros(len(items) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in items], out=offsets[1:])
+    return np.frombuffer(b"".join(items), dtype=np.uint8), offsets
+
+
+class _Strings(Sequence):
+    """Read-only sequence of byte strings over a memory-mapped blob + offsets (bisect-able)."""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> bytes:
+        return self._blob[self._offsets[i]:self._offsets[i + 1]].tobytes()
+
+
+def _levenshtein(a: str, b: str, limit: int) -> int:
+    """Edit distance of ``a`` and ``b``, or ``limit + 1`` once it is known to exceed ``limit``."""
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        if min(cur) > limit:
+            return limit + 1
+        prev = cur
+    return prev[-1]
+
+
+class Gazetteer:
+    """Memory-mapped place index written by ``build_index``."""
+
+    def __init__(self, directory: os.PathLike):
+        self.directory = Path(directory)
+        meta = json.loads((self.directory / "meta.json").read_text(encoding="utf-8"))
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"unsupported gazetteer format {meta.get('version')!r} in {self.directory}")
+        self._timezones = meta["timezones"]
+        a = {p.stem: np.load(p, mmap_mode="r") for p in self.directory.glob("*.npy")}
+        self._a = a
+        self._keys = _Strings(a["key_blob"], a["key_offsets"])
+        self._head = a["key_head"]
+        self._keys_offsets = a["key_offsets"]
+        self._names = _Strings(a["name_blob"], a["name_offsets"])
+        self._key_place = a["key_place"]
+
+    def __len__(self) -> int:
+        return len(self._a["id"])
+
+    def place(self, i: int) -> Dict[str, Any]:
+        """Place ``i`` in the shape of an Open-Meteo geocoding result."""
+        a = self._a
+        elevation = float(a["elevation"][i])
+        return {
+            "id": int(a["id"][i]),
+            "name": self._names[i].decode("utf-8"),
+            "latitude": float(a["latitude"][i]),
+            "longitude": float(a["longitude"][i]),
+            "elevation": None if np.isnan(elevation) else elevation,
+            "feature_code": a["feature_code"][i].decode("ascii"),
+            "country_code": a["country_code"][i].decode("ascii"),
+            "timezone": self._timezones[int(a["timezone"][i])],
+            "population": int(a["population"][i]),
+            "source": "gazetteer",
+        }
+
+    def _range(self, prefix: bytes) -> Tuple[int, int]:
+        """Positions ``[lo, hi)`` of the sorted keys that start with ``prefix``."""
+        head = prefix[:_HEAD]
+        # Narrow down in C on the fixed-width heads, then bisect the full keys in that slice
+        lo = int(np.searchsorted(self._head, head, side="left"))
+        if len(prefix) < _HEAD:
+            return lo, int(np.searchsorted(self._head, head + b"\xff", side="left"))
+        hi = int(np.searchsorted(self._head, head, side="right"))
+        lo = bisect.bisect_left(self._keys, prefix, lo, hi)
+        # 0xff never occurs in UTF-8, so this bounds every key starting with ``prefix``
+        return lo, bisect.bisect_left(self._keys, prefix + b"\xff", lo, hi)
+
+    def _distinct(self, positions: Iterator[int], limit: int) -> List[Dict[str, Any]]:
+        seen, out = set(), []
+        for pos in positions:
+            place = int(self._key_place[pos])
+            if place not in seen:
+                seen.add(place)
+                out.append(place)
+        out.sort(key=lambda p: -int(self._a["population"][p]))
+        return [self.place(p) for p in out[:limit]]
+
+    def geocode(self, name: str) -> Optional[Dict[str, Any]]:
+        """Most populous place whose name or alias matches ``name`` exactly (after normalization)."""
+        key = normalize(name).encode("utf-8")
+        if not key:
+            return None
+        pos, hi = self._range(key)
+        # keys are sorted by (key, -population), so the first match is the most populous
+        if pos < hi and self._keys[pos] == key:
+            return self.place(int(self._key_place[pos]))
+        return None
+
+    def prefix(self, text: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Places with a name or alias starting with ``text``, most populous first."""
+        key = normalize(text).encode("utf-8")
+        if not key:
+            return []
+        lo, hi = self._range(key)
+        return self._distinct(iter(range(lo, hi)), limit)
+
+    def fuzzy(self, text: str, max_distance: int = 2, limit: int = 5, max_scan: int = 50_000) -> List[Dict[str, Any]]:
+        """
+        Places whose name or alias is within ``max_distance`` edits of ``text``,
+        closest then most populous first. Candidates share the first character,
+        so typos there are not found.
+        """
+        q = normalize(text)
+        if not q:
+            return []
+        lo, hi = self._range(q[0].encode("utf-8"))
+        hi = min(hi, lo + max_scan)
+        # Only keys of a compatible (byte) length can be within max_distance edits
+        lengths = np.diff(self._keys_offsets[lo:hi + 1])
+        qlen = len(q.encode("utf-8"))
+        near = np.flatnonzero(np.abs(lengths - qlen) <= 2 * max_distance) + lo
+        hits: Dict[int, int] = {}
+        for pos in near.tolist():
+            key = self._keys[pos].decode("utf-8")
+            if abs(len(key) - len(q)) > max_distance:
+                continue
+            d = _levenshtein(q, key, max_distance)
+            if d <= max_distance:
+                place = int(self._key_place[pos])
+                hits[place] = min(d, hits.get(place, d))
+        ranked = sorted(hits, key=lambda p: (hits[p], -int(self._a["population"][p])))
+        return [dict(self.place(p), distance=hits[p]) for p in ranked[:limit]]
+
+
+_gazetteer: Optional[Gazetteer] = None
+_ready = False
+_lock = threading.Lock()
+
+
+def get_gazetteer() -> Optional[Gazetteer]:
+    """The index in ``INTELLIDASH_GAZETTEER_DIR``, opened once per process; None when unset or unreadable."""
+    global _gazetteer, _ready
+    if _ready:
+        return _gazetteer
+    with _lock:
+        if not _ready:
+            directory = os.getenv("INTELLIDASH_GAZETTEER_DIR")
+            if directory:
+                try:
+                    _gazetteer = Gazetteer(directory)
+                except (OSError, ValueError, KeyError):
+                    _gazetteer = None
+            _ready = True
+    return _gazetteer
+
+
+def set_gazetteer(gazetteer: Optional[Gazetteer]) -> None:
+    """Use ``gazetteer`` (or none) for this process instead of ``INTELLIDASH_GAZETTEER_DIR``."""
+    global _gazetteer, _ready
+    with _lock:
+        _gazetteer, _ready = gazetteer, True
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Build the offline gazetteer from a GeoNames dump.")
+    parser.add_argument("dump", help="GeoNames dump (.txt or .zip), e.g. cities15000.zip")
+    parser.add_argument("-o", "--output", required=True, help="index directory (set INTELLIDASH_GAZETTEER_DIR to it)")
+    parser.add_argument("--feature-classes", default="P", help="GeoNames feature classes to keep (default: P, populated places)")
+    parser.add_argument("--min-population", type=int, default=0)
+    args = parser.parse_args(argv)
+    n = build_index(args.dump, args.output, args.feature_classes, args.min_population)
+    print(f"{n} places indexed in {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,165 @@
+"""
+Shared HTTP client for every services module.
+
+One process-wide ``requests.Session`` keeps a keep-alive connection pool per
+upstream host (Wikipedia, Algolia, Open-Meteo, Frankfurter), so repeated calls
+skip the TCP+TLS handshake. Idempotent GETs are retried with exponential backoff
+on connection errors and on 429/5xx, honouring ``Retry-After``. Identical GETs
+that are in flight at the same time are coalesced into one upstream request.
+Each upstream GET is recorded in ``services.metrics``, adapts the host's rate
+limit to throttling (``services.ratelimit``) and feeds its circuit breaker
+(``services.circuit``); a host whose circuit is open fails fast.
+
+Defaults can be overridden with environment variables or ``configure()``.
+"""
+
+from __future__ import annotations
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from services import circuit, metrics, ratelimit
+from services.singleflight import SingleFlight
+
+Timeout = Union[float, Tuple[float, float]]
+
+# Number of distinct hosts whose pools are kept alive, and sockets per host.
+POOL_CONNECTIONS = int(os.getenv("INTELLIDASH_HTTP_POOL_CONNECTIONS", "8"))
+POOL_MAXSIZE = int(os.getenv("INTELLIDASH_HTTP_POOL_MAXSIZE", "16"))
+# (connect, read) seconds used when a caller does not pass its own timeout.
+DEFAULT_TIMEOUT: Timeout = (
+    float(os.getenv("INTELLIDASH_HTTP_CONNECT_TIMEOUT", "3.05")),
+    float(os.getenv("INTELLIDASH_HTTP_READ_TIMEOUT", "10")),
+)
+RETRIES = int(os.getenv("INTELLIDASH_HTTP_RETRIES", "3"))
+BACKOFF_FACTOR = float(os.getenv("INTELLIDASH_HTTP_BACKOFF", "0.3"))
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_session: Optional[requests.Session] = None
+_lock = threading.Lock()
+_inflight = SingleFlight()
+
+
+def _build_session() -> requests.Session:
+    retry = Retry(
+        total=RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET"}),
+        respect_retry_after_header=True,
+        # Hand the last 429/5xx back to the caller instead of raising, so the
+        # services keep their "non-200 -> empty result" behaviour.
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def configure(
+    pool_connections: Optional[int] = None,
+    pool_maxsize: Optional[int] = None,
+    timeout: Optional[Timeout] = None,
+    retries: Optional[int] = None,
+    backoff_factor: Optional[float] = None,
+) -> None:
+    """Change pool/timeout/retry settings; the session is rebuilt on next use."""
+    global POOL_CONNECTIONS, POOL_MAXSIZE, DEFAULT_TIMEOUT, RETRIES, BACKOFF_FACTOR, _session
+    with _lock:
+        if pool_connections is not None:
+            POOL_CONNECTIONS = pool_connections
+        if pool_maxsize is not None:
+            POOL_MAXSIZE = pool_maxsize
+        if timeout is not None:
+            DEFAULT_TIMEOUT = timeout
+        if retries is not None:
+            RETRIES = retries
+        if backoff_factor is not None:
+            BACKOFF_FACTOR = backoff_factor
+        old, _session = _session, None
+    if old is not None:
+        old.close()
+
+
+def get(
+    url: str,
+    params: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[Timeout] = None,
+) -> requests.Response:
+    """
+    GET ``url`` through the shared pooled session, sharing identical in-flight requests.
+    Raises ``circuit.CircuitOpenError`` without sending anything while ``host`` is considered down.
+    """
+    host = urlsplit(url).netloc
+    probe = circuit.before_request(host)
+    key = (
+        url,
+        tuple(sorted((params or {}).items())),
+        tuple(sorted((headers or {}).items())),
+    )
+
+    def send() -> requests.Response:
+        ratelimit.acquire(host)
+        t0 = time.perf_counter()
+        try:
+            resp = get_session().get(
+                url,
+                params=params,
+                headers=headers,
+                timeout=DEFAULT_TIMEOUT if timeout is None else timeout,
+            )
+        except Exception as e:
+            metrics.observe_error(host, e, time.perf_counter() - t0)
+            circuit.record(host, error=e)
+            raise
+        except BaseException:
+            if probe:
+                circuit.release_probe(host)
+            raise
+        metrics.observe_response(host, resp, time.perf_counter() - t0)
+        circuit.record(host, status=resp.status_code)
+        ratelimit.observe(
+            host,
+            resp.status_code,
+            ratelimit.parse_retry_after(resp.headers.get("Retry-After")) if resp.status_code in (429, 503) else None,
+            throttled=_was_throttled(resp),
+        )
+        return resp
+
+    try:
+        resp = _inflight.do(key, send, label=host)
+    except Exception as e:
+        circuit.note_outcome(host, error=e)
+        raise
+    circuit.note_outcome(host, status=resp.status_code)
+    return resp
+
+
+def _was_throttled(resp: requests.Response) -> bool:
+    """True if urllib3 retried away a 429 before this response."""
+    history = getattr(getattr(getattr(resp, "raw", None), "retries", None), "history", None)
+    return isinstance(history, tuple) and any(getattr(h, "status", None) == 429 for h in history)
+
+
+def coalescing_stats() -> Dict[str, Dict[str, int]]:
+    """Per-host counts of GETs sent upstream ("executed") and GETs that joined one ("coalesced")."""
+    return _inflight.stats()
@@ -0,0 +1,109 @@
+"""
+In-process latency and traffic metrics for the upstream services and NLP.
+
+Every service function and NLP entry point is wrapped with ``timed(name)``
+(from ``telemetry.registry``), which records a latency histogram and an error
+count per function. The shared HTTP client reports per-host latency, status
+codes, retries and bytes with ``observe_response``/``observe_error``.
+``render_prometheus`` exports all of it, plus the response-cache and
+coalescing counters, in the Prometheus text format; ``start_metrics_server``
+serves that on ``/metrics`` for scraping.
+"""
+
+from __future__ import annotations
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+# The registry lives in a layer-neutral module (the NLP code records into it too); re-exported here
+from telemetry.registry import BUCKETS, REGISTRY, Histogram, Labels, Registry, timed  # noqa: F401
+
+
+def observe_response(host: str, resp: Any, elapsed: float, retries: Optional[int] = None) -> None:
+    """Record an upstream response: latency, status code, retries and body size."""
+    REGISTRY.observe("intellidash_http_request_seconds", elapsed, host=host)
+    REGISTRY.inc("intellidash_http_responses_total", host=host, status=str(getattr(resp, "status_code", "")))
+    if retries is None:
+        # requests/urllib3 keep the retry history on the raw response
+        history = getattr(getattr(getattr(resp, "raw", None), "retries", None), "history", None)
+        retries = len(history) if isinstance(history, tuple) else 0
+    if retries:
+        REGISTRY.inc("intellidash_http_retries_total", retries, host=host)
+    content = getattr(resp, "content", None)
+    if isinstance(content, (bytes, bytearray)):
+        REGISTRY.inc("intellidash_http_response_bytes_total", len(content), host=host)
+
+
+def observe_error(host: str, error: BaseException, elapsed: float) -> None:
+    """Record an upstream GET that raised instead of returning a response."""
+    REGISTRY.observe("intellidash_http_request_seconds", elapsed, host=host)
+    REGISTRY.inc("intellidash_http_errors_total", host=host, error=type(error).__name__)
+
+
+def render_prometheus() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    from services import async_http, http_client
+    from services.cache import cache_stats
+
+    extra: Dict[Tuple[str, Labels], float] = {}
+    cache = cache_stats()
+    for source, c in cache["sources"].items():
+        for result, field in (("hit", "hits"), ("disk_hit", "disk_hits"), ("miss", "misses")):
+            extra[("intellidash_cache_lookups_total", (("result", result), ("source", source)))] = c[field]
+    for source, n in cache["stale_served"].items():
+        extra[("intellidash_cache_lookups_total", (("result", "stale"), ("source", source)))] = n
+    for source, n in cache["revalidated"].items():
+        extra[("intellidash_cache_lookups_total", (("result", "revalidate"), ("source", source)))] = n
+    # blocking and async clients counted together
+    for stats in (http_client.coalescing_stats(), async_http.coalescing_stats()):
+        for host, c in stats.items():
+            for kind in ("executed", "coalesced"):
+                key = ("intellidash_http_coalesced_total", (("host", host), ("kind", kind)))
+                extra[key] = extra.get(key, 0) + c[kind]
+    return REGISTRY.render(extra)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: Optional[int] = None, addr: Optional[str] = None) -> Optional[ThreadingHTTPServer]:
+    """
+    Serve ``/metrics`` on a daemon thread, once per process. The port defaults to
+    ``INTELLIDASH_METRICS_PORT``; without one (or if the port is taken) nothing is started.
+    The bind address defaults to ``INTELLIDASH_METRICS_ADDR`` (loopback unless set,
+    e.g. ``0.0.0.0`` to be scraped from outside a container).
+    """
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return _server
+        if port is None:
+            port = int(os.getenv("INTELLIDASH_METRICS_PORT", "0") or 0)
+            if not port:
+                return None
+        if addr is None:
+            addr = os.getenv("INTELLIDASH_METRICS_ADDR", "127.0.0.1")
+        try:
+            _server = ThreadingHTTPServer((addr, port), _Handler)
+        except OSError:
+            return None
+        threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+        return _server
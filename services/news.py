@@ -1,11 +1,23 @@
-import requests
+from services import async_http, http_client
+from services.cache import cached
+from services.metrics import timed
 from typing import List, Dict, Any
 
 BASE = "https://hn.algolia.com/api/v1/search"
 
-def search_hn(query: str, hits_per_page: int = 10) -> List[Dict[str, Any]]:
-    r = requests.get(BASE, params={"query": query, "tags": "story", "hitsPerPage": hits_per_page}, timeout=10)
+def _hits(r) -> List[Dict[str, Any]]:
     if r.status_code != 200:
         return []
     js = r.json()
     return js.get("hits", [])
+
+@timed("news.search_hn")
+@cached("news.search")
+def search_hn(query: str, hits_per_page: int = 10) -> List[Dict[str, Any]]:
+    return _hits(http_client.get(BASE, params={"query": query, "tags": "story", "hitsPerPage": hits_per_page}))
+
+@timed("news.search_hn_async")
+@cached("news.search")
+async def search_hn_async(query: str, hits_per_page: int = 10) -> List[Dict[str, Any]]:
+    """Async version of search_hn (shares its cache entries)."""
+    return _hits(await async_http.get(BASE, params={"query": query, "tags": "story", "hitsPerPage": hits_per_page}))
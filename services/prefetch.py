@@ -0,0 +1,126 @@
+"""
+Refresh-ahead scheduler for the most frequent Smart Search queries.
+
+Stale-while-revalidate (``services.cache``) makes an expired entry instant,
+but the first request after the revalidation window still waits for the
+upstream. ``HotQueryRefresher`` counts the queries of the most recent analytics
+rows (fed by the app's ``add_analytics_row``, and seeded from the shared
+analytics dataset on start) and every ``INTERVAL`` seconds runs the ``TOP_N``
+most frequent ones through ``smart_aggregate`` inside ``cache.refresh_ahead``:
+entries that would expire before the next round are fetched again, everything
+else is a cache hit. Searching a hot query therefore never blocks on the network.
+"""
+
+from __future__ import annotations
+import os
+import threading
+from collections import Counter, deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from services import cache
+from services.aggregate import smart_aggregate
+
+TOP_N = int(os.getenv("INTELLIDASH_PREFETCH_TOP_N", "20"))
+INTERVAL = float(os.getenv("INTELLIDASH_PREFETCH_INTERVAL", "60"))
+# How many of the most recent searches are counted
+HISTORY = 1000
+# Sidebar defaults of the app; cache keys include them, so seeded queries are refreshed with these
+MAX_NEWS = 10
+MAX_WIKI = 5
+
+# query, max_news, max_wiki
+Search = Tuple[str, int, int]
+
+
+class HotQueryRefresher:
+    """Counts recent searches and keeps the cache entries of the ``top_n`` most frequent ones fresh."""
+
+    def __init__(self, top_n: int = TOP_N, interval: float = INTERVAL, history: int = HISTORY):
+        self.top_n = top_n
+        self.interval = interval
+        self._recent: Deque[Search] = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.rounds = 0
+        self.refreshed = 0
+        self.errors = 0
+
+    def record(self, query: str, max_news: int = MAX_NEWS, max_wiki: int = MAX_WIKI) -> None:
+        """Count one search (the query of an analytics row and the settings it ran with)."""
+        if query and query.strip():
+            with self._lock:
+                self._recent.append((query, max_news, max_wiki))
+
+    def seed(self, queries: Iterable[str]) -> None:
+        """Count earlier searches, oldest first, e.g. the ``query`` column of stored analytics rows."""
+        for query in queries:
+            self.record(query)
+
+    def hot_queries(self) -> List[Search]:
+        """The ``top_n`` most frequent recent searches, most frequent first."""
+        with self._lock:
+            counts = Counter(self._recent)
+        return [search for search, _ in counts.most_common(self.top_n)]
+
+    def run_once(self) -> List[Search]:
+        """Refresh every hot search whose entries expire before the round after next; return the searches run."""
+        hot = self.hot_queries()
+        # covers the next round starting late by up to one interval
+        with cache.refresh_ahead(2 * self.interval):
+            for query, max_news, max_wiki in hot:
+                try:
+                    smart_aggregate(query, max_news, max_wiki)
+                    self.refreshed += 1
+                except Exception:
+                    self.errors += 1
+        self.rounds += 1
+        return hot
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="hot-query-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            tracked = len(self._recent)
+        return {"tracked": tracked, "rounds": self.rounds, "refreshed": self.refreshed, "errors": self.errors}
+
+
+_refresher: Optional[HotQueryRefresher] = None
+_ready = False
+_lock = threading.Lock()
+
+
+def get_refresher(seed: Optional[Callable[[], Iterable[str]]] = None) -> Optional[HotQueryRefresher]:
+    """
+    The process-wide refresher, seeded with ``seed()`` and started on first use;
+    None when ``INTELLIDASH_PREFETCH_TOP_N`` is 0.
+    """
+    global _refresher, _ready
+    if _ready:
+        return _refresher
+    with _lock:
+        if not _ready:
+            if TOP_N > 0:
+                _refresher = HotQueryRefresher()
+                if seed is not None:
+                    try:
+                        _refresher.seed(seed())
+                    except Exception:
+                        pass  # start cold rather than not at all
+                _refresher.start()
+            _ready = True
+    return _refresher
@@ -0,0 +1,180 @@
+"""
+Per-host token-bucket rate limits for upstream calls.
+
+No host is limited by default; batch jobs (see batch_search.py) call
+``set_rate_limit`` so a few thousand queries do not hammer Wikipedia or Algolia.
+
+Limits adapt to the upstream (AIMD): the HTTP clients ``observe`` every
+response, a 429 (or a 503 with ``Retry-After``) halves the host's rate and
+pauses it for the ``Retry-After`` delay, and each success adds a little back,
+up to the configured rate. A host that throttles us without a configured limit
+gets a bucket starting at ``ADAPTIVE_START_RPS``, which is dropped again once it
+has recovered to ``ADAPTIVE_RELEASE_RPS``.
+"""
+
+from __future__ import annotations
+import asyncio
+import datetime as dt
+import email.utils
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+ADAPTIVE_START_RPS = float(os.getenv("INTELLIDASH_ADAPTIVE_START_RPS", "10"))
+ADAPTIVE_RELEASE_RPS = float(os.getenv("INTELLIDASH_ADAPTIVE_RELEASE_RPS", "50"))
+# Lowest rate a throttled host is slowed down to, and the rate regained per successful response
+MIN_RPS = 0.2
+RECOVERY_RPS = 0.1
+
+
+class TokenBucket:
+    """
+    Allow ``rate`` acquisitions per second on average, with bursts of up to ``burst``.
+    ``slow_down``/``speed_up`` move the rate between ``MIN_RPS`` and ``ceiling``
+    (the initial rate unless given).
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None, ceiling: Optional[float] = None):
+        self.rate = float(rate)
+        self.ceiling = float(ceiling if ceiling is not None else rate)
+        self.capacity = float(burst if burst is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> float:
+        """Take one token if available and return 0, else return the seconds until one will be."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            self._refill(now)
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return 0.0
+            return (1.0 - self._tokens) / self.rate
+
+    def slow_down(self, retry_after: Optional[float] = None) -> None:
+        """Halve the rate (multiplicative decrease) and, if given, pause for ``retry_after`` seconds."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(MIN_RPS, self.rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+
+    def speed_up(self) -> None:
+        """Win back ``RECOVERY_RPS`` after a successful response (additive increase), up to the ceiling."""
+        with self._lock:
+            if self.rate < self.ceiling:
+                self._refill(time.monotonic())
+                self.rate = min(self.ceiling, self.rate + RECOVERY_RPS)
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Take one token, sleeping until one is available; False if ``timeout`` expires first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    async def acquire_async(self) -> None:
+        """Like ``acquire`` without a timeout, but waits on the event loop (and can be cancelled)."""
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+
+_buckets: Dict[str, TokenBucket] = {}
+# Hosts whose bucket was created by ``observe`` rather than configured
+_adaptive: set = set()
+_lock = threading.Lock()
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a ``Retry-After`` header (delta-seconds or HTTP date); None if absent or invalid."""
+    if not isinstance(value, str) or not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=dt.timezone.utc)
+    return max(0.0, (when - dt.datetime.now(dt.timezone.utc)).total_seconds())
+
+
+def observe(host: str, status: int, retry_after: Optional[float] = None, throttled: bool = False) -> None:
+    """
+    Adapt ``host``'s limit to a response: slow down on 429 (or when ``throttled``,
+    e.g. a 429 that was retried away), or on a 503 with ``Retry-After``; speed up on success.
+    """
+    if status == 429 or throttled or (status == 503 and retry_after is not None):
+        with _lock:
+            bucket = _buckets.get(host)
+            if bucket is None:
+                bucket = _buckets[host] = TokenBucket(ADAPTIVE_START_RPS, ceiling=ADAPTIVE_RELEASE_RPS)
+                _adaptive.add(host)
+        bucket.slow_down(retry_after)
+    elif 200 <= status < 400:
+        bucket = _buckets.get(host)
+        if bucket is not None:
+            bucket.speed_up()
+            if host in _adaptive and bucket.rate >= bucket.ceiling:
+                with _lock:
+                    if _buckets.get(host) is bucket:
+                        del _buckets[host]
+                    _adaptive.discard(host)
+
+
+def set_rate_limit(host: str, rate: float, burst: Optional[float] = None) -> None:
+    """Limit requests to ``host`` to ``rate`` per second (``rate <= 0`` removes the limit)."""
+    with _lock:
+        _adaptive.discard(host)
+        if rate <= 0:
+            _buckets.pop(host, None)
+        else:
+            _buckets[host] = TokenBucket(rate, burst)
+
+
+def reset() -> None:
+    """Remove every limit, configured or adaptive."""
+    with _lock:
+        _buckets.clear()
+        _adaptive.clear()
+
+
+def rate_limits() -> Dict[str, float]:
+    """Current requests-per-second limit per host (lower than configured while a host throttles us)."""
+    with _lock:
+        return {host: b.rate for host, b in _buckets.items()}
+
+
+def acquire(host: str) -> None:
+    """Block until a request to ``host`` is allowed (no-op for unlimited hosts)."""
+    bucket = _buckets.get(host)
+    if bucket is not None:
+        bucket.acquire()
+
+
+async def acquire_async(host: str) -> None:
+    """Wait on the event loop until a request to ``host`` is allowed."""
+    bucket = _buckets.get(host)
+    if bucket is not None:
+        await bucket.acquire_async()
@@ -0,0 +1,116 @@
+"""
+Request coalescing ("single-flight") for identical in-flight upstream calls.
+
+When several sessions ask for the same thing at the same moment (a trending
+topic, a popular city), only the first caller goes upstream; the others wait on
+that call and receive the same result, or the same exception.
+``AsyncSingleFlight`` does the same for coroutines on an event loop.
+"""
+
+from __future__ import annotations
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Run at most one ``fn`` per key at a time and share its outcome with concurrent callers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any], label: str = "default") -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            counts = self._stats.setdefault(label, {"executed": 0, "coalesced": 0})
+            counts["executed" if leader else "coalesced"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Per-label counts of calls that went upstream vs. calls that were coalesced."""
+        with self._lock:
+            return {label: dict(c) for label, c in self._stats.items()}
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+class _AsyncCall:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+
+
+class AsyncSingleFlight(SingleFlight):
+    """
+    Coroutine version: the first caller's ``fn()`` runs as a task on its event
+    loop and later callers on the same loop await that task. A caller that is
+    cancelled only stops waiting; the shared task is cancelled when its last
+    waiter goes away, so an abandoned request does not keep running.
+    """
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]], label: str = "default") -> Any:
+        loop = asyncio.get_running_loop()
+        full_key = (loop, key)  # tasks belong to one loop
+        with self._lock:
+            call = self._calls.get(full_key)
+            leader = call is None
+            if leader:
+                call = self._calls[full_key] = _AsyncCall(loop.create_task(fn()))
+                call.task.add_done_callback(lambda _: self._forget(full_key, call))
+            call.waiters += 1
+            counts = self._stats.setdefault(label, {"executed": 0, "coalesced": 0})
+            counts["executed" if leader else "coalesced"] += 1
+
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if not call.task.done():
+                with self._lock:
+                    call.waiters -= 1
+                    last = call.waiters == 0
+                if last:
+                    call.task.cancel()
+            raise
+
+    def _forget(self, full_key: Hashable, call: _AsyncCall) -> None:
+        with self._lock:
+            if self._calls.get(full_key) is call:
+                del self._calls[full_key]
@@ -1,11 +1,42 @@
-import requests
-from typing import Optional, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from services import async_http, http_client
+from services.cache import cached
+from services.gazetteer import get_gazetteer
+from services.metrics import timed
+from typing import Optional, Dict, Any, Iterable, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
 
 BASE = "https://api.open-meteo.com/v1/forecast"
 GEOCODE = "https://geocoding-api.open-meteo.com/v1/search"
 
+HOURLY_VARIABLES = "temperature_2m,relative_humidity_2m,precipitation,cloud_cover,wind_speed_10m"
+# Locations per multi-location forecast request (keeps the URL well under server limits)
+FORECAST_BATCH = 50
+
+# Concurrent geocoding for the batch API (shared by all sessions)
+_GEOCODE_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="weather-geocode")
+
+def local_geocode(city: str) -> Optional[Dict[str, Any]]:
+    """Offline lookup in the local gazetteer; None when none is configured or on a miss."""
+    gazetteer = get_gazetteer()
+    return gazetteer.geocode(city) if gazetteer is not None else None
+
+@timed("weather.geocode_city")
 def geocode_city(city: str) -> Optional[Dict[str, Any]]:
-    r = requests.get(GEOCODE, params={"name": city, "count": 1, "language": "en", "format": "json"}, timeout=10)
+    """First match for ``city``: from the local gazetteer when it knows the name, else the geocoding API."""
+    return local_geocode(city) or _geocode_api(city)
+
+@timed("weather.geocode_city_async")
+async def geocode_city_async(city: str) -> Optional[Dict[str, Any]]:
+    """Async version of geocode_city."""
+    return local_geocode(city) or await _geocode_api_async(city)
+
+def _geocode_params(city: str) -> Dict[str, Any]:
+    return {"name": city, "count": 1, "language": "en", "format": "json"}
+
+def _first_result(r) -> Optional[Dict[str, Any]]:
     if r.status_code != 200:
         return None
     js = r.json()
@@ -13,16 +44,107 @@ def geocode_city(city: str) -> Optional[Dict[str, Any]]:
         return None
     return js["results"][0]
 
-def get_weather(lat: float, lon: float) -> Optional[Dict[str, Any]]:
-    params = {
+@cached("weather.geocode")
+def _geocode_api(city: str) -> Optional[Dict[str, Any]]:
+    return _first_result(http_client.get(GEOCODE, params=_geocode_params(city)))
+
+@cached("weather.geocode")
+async def _geocode_api_async(city: str) -> Optional[Dict[str, Any]]:
+    return _first_result(await async_http.get(GEOCODE, params=_geocode_params(city)))
+
+def _forecast_params(lat: float, lon: float) -> Dict[str, Any]:
+    return {
         "latitude": lat,
         "longitude": lon,
         "current_weather": True,
-        "hourly": "temperature_2m,relative_humidity_2m,precipitation,cloud_cover,wind_speed_10m",
+        "hourly": HOURLY_VARIABLES,
         "daily": "temperature_2m_max,temperature_2m_min,precipitation_sum,uv_index_max,sunrise,sunset",
         "timezone": "auto",
     }
-    r = requests.get(BASE, params=params, timeout=15)
+
+@timed("weather.get_weather")
+@cached("weather.forecast")
+def get_weather(lat: float, lon: float) -> Optional[Dict[str, Any]]:
+    r = http_client.get(BASE, params=_forecast_params(lat, lon), timeout=15)
     if r.status_code != 200:
         return None
     return r.json()
+
+@timed("weather.get_weather_async")
+@cached("weather.forecast")
+async def get_weather_async(lat: float, lon: float) -> Optional[Dict[str, Any]]:
+    """Async version of get_weather (shares its cache entries)."""
+    r = await async_http.get(BASE, params=_forecast_params(lat, lon), timeout=15)
+    if r.status_code != 200:
+        return None
+    return r.json()
+
+
+@timed("weather.geocode_cities")
+def geocode_cities(names: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+    """Geocode many city names concurrently: {name: first result or None}, duplicates resolved once."""
+    unique = list(dict.fromkeys(n.strip() for n in names if n and n.strip()))
+    return dict(zip(unique, _GEOCODE_POOL.map(geocode_city, unique)))
+
+
+@cached("weather.forecast")
+def _hourly_forecasts(coords: Tuple[Tuple[float, float], ...]) -> Optional[List[Dict[str, Any]]]:
+    """One multi-location Open-Meteo request; one forecast per coordinate pair, in order."""
+    params = {
+        "latitude": ",".join(f"{lat:.4f}" for lat, _ in coords),
+        "longitude": ",".join(f"{lon:.4f}" for _, lon in coords),
+        "hourly": HOURLY_VARIABLES,
+        "timezone": "GMT",  # one clock for every city, so rows line up side by side
+    }
+    r = http_client.get(BASE, params=params, timeout=15)
+    if r.status_code != 200:
+        return None
+    js = r.json()
+    # A single location comes back as an object, several as a list
+    return js if isinstance(js, list) else [js]
+
+
+@timed("weather.get_weather_many")
+def get_weather_many(locations: Sequence[Dict[str, Any]]) -> pd.DataFrame:
+    """
+    Hourly forecasts for many geocoded locations, fetched with one Open-Meteo
+    request per ``FORECAST_BATCH`` locations, as a single long frame with columns
+    city, country_code, latitude, longitude, time (UTC) and one per hourly variable.
+    """
+    variables = HOURLY_VARIABLES.split(",")
+    columns = ["city", "country_code", "latitude", "longitude", "time"] + variables
+    parts = []
+    for start in range(0, len(locations), FORECAST_BATCH):
+        chunk = locations[start:start + FORECAST_BATCH]
+        forecasts = _hourly_forecasts(tuple((g["latitude"], g["longitude"]) for g in chunk))
+        for g, fc in zip(chunk, forecasts or []):
+            hourly = (fc or {}).get("hourly") or {}
+            times = hourly.get("time") or []
+            if not times:
+                continue
+            n = len(times)
+            part = {
+                "city": np.full(n, g.get("name"), dtype=object),
+                "country_code": np.full(n, g.get("country_code"), dtype=object),
+                "latitude": np.full(n, g["latitude"], dtype=np.float64),
+                "longitude": np.full(n, g["longitude"], dtype=np.float64),
+                "time": pd.to_datetime(times),
+            }
+            for var in variables:
+                part[var] = np.asarray(hourly.get(var) or [None] * n, dtype=np.float64)
+            parts.append(pd.DataFrame(part, columns=columns))
+    if not parts:
+        return pd.DataFrame({c: pd.Series(dtype="float64") for c in columns})
+    return pd.concat(parts, ignore_index=True)
+
+
+@timed("weather.compare_cities")
+def compare_cities(names: Iterable[str]) -> pd.DataFrame:
+    """
+    Geocode ``names`` concurrently and fetch all their hourly forecasts in batched
+    multi-location requests. Cities that cannot be resolved are left out; the
+    ``city`` column holds the name as typed, so callers can tell which ones.
+    """
+    resolved = [dict(g, name=name) for name, g in geocode_cities(names).items() if g]
+    return get_weather_many(resolved)
+
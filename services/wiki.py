@@ -1,5 +1,11 @@
+import httpx
 import requests
-from typing import Optional, Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from services import async_http, cache, http_client
+from services.cache import cached
+from services.gazetteer import get_gazetteer
+from services.metrics import timed
+from typing import Optional, Dict, Any, List, Iterable, Iterator, Tuple
 
 BASE_SUMMARY = "https://en.wikipedia.org/api/rest_v1/page/summary/"
 SEARCH_URL   = "https://en.wikipedia.org/w/rest.php/v1/search/title"
@@ -10,21 +16,11 @@ HEADERS = {
     "User-Agent": "MyWikiClient/0.1 (example@example.com)"
 }
 
-def search_pages(query: str, limit: int = 5) -> List[Dict[str, Any]]:
-    """Search Wikipedia page titles and return the raw page dicts."""
-    try:
-
-        resp = requests.get(
-            SEARCH_URL,
-            params={"q": query, "limit": limit},
-            headers=HEADERS,
-            timeout=10,
-        )
-
-    except requests.RequestException as e:
-
-        return []
+# Parallel summary fetches for the batch API (shared by all sessions)
+_SUMMARY_POOL = ThreadPoolExecutor(max_workers=10, thread_name_prefix="wiki-summary")
 
+def _pages(resp) -> List[Dict[str, Any]]:
+    """Page dicts of a title search response (sync or async client)."""
     if resp.status_code != 200:
 
         return []
@@ -43,32 +39,131 @@ def search_pages(query: str, limit: int = 5) -> List[Dict[str, Any]]:
     return pages
 
 
-def get_summary(title: str) -> Optional[Dict[str, Any]]:
-    """Get the summary JSON for a given Wikipedia page title."""
+def _summary(resp) -> Optional[Dict[str, Any]]:
+    """Summary JSON of a page summary response (sync or async client)."""
+    if resp.status_code != 200:
+
+        return None
+
+    try:
+        data = resp.json()
+    except ValueError as e:
+
+        return None
+
+    #rint(f"[DEBUG] Summary JSON keys: {list(data.keys())}")
+    return data
+
+
+def _summary_url(title: str) -> str:
     from urllib.parse import quote
 
-    url = BASE_SUMMARY + quote(title)
+    return BASE_SUMMARY + quote(title)
 
 
+@timed("wiki.search_pages")
+@cached("wiki.search")
+def search_pages(query: str, limit: int = 5) -> List[Dict[str, Any]]:
+    """Search Wikipedia page titles and return the raw page dicts."""
     try:
-        resp = requests.get(url, headers=HEADERS, timeout=10)
+
+        resp = http_client.get(
+            SEARCH_URL,
+            params={"q": query, "limit": limit},
+            headers=HEADERS,
+        )
 
     except requests.RequestException as e:
 
-        return None
+        return []
 
-    if resp.status_code != 200:
+    return _pages(resp)
 
-        return None
 
+@timed("wiki.search_pages_async")
+@cached("wiki.search")
+async def search_pages_async(query: str, limit: int = 5) -> List[Dict[str, Any]]:
+    """Async version of search_pages (shares its cache entries)."""
     try:
-        data = resp.json()
-    except ValueError as e:
+        resp = await async_http.get(SEARCH_URL, params={"q": query, "limit": limit}, headers=HEADERS)
+    except (httpx.HTTPError, requests.RequestException):  # incl. circuit.CircuitOpenError
+        return []
+    return _pages(resp)
+
+
+@timed("wiki.get_summary")
+@cached("wiki.summary")
+def get_summary(title: str) -> Optional[Dict[str, Any]]:
+    """Get the summary JSON for a given Wikipedia page title."""
+    try:
+        resp = http_client.get(_summary_url(title), headers=HEADERS)
+
+    except requests.RequestException as e:
 
         return None
 
-    #rint(f"[DEBUG] Summary JSON keys: {list(data.keys())}")
-    return data
+    return _summary(resp)
+
+
+@timed("wiki.get_summary_async")
+@cached("wiki.summary")
+async def get_summary_async(title: str) -> Optional[Dict[str, Any]]:
+    """Async version of get_summary (shares its cache entries)."""
+    try:
+        resp = await async_http.get(_summary_url(title), headers=HEADERS)
+    except (httpx.HTTPError, requests.RequestException):  # incl. circuit.CircuitOpenError
+        return None
+    return _summary(resp)
+
+
+def iter_summaries(titles: Iterable[str]) -> Iterator[Tuple[str, Optional[Dict[str, Any]]]]:
+    """
+    Fetch the summaries of many titles in parallel and yield (title, summary)
+    as each one arrives, so callers can render results progressively.
+    """
+    unique = list(dict.fromkeys(t for t in titles if t))
+    futures = {_SUMMARY_POOL.submit(get_summary, t): t for t in unique}
+    for fut in as_completed(futures):
+        try:
+            summary = fut.result()
+        except Exception:
+            summary = None
+        yield futures[fut], summary
+
+
+@timed("wiki.get_summaries")
+def get_summaries(titles: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+    """Batch version of get_summary: {title: summary or None}, fetched in parallel."""
+    return dict(iter_summaries(titles))
+
+# Heuristics for places
+PLACE_KEYWORDS = [
+    "city", "town", "village", "country", "region", "province", "state",
+    "county", "district", "island", "mountain", "river", "lake", "park",
+    "municipality", "suburb", "neighborhood", "capital", "airport",
+    "railway station", "metro station",
+]
+
+# Heuristics for people / names / surnames
+PERSON_KEYWORDS = [
+    "surname", "family name", "given name", "person", "footballer",
+    "politician", "actor", "actress", "singer", "musician", "writer",
+    "novelist", "poet", "scientist", "physicist", "mathematician",
+    "chemist", "engineer", "entrepreneur", "businessman", "businesswoman",
+    "model", "director", "born ",
+]
+
+
+def _classify_text(text: str) -> str:
+    """'place' if any place keyword occurs in lowercase ``text``, else 'person' if any person keyword does, else 'unknown'."""
+    # Plain substring checks on purpose: CPython's `in` is a C-level fast search, and a
+    # compiled alternation (flat or trie-factored) measured about 2x slower on summary-sized text.
+    if any(kw in text for kw in PLACE_KEYWORDS):
+        return "place"
+    if any(kw in text for kw in PERSON_KEYWORDS):
+        return "person"
+    return "unknown"
+
 
 def _classify_from_summary(summary: Dict[str, Any]) -> str:
     """
@@ -80,53 +175,75 @@ def _classify_from_summary(summary: Dict[str, Any]) -> str:
         (summary.get("description") or "") + " " +
         (summary.get("extract") or "")
     ).lower()
+    return _classify_text(text)
 
-    # Heuristics for places
-    place_keywords = [
-        "city", "town", "village", "country", "region", "province", "state",
-        "county", "district", "island", "mountain", "river", "lake", "park",
-        "municipality", "suburb", "neighborhood", "capital", "airport",
-        "railway station", "metro station",
-    ]
-    if any(kw in text for kw in place_keywords):
-        return "place"
 
-    # Heuristics for people / names / surnames
-    person_keywords = [
-        "surname", "family name", "given name", "person", "footballer",
-        "politician", "actor", "actress", "singer", "musician", "writer",
-        "novelist", "poet", "scientist", "physicist", "mathematician",
-        "chemist", "engineer", "entrepreneur", "businessman", "businesswoman",
-        "model", "director", "born ",
-    ]
-    if any(kw in text for kw in person_keywords):
-        return "person"
+def page_title(page: Dict[str, Any]) -> str:
+    """Title of a search result page ('' when missing)."""
+    return page.get("title") or page.get("key") or ""
 
-    return "unknown"
 
+def classify_pages(pages: List[Dict[str, Any]]) -> Optional[str]:
+    """
+    Entity type of the top search result from signals that need no request:
+    an earlier classification of the same title, the short description that
+    the search API already returns, or an exact hit in the local gazetteer.
+    Returns None when those are ambiguous and the summary is needed.
+    """
+    if not pages:
+        return "unknown"
+    title = page_title(pages[0])
+    if not title:
+        return "unknown"
+
+    hit, kind = cache.lookup("wiki.classify", title)
+    if hit:
+        return kind
 
-def infer_entity_type_from_pages(pages: List[Dict[str, Any]]) -> str:
+    kind = _classify_text((pages[0].get("description") or "").lower())
+    if kind == "unknown":
+        gazetteer = get_gazetteer()
+        kind = "place" if gazetteer is not None and gazetteer.geocode(title) else None
+    if kind is not None:
+        cache.store("wiki.classify", title, kind)
+    return kind
+
+
+@timed("wiki.infer_entity_type")
+def infer_entity_type_from_pages(
+    pages: List[Dict[str, Any]],
+    summary: Optional[Dict[str, Any]] = None,
+) -> str:
     """
     Given the Wikipedia search results, infer what the query most likely is:
     'place', 'person', or 'unknown'.
-    We look at the first result's summary.
+    When the caller already fetched the first result's summary, pass it as
+    ``summary`` and it is classified directly. Otherwise the cheap signals of
+    ``classify_pages`` are tried first and the summary is only fetched when
+    they are ambiguous. Results are cached per title.
     """
     if not pages:
         return "unknown"
 
-    title = pages[0].get("title") or pages[0].get("key") or ""
+    title = page_title(pages[0])
     if not title:
         return "unknown"
 
-    try:
-        summary = get_summary(title)
-    except Exception:
-        return "unknown"
+    if summary is None:
+        kind = classify_pages(pages)
+        if kind is not None:
+            return kind
+        try:
+            summary = get_summary(title)
+        except Exception:
+            return "unknown"
 
     if not summary:
         return "unknown"
 
-    return _classify_from_summary(summary)
+    kind = _classify_from_summary(summary)
+    cache.store("wiki.classify", title, kind)
+    return kind
 
 # if __name__ == "__main__":
 #     # Example debug run
@@ -0,0 +1,172 @@
+"""
+Metric registry and the ``timed`` decorator, shared by every layer.
+
+``REGISTRY`` holds latency histograms and counters in process; ``timed(name)``
+records how long each call of a function takes (and whether it raised) under
+``fn=name``. Nothing here knows about HTTP or the services, so the NLP layer
+can be instrumented without depending on them; ``services.metrics`` adds the
+upstream observations and the Prometheus endpoint on top.
+"""
+
+from __future__ import annotations
+import bisect
+import functools
+import inspect
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Histogram bucket upper bounds in seconds (the implicit last bucket is +Inf).
+BUCKETS: Tuple[float, ...] = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_HELP = {
+    "intellidash_call_seconds": ("histogram", "Latency of service and NLP functions, cache hits included."),
+    "intellidash_call_errors_total": ("counter", "Exceptions raised by service and NLP functions."),
+    "intellidash_http_request_seconds": ("histogram", "Latency of upstream HTTP GETs, retries included."),
+    "intellidash_http_responses_total": ("counter", "Upstream HTTP responses by status code."),
+    "intellidash_http_retries_total": ("counter", "Retries performed by the HTTP client."),
+    "intellidash_http_response_bytes_total": ("counter", "Bytes of upstream response bodies."),
+    "intellidash_http_errors_total": ("counter", "Upstream GETs that failed without a response."),
+    "intellidash_cache_lookups_total": ("counter", "Response cache lookups by result (hit, disk_hit, miss)."),
+    "intellidash_http_coalesced_total": ("counter", "Upstream GETs by whether they were sent or joined an identical one."),
+}
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (not thread-safe; the registry locks around it)."""
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimate the ``q`` quantile by linear interpolation inside its bucket."""
+        if not self.count:
+            return math.nan
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if c and seen + c >= rank:
+                lo = BUCKETS[i - 1] if i else 0.0
+                hi = BUCKETS[i] if i < len(BUCKETS) else lo
+                return lo + (hi - lo) * (rank - seen) / c
+            seen += c
+        return BUCKETS[-1]
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram()
+            hist.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def counter(self, name: str, **labels: str) -> float:
+        with self._lock:
+            return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def histogram(self, name: str, **labels: str) -> Optional[Histogram]:
+        with self._lock:
+            return self._histograms.get((name, tuple(sorted(labels.items()))))
+
+    def latency_summary(self, name: str = "intellidash_call_seconds") -> List[Dict[str, Any]]:
+        """One dict per label set of histogram ``name`` with count, mean, p50, p95 and p99 (seconds)."""
+        with self._lock:
+            items = [(labels, h) for (n, labels), h in self._histograms.items() if n == name]
+            return [
+                {**dict(labels), "count": h.count, "mean": h.sum / h.count if h.count else math.nan,
+                 "p50": h.quantile(0.5), "p95": h.quantile(0.95), "p99": h.quantile(0.99)}
+                for labels, h in sorted(items)
+            ]
+
+    def render(self, extra_counters: Optional[Dict[Tuple[str, Labels], float]] = None) -> str:
+        with self._lock:
+            hists = sorted(self._histograms.items())
+            counters = dict(self._counters)
+            snapshot = [(key, list(h.counts), h.sum, h.count) for key, h in hists]
+        counters.update(extra_counters or {})
+        by_name: Dict[str, List[str]] = {}
+        for (name, labels), counts, total, count in snapshot:
+            lines = by_name.setdefault(name, [])
+            cumulative = 0
+            for bound, c in zip(list(BUCKETS) + [math.inf], counts):
+                cumulative += c
+                le = "+Inf" if math.isinf(bound) else repr(bound)
+                lines.append(f"{name}_bucket{_fmt(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_fmt(labels)} {total}")
+            lines.append(f"{name}_count{_fmt(labels)} {count}")
+        for (name, labels), value in sorted(counters.items()):
+            by_name.setdefault(name, []).append(f"{name}{_fmt(labels)} {value:g}")
+        out = []
+        for name, lines in by_name.items():
+            kind, help_text = _HELP.get(name, ("untyped", name))
+            out += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", *lines]
+        return "\n".join(out) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+def _fmt(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+REGISTRY = Registry()
+
+
+def timed(name: str):
+    """Record the latency of every call (and any exception) under ``fn=name``; works on coroutine functions too."""
+    def decorator(fn: Callable):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                t0 = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                except Exception:
+                    REGISTRY.inc("intellidash_call_errors_total", fn=name)
+                    raise
+                finally:
+                    REGISTRY.observe("intellidash_call_seconds", time.perf_counter() - t0, fn=name)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                REGISTRY.inc("intellidash_call_errors_total", fn=name)
+                raise
+            finally:
+                REGISTRY.observe("intellidash_call_seconds", time.perf_counter() - t0, fn=name)
+        return wrapper
+    return decorator
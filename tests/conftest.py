@@ -0,0 +1,22 @@
+import os
+import pytest
+
+# Tests never read or write the on-disk cache tier unless they open one explicitly.
+os.environ["INTELLIDASH_CACHE_DIR"] = "off"
+os.environ["INTELLIDASH_ANALYTICS_DIR"] = "off"
+os.environ["INTELLIDASH_FX_DIR"] = "off"
+
+from services import circuit, ratelimit
+from services.cache import clear_cache
+
+
+@pytest.fixture(autouse=True)
+def _fresh_cache():
+    """Every test starts with an empty shared response cache, every circuit closed and no rate limits."""
+    clear_cache()
+    circuit.reset()
+    ratelimit.reset()
+    yield
+    clear_cache()
+    circuit.reset()
+    ratelimit.reset()
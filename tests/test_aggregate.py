@@ -0,0 +1,122 @@
+import time
+import pytest
+from services import aggregate
+
+
+@pytest.fixture
+def fake_sources(mocker):
+    def slow(value, delay=0.2):
+        def _f(*args, **kwargs):
+            time.sleep(delay)
+            return value
+        return _f
+
+    mocker.patch.object(aggregate, "search_pages", side_effect=slow([{"title": "Barcelona"}]))
+    mocker.patch.object(aggregate, "get_summary", return_value={"extract": "Barcelona is a city."})
+    mocker.patch.object(aggregate, "infer_entity_type_from_pages", return_value="place")
+    mocker.patch.object(aggregate, "search_hn", side_effect=slow([{"title": "Barcelona news"}]))
+    mocker.patch.object(aggregate, "geocode_city", return_value={"name": "Barcelona", "latitude": 41.4, "longitude": 2.2})
+    mocker.patch.object(aggregate, "get_weather", side_effect=slow({"current_weather": {"temperature": 20}}))
+    return mocker
+
+
+def test_parse_fx_pair():
+    assert aggregate.parse_fx_pair(" usd-eur ") == ("USD", "EUR")
+    assert aggregate.parse_fx_pair("Barcelona") is None
+    assert aggregate.parse_fx_pair("US-EURO") is None
+
+
+def test_smart_aggregate_runs_sources_concurrently(fake_sources):
+    t0 = time.monotonic()
+    res = aggregate.smart_aggregate("Barcelona", max_news=5, max_wiki=3)
+    elapsed = time.monotonic() - t0
+
+    assert res["errors"] == []
+    assert res["query_type"] == "place"
+    assert res["news"][0]["title"] == "Barcelona news"
+    assert res["geo"]["name"] == "Barcelona"
+    assert res["weather"]["current_weather"]["temperature"] == 20
+    # wiki -> weather is a 0.4s chain; news runs alongside it instead of adding 0.2s
+    assert elapsed < 0.55
+    assert set(res["timings"]) == {"wiki", "news", "weather"}
+    assert all(0.15 < t < 0.5 for t in res["timings"].values())
+
+
+def test_smart_aggregate_returns_partial_results_on_deadline(fake_sources, monkeypatch):
+    fake_sources.patch.object(aggregate, "search_hn", side_effect=lambda *a, **k: time.sleep(1.0))
+    monkeypatch.setitem(aggregate.SOURCE_DEADLINES, "news", 0.3)
+
+    res = aggregate.smart_aggregate("Barcelona", max_news=5, max_wiki=3)
+
+    assert res["news"] == []
+    assert res["wiki"] == [{"title": "Barcelona"}]
+    assert res["weather"] is not None
+    assert res["errors"] == ["news: timed out after 0.3s"]
+
+    # batch mode passes longer deadlines instead
+    deadlines = {**aggregate.SOURCE_DEADLINES, "news": 2.0}
+    res = aggregate.smart_aggregate("Barcelona", max_news=5, max_wiki=3, deadlines=deadlines)
+    assert res["errors"] == [] and "news" in res["timings"]
+
+
+def test_smart_aggregate_reports_source_errors(fake_sources):
+    fake_sources.patch.object(aggregate, "search_pages", side_effect=RuntimeError("boom"))
+
+    res = aggregate.smart_aggregate("Barcelona", max_news=5, max_wiki=3)
+
+    assert res["query_type"] == "Abstract"
+    assert res["weather"] is None
+    assert res["errors"] == ["wiki: boom"]
+
+
+def test_smart_aggregate_fetches_top_summary_once_and_carries_it(mocker):
+    mocker.patch.object(aggregate, "search_pages", return_value=[{"title": "Python (programming language)"}])
+    summary = {"description": "General-purpose programming language", "extract": "Python is a language."}
+    get_summary = mocker.patch.object(aggregate, "get_summary", return_value=summary)
+    wiki_get_summary = mocker.patch("services.wiki.get_summary")
+    mocker.patch.object(aggregate, "search_hn", return_value=[])
+
+    res = aggregate.smart_aggregate("Python", max_news=5, max_wiki=3)
+
+    get_summary.assert_called_once_with("Python (programming language)")
+    wiki_get_summary.assert_not_called()
+    assert res["summaries"] == {"Python (programming language)": summary}
+    assert res["query_type"] == "unknown"
+
+
+def test_iter_smart_aggregate_streams_sources_as_they_finish(fake_sources):
+    fake_sources.patch.object(aggregate, "search_hn", return_value=[{"title": "fast"}])
+
+    events = [(source, len(res["news"]), res["weather"] is not None)
+              for source, res in aggregate.iter_smart_aggregate("Barcelona", max_news=5, max_wiki=3)]
+
+    assert events == [("news", 1, False), ("wiki", 1, False), ("weather", 1, True)]
+    assert list(aggregate.iter_smart_aggregate("", max_news=5, max_wiki=3)) == []
+
+
+def test_gazetteer_hit_prefetches_forecast_alongside_wiki(fake_sources):
+    calls = []
+    fake_sources.patch.object(aggregate, "local_geocode", return_value={"name": "Barcelona", "latitude": 41.4, "longitude": 2.2})
+    fake_sources.patch.object(aggregate, "get_weather", side_effect=lambda lat, lon: calls.append(time.monotonic()) or {})
+
+    t0 = time.monotonic()
+    aggregate.smart_aggregate("Barcelona", max_news=5, max_wiki=3)
+
+    # the first forecast call starts before the 0.2s wiki search finishes
+    assert calls and calls[0] - t0 < 0.1
+
+
+def test_weather_starts_on_description_before_the_summary_arrives(fake_sources):
+    fake_sources.patch.object(aggregate, "search_pages", return_value=[{"title": "Barcelona", "description": "City in Spain"}])
+    fake_sources.patch.object(aggregate, "get_summary", side_effect=lambda title: time.sleep(0.3) or {"extract": "x"})
+    infer = fake_sources.patch.object(aggregate, "infer_entity_type_from_pages")
+    geocoded = []
+    fake_sources.patch.object(aggregate, "geocode_city", side_effect=lambda q: geocoded.append(time.monotonic()) or {"name": q, "latitude": 41.4, "longitude": 2.2})
+
+    t0 = time.monotonic()
+    res = aggregate.smart_aggregate("Barcelona", max_news=5, max_wiki=3)
+
+    assert res["query_type"] == "place" and res["weather"] is not None
+    assert res["summaries"] == {"Barcelona": {"extract": "x"}}
+    assert geocoded and geocoded[0] - t0 < 0.1
+    infer.assert_not_called()
@@ -0,0 +1,98 @@
+import datetime as dt
+
+import pandas as pd
+
+from analytics.rows import ANALYTICS_COLUMNS, ANALYTICS_SCHEMA
+from analytics.sink import AnalyticsSink
+
+
+def row(day, i):
+    return {"timestamp": f"2026-10-{day:02d}T12:00:{i:02d}", "query": f"q{day}-{i}", "news_count": i}
+
+
+def test_sink_batches_rows_into_day_partitions(tmp_path):
+    sink = AnalyticsSink(tmp_path, batch_rows=4, flush_interval=60)
+    for i in range(5):
+        assert sink.submit(row(15, i))
+        sink.submit(row(16, i))
+    assert sink.flush(timeout=5)
+
+    stats = sink.stats()
+    assert stats["submitted"] == stats["written"] == 10 and stats["errors"] == 0
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["date=2026-10-15", "date=2026-10-16"]
+
+    df = sink.query()
+    assert list(df.columns) == ANALYTICS_COLUMNS
+    assert df.dtypes.astype(str).to_dict() == ANALYTICS_SCHEMA
+    assert list(df["timestamp"]) == sorted(df["timestamp"])
+    assert sink.query(since=dt.date(2026, 10, 16))["query"].str.startswith("q16").all()
+    assert list(sink.query(until=dt.date(2026, 10, 15), columns=["news_count"], limit=2)["news_count"]) == [3, 4]
+    sink.close()
+
+
+def test_flush_interval_writes_partial_batches(tmp_path):
+    sink = AnalyticsSink(tmp_path, batch_rows=1000, flush_interval=0.05)
+    sink.submit(row(15, 0))
+    sink.close(timeout=5)
+    assert len(sink.query()) == 1
+
+
+def test_export_and_empty_query(tmp_path):
+    sink = AnalyticsSink(tmp_path / "ds", batch_rows=10)
+    assert sink.query().empty
+    for i in range(3):
+        sink.submit(row(15, i))
+    sink.flush(timeout=5)
+
+    assert len(pd.read_csv(sink.export(tmp_path / "out.csv"))) == 3
+    assert len(pd.read_feather(sink.export(tmp_path / "out.arrow"))) == 3
+    assert len(pd.read_parquet(sink.export(tmp_path / "out.parquet"))) == 3
+    sink.close()
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path):
+    sink = AnalyticsSink(tmp_path, queue_size=1)
+    sink.close()  # writer stopped, so the queue is never drained
+    assert sink.submit(row(15, 0)) is True
+    assert sink.submit(row(15, 1)) is False
+    assert sink.stats()["dropped"] == 1
+
+
+def test_prune_removes_partitions_past_retention(tmp_path):
+    sink = AnalyticsSink(tmp_path)
+    for day in (10, 14, 15):
+        sink.submit(row(day, 0))
+    sink.close(timeout=5)
+    sink.retention_days = 2
+    assert sink.prune(today=dt.date(2026, 10, 15)) == ["2026-10-10"]
+    assert sorted(sink.query()["query"]) == ["q14-0", "q15-0"]
+
+
+def test_shared_sink_writes_queued_rows_at_exit(tmp_path, monkeypatch):
+    import analytics.sink as sink_module
+
+    at_exit = []
+    monkeypatch.setattr(sink_module.atexit, "register", lambda fn, *args: at_exit.append((fn, args)))
+    monkeypatch.setattr(sink_module, "default_dir", lambda: tmp_path)
+    monkeypatch.setattr(sink_module, "_sink", None)
+    monkeypatch.setattr(sink_module, "_sink_ready", False)
+    monkeypatch.setattr(sink_module, "FLUSH_INTERVAL", 60)
+
+    sink = sink_module.get_sink()
+    sink.submit(row(15, 1))
+    for fn, args in at_exit:
+        fn(*args)
+    assert list(sink.query()["query"]) == ["q15-1"]
+
+
+def test_sinks_sharing_a_directory_never_overwrite_each_others_parts(tmp_path):
+    # e.g. two Streamlit workers, or a restart while the old process still flushes at exit
+    sinks = [AnalyticsSink(tmp_path, batch_rows=2, flush_interval=60) for _ in range(2)]
+    for i in range(4):
+        sinks[i % 2].submit(row(15, i))
+    for sink in sinks:
+        sink.close(timeout=5)
+
+    parts = list((tmp_path / "date=2026-10-15").iterdir())
+    assert len(parts) == 2 and len({p.name for p in parts}) == 2
+    assert sorted(sinks[0].query()["query"]) == [f"q15-{i}" for i in range(4)]
@@ -0,0 +1,65 @@
+import gc
+import io
+
+import pandas as pd
+
+from analytics.rows import ANALYTICS_COLUMNS, ANALYTICS_SCHEMA
+from analytics.store import AnalyticsStore
+
+
+def row(i):
+    return {"query": f"q{i}", "query_type": "place", "news_count": i, "temperature_c": i / 2}
+
+
+def test_store_keeps_typed_columns_and_caps_rows():
+    store = AnalyticsStore(max_rows=10, chunk_size=4)
+    for i in range(23):
+        store.append(row(i))
+
+    assert len(store) <= 10 and store.total_rows == len(store)
+    assert store.dropped_rows == 23 - len(store)
+    df = store.frame()
+    assert list(df.columns) == ANALYTICS_COLUMNS
+    assert df.dtypes.astype(str).to_dict() == ANALYTICS_SCHEMA
+    assert df["query"].iloc[-1] == "q22"
+    assert list(store.tail(3)["news_count"]) == [20, 21, 22]
+    assert list(store.tail(6)["query"]) == list(df["query"].iloc[-6:])
+
+
+def test_frame_and_csv_are_cached_until_the_next_append():
+    store = AnalyticsStore(max_rows=100, chunk_size=2)
+    for i in range(5):
+        store.append(row(i))
+    assert store.frame() is store.frame()
+    first = store.csv_bytes()
+    assert store.csv_bytes() is first
+
+    store.append(row(5))
+    df = pd.read_csv(io.BytesIO(store.csv_bytes()))
+    assert list(df.columns) == ANALYTICS_COLUMNS
+    assert list(df["query"]) == [f"q{i}" for i in range(6)]
+
+
+def test_spilled_rows_go_to_parquet_and_stay_in_the_csv(tmp_path):
+    store = AnalyticsStore(max_rows=4, chunk_size=2, spill_dir=tmp_path / "spill")
+    for i in range(9):
+        store.append(row(i))
+
+    assert store.total_rows == 9 and store.dropped_rows == 0
+    assert store.spilled_rows == 9 - len(store)
+    assert len(pd.read_parquet(tmp_path / "spill")) == store.spilled_rows
+    df = pd.read_csv(io.BytesIO(store.csv_bytes()))
+    assert list(df["query"]) == [f"q{i}" for i in range(9)]
+
+    # the spill directory goes away with the store (e.g. when its session ends)
+    del store
+    gc.collect()
+    assert not (tmp_path / "spill").exists()
+
+
+def test_empty_store():
+    store = AnalyticsStore()
+    assert store.total_rows == 0
+    assert list(store.frame().columns) == ANALYTICS_COLUMNS
+    assert store.tail(5).empty
+    assert store.csv_bytes().decode().strip() == ",".join(ANALYTICS_COLUMNS)
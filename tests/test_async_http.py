@@ -0,0 +1,122 @@
+import asyncio
+
+import httpx
+import pytest
+
+from benchmarks.stub_server import StubServer, point_services_at, restore_services
+from services import async_http, circuit, forex, news, weather, wiki
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Async clients talk to a mock transport; ``calls`` records requests, ``active`` the peak concurrency."""
+    state = {"calls": [], "active": 0, "peak": 0, "delay": 0.05, "statuses": []}
+
+    async def handler(request):
+        state["calls"].append(str(request.url))
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        try:
+            await asyncio.sleep(state["delay"])
+        finally:
+            state["active"] -= 1
+        status = state["statuses"].pop(0) if state["statuses"] else 200
+        return httpx.Response(status, json={"hits": [{"title": request.url.params.get("query")}]},
+                              headers={"Retry-After": "0"})
+
+    monkeypatch.setattr(async_http, "_build_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return state
+
+
+def test_async_services_match_sync_ones_against_the_stub_server():
+    async def fetch_all():
+        return await asyncio.gather(
+            wiki.search_pages_async("Barcelona", limit=3),
+            wiki.get_summary_async("Barcelona"),
+            news.search_hn_async("Barcelona"),
+            weather.geocode_city_async("Barcelona"),
+            weather.get_weather_async(41.39, 2.17),
+            forex.convert_currency_async(1.0, "USD", "EUR"),
+        )
+
+    with StubServer(latency=0.05) as server:
+        originals = point_services_at(server.url)
+        try:
+            pages, summary, hits, geo, forecast, fx = async_http.run_sync(fetch_all(), timeout=10)
+            # the sync functions answer from the cache entries the async ones filled
+            requests_before = server.requests
+            assert wiki.search_pages("Barcelona", limit=3) == pages
+            assert news.search_hn("Barcelona") == hits
+            assert server.requests == requests_before
+        finally:
+            restore_services(originals)
+
+    assert pages[0]["title"] == "Barcelona" and summary["description"] == "City in Catalonia, Spain"
+    assert len(hits) == 10 and geo["country_code"] == "ES"
+    assert len(forecast["hourly"]["temperature_2m"]) == 168
+    assert fx["success"] and fx["result"] == 0.9213
+
+
+def test_per_host_concurrency_limit(upstream, monkeypatch):
+    monkeypatch.setattr(async_http, "HOST_CONCURRENCY", 3)
+
+    async def main():
+        return await asyncio.gather(*(async_http.get("https://hn.test/search", params={"query": str(i)}) for i in range(12)))
+
+    responses = asyncio.run(main())
+
+    assert len(upstream["calls"]) == 12 and all(r.status_code == 200 for r in responses)
+    assert upstream["peak"] == 3
+
+
+def test_identical_requests_coalesce_and_cancellation_propagates(upstream):
+    async def main():
+        first = asyncio.ensure_future(async_http.get("https://hn.test/search", params={"query": "a"}))
+        second = asyncio.ensure_future(async_http.get("https://hn.test/search", params={"query": "a"}))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        response = await second
+        assert response.json()["hits"][0]["title"] == "a"
+        assert first.cancelled()
+
+        # nobody waits any more: the upstream request itself is cancelled
+        upstream["delay"] = 1.0
+        lone = asyncio.ensure_future(async_http.get("https://hn.test/search", params={"query": "b"}))
+        await asyncio.sleep(0.01)
+        lone.cancel()
+        await asyncio.sleep(0.01)
+        return upstream["active"]
+
+    assert asyncio.run(main()) == 0
+    assert len(upstream["calls"]) == 2
+    assert async_http.coalescing_stats()["hn.test"]["coalesced"] >= 1
+
+
+def test_retries_on_503_and_run_sync_timeout(upstream):
+    upstream["statuses"] = [503, 503]
+    response = asyncio.run(async_http.get("https://hn.test/search", params={"query": "retry"}))
+    assert response.status_code == 200 and len(upstream["calls"]) == 3
+
+    with pytest.raises(TimeoutError):
+        async_http.run_sync(asyncio.sleep(1), timeout=0.05)
+
+
+def test_cancelled_half_open_probe_does_not_wedge_the_breaker(upstream):
+    breaker = circuit.breaker("hn.test")
+    for _ in range(breaker.threshold):
+        breaker.record_failure()
+    breaker.opened_at -= breaker.reset_timeout
+
+    async def main():
+        upstream["delay"] = 1.0
+        probe = asyncio.ensure_future(async_http.get("https://hn.test/search", params={"query": "probe"}))
+        await asyncio.sleep(0.01)
+        assert breaker.state == circuit.HALF_OPEN and not breaker.allow()
+        probe.cancel()
+        await asyncio.sleep(0.01)
+        # the slot is free again: the next request is the new probe, and it closes the circuit
+        upstream["delay"] = 0
+        return await async_http.get("https://hn.test/search", params={"query": "again"})
+
+    assert asyncio.run(main()).status_code == 200
+    assert breaker.state == circuit.CLOSED
@@ -0,0 +1,138 @@
+import json
+import threading
+
+import pandas as pd
+import pytest
+
+import batch_search
+from analytics.rows import ANALYTICS_COLUMNS
+from analytics.writers import CsvRowWriter, ParquetDatasetWriter
+
+
+def fake_search(query, max_news, max_wiki):
+    if query == "boom":
+        raise RuntimeError("upstream exploded")
+    return {"query_type": "place", "wiki": [{"title": query}], "news": [{"title": "great news", "points": 2}],
+            "geo": {"name": query, "latitude": 1.0, "longitude": 2.0}, "weather": None, "summaries": {}}
+
+
+def test_read_queries_formats(tmp_path):
+    (tmp_path / "q.jsonl").write_text('{"query": "Barcelona"}\n\n"Paris"\n{"city": "x"}\n')
+    (tmp_path / "q.csv").write_text("id,query\n1,Rome\n2,Oslo\n")
+    (tmp_path / "raw.csv").write_text("Lima\nQuito\n")
+    (tmp_path / "cities.csv").write_text("city\nLima\n")
+    (tmp_path / "q.txt").write_text("Berlin\n Tokyo \n")
+
+    assert list(batch_search.read_queries(tmp_path / "q.jsonl")) == ["Barcelona", "", "Paris", ""]
+    assert list(batch_search.read_queries(tmp_path / "q.csv")) == ["Rome", "Oslo"]
+    assert list(batch_search.read_queries(tmp_path / "raw.csv", header=False)) == ["Lima", "Quito"]
+    assert list(batch_search.read_queries(tmp_path / "cities.csv", field="city")) == ["Lima"]
+    # a header without the column is an error, not a query named "city"
+    with pytest.raises(ValueError, match="'query' column"):
+        batch_search.read_queries(tmp_path / "cities.csv")
+    assert list(batch_search.read_queries(tmp_path / "q.txt")) == ["Berlin", "Tokyo"]
+
+
+def test_run_batch_streams_csv_and_resumes_from_checkpoint(tmp_path):
+    out = tmp_path / "rows.csv"
+    ckpt = batch_search.Checkpoint(tmp_path / "rows.checkpoint")
+    queries = [f"city{i}" for i in range(25)] + ["", "boom"]
+
+    stats = batch_search.run_batch(queries[:12], CsvRowWriter(out), ckpt, concurrency=3, batch_size=5, search=fake_search)
+    assert stats == {"written": 12, "skipped": 0, "failed": 0, "timed_out": 0}
+
+    stats = batch_search.run_batch(queries, CsvRowWriter(out), ckpt, concurrency=3, batch_size=5, search=fake_search)
+    assert stats == {"written": 13, "skipped": 13, "failed": 1, "timed_out": 0}
+
+    df = pd.read_csv(out)
+    assert list(df.columns) == ANALYTICS_COLUMNS
+    assert sorted(df["query"]) == sorted(queries[:25])
+    assert (df["news_count"] == 1).all()
+    assert ckpt.load() == set(range(25))
+
+
+def test_run_batch_leaves_timed_out_queries_for_the_next_run(tmp_path):
+    ckpt = batch_search.Checkpoint(tmp_path / "rows.checkpoint")
+    slow = {"Lima"}
+
+    def search(query, max_news, max_wiki):
+        res = fake_search(query, max_news, max_wiki)
+        if query in slow:
+            res.update(wiki=[], errors=["wiki: timed out after 8.0s"])
+        return res
+
+    stats = batch_search.run_batch(["Rome", "Lima", "Oslo"], CsvRowWriter(tmp_path / "rows.csv"), ckpt,
+                                   batch_size=2, search=search)
+    assert stats == {"written": 2, "skipped": 0, "failed": 0, "timed_out": 1}
+    assert 1 not in ckpt.load()
+    assert sorted(pd.read_csv(tmp_path / "rows.csv")["query"]) == ["Oslo", "Rome"]
+
+    slow.clear()
+    stats = batch_search.run_batch(["Rome", "Lima", "Oslo"], CsvRowWriter(tmp_path / "rows.csv"), ckpt, search=search)
+    assert stats == {"written": 1, "skipped": 2, "failed": 0, "timed_out": 0}
+    assert ckpt.load() == {0, 1, 2}
+
+
+def test_run_batch_writes_exactly_batch_size_rows_when_queries_finish_together():
+    class RecordingWriter:
+        def __init__(self):
+            self.batches = []
+
+        def write(self, rows):
+            self.batches.append(len(rows))
+
+        def close(self):
+            pass
+
+    # every group of four queries finishes at the same moment
+    together = threading.Barrier(4, timeout=5)
+
+    def search(query, max_news, max_wiki):
+        together.wait()
+        return fake_search(query, max_news, max_wiki)
+
+    writer = RecordingWriter()
+    stats = batch_search.run_batch([f"q{i}" for i in range(12)], writer, concurrency=4, batch_size=3, search=search)
+    assert stats["written"] == 12
+    assert writer.batches == [3, 3, 3, 3]
+
+
+def test_parquet_dataset_writer_appends_parts_with_stable_schema(tmp_path):
+    writer = ParquetDatasetWriter(tmp_path / "ds")
+    batch_search.run_batch(["a", "b", "c"], writer, batch_size=2, search=fake_search)
+    # a part where every weather field is missing must still line up with the others
+    ParquetDatasetWriter(tmp_path / "ds").write([{"query": "empty"}])
+
+    parts = sorted(p.name for p in (tmp_path / "ds").iterdir())
+    assert parts == ["part-00000.parquet", "part-00001.parquet", "part-00002.parquet"]
+    df = pd.read_parquet(tmp_path / "ds")
+    assert len(df) == 4 and list(df.columns) == ANALYTICS_COLUMNS
+
+
+def test_main_applies_rate_limits_and_prints_stats(tmp_path, mocker, capsys):
+    (tmp_path / "q.txt").write_text("Rome\n")
+    set_limit = mocker.patch("services.ratelimit.set_rate_limit")
+    mocker.patch("services.aggregate.resize_pool")
+    search = mocker.patch.object(batch_search.aggregate, "smart_aggregate",
+                                 side_effect=lambda q, n, w, deadlines: fake_search(q, n, w))
+
+    code = batch_search.main([str(tmp_path / "q.txt"), "-o", str(tmp_path / "out.csv"), "--rate", "hn.algolia.com=1"])
+
+    assert code == 0
+    # the UI's deadlines stretched by the wait for rate limit tokens at concurrency 4 and 1 rps
+    deadlines = search.call_args.kwargs["deadlines"]
+    assert deadlines == {s: d + 4 * 7 for s, d in batch_search.aggregate.SOURCE_DEADLINES.items()}
+    assert json.loads(capsys.readouterr().out.strip().splitlines()[-1])["written"] == 1
+    set_limit.assert_any_call("hn.algolia.com", 1.0)
+    set_limit.assert_any_call("en.wikipedia.org", 10.0)
+
+
+def test_token_bucket_spaces_out_requests():
+    import time
+    from services.ratelimit import TokenBucket
+    bucket = TokenBucket(rate=20, burst=1)
+    t0 = time.monotonic()
+    for _ in range(5):
+        assert bucket.acquire()
+    assert time.monotonic() - t0 >= 0.18
+    assert bucket.acquire(timeout=0) is False
@@ -0,0 +1,206 @@
+import asyncio
+import datetime as dt
+import threading
+import time
+import pytest
+from services import cache, news, weather
+from services.cache import TTLCache, cache_stats, seconds_until_next_ecb_fix
+from services.disk_cache import DiskCache
+
+
+def test_ttl_cache_expires_entries(mocker):
+    clock = mocker.patch("services.cache.time.time", return_value=1000.0)
+    c = TTLCache(max_entries=10, max_bytes=10_000)
+    c.set("k", "v", ttl=60)
+    assert c.get("k") == (True, "v")
+    clock.return_value = 1061.0
+    assert c.get("k") == (False, None)
+    assert len(c) == 0 and c.nbytes == 0
+
+def test_ttl_cache_evicts_least_recently_used_by_count():
+    c = TTLCache(max_entries=2, max_bytes=10_000)
+    c.set("a", 1, ttl=60)
+    c.set("b", 2, ttl=60)
+    c.get("a")
+    c.set("c", 3, ttl=60)
+    assert c.get("b") == (False, None)
+    assert c.get("a") == (True, 1)
+    assert c.evictions == 1
+
+def test_ttl_cache_evicts_by_bytes():
+    c = TTLCache(max_entries=100, max_bytes=250)
+    for k in "abc":
+        c.set(k, "x", ttl=60, size=100)
+    assert len(c) == 2 and c.nbytes == 200
+    assert c.get("a") == (False, None)
+
+def test_cached_service_hits_network_once_per_argument_set(mocker):
+    mock_response = mocker.Mock()
+    mock_response.status_code = 200
+    mock_response.json.return_value = {"results": [{"name": "Barcelona"}]}
+    get = mocker.patch("requests.Session.get", return_value=mock_response)
+
+    assert weather.geocode_city("Barcelona")["name"] == "Barcelona"
+    assert weather.geocode_city(city="Barcelona")["name"] == "Barcelona"
+    assert get.call_count == 1
+    assert cache_stats()["sources"]["weather.geocode"] == {"hits": 1, "disk_hits": 0, "misses": 1}
+
+def test_cached_service_does_not_store_empty_results(mocker):
+    mock_response = mocker.Mock()
+    mock_response.status_code = 503
+    get = mocker.patch("requests.Session.get", return_value=mock_response)
+
+    assert news.search_hn("AI") == []
+    assert news.search_hn("AI") == []
+    assert get.call_count == 2
+
+def test_ecb_fix_ttl_waits_for_next_working_day():
+    cet = cache._ECB_TZ
+    friday_evening = dt.datetime(2025, 1, 10, 18, 0, tzinfo=cet)
+    monday_fix = dt.datetime(2025, 1, 13, 16, 15, tzinfo=cet)
+    assert seconds_until_next_ecb_fix(friday_evening) == (monday_fix - friday_evening).total_seconds()
+    tuesday_morning = dt.datetime(2025, 1, 14, 9, 0, tzinfo=cet)
+    assert seconds_until_next_ecb_fix(tuesday_morning) == pytest.approx(7.25 * 3600)
+
+@pytest.fixture
+def disk_tier(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "_disk", DiskCache(tmp_path / "responses.sqlite"))
+    monkeypatch.setattr(cache, "_disk_ready", True)
+    yield cache._disk
+    cache._disk.close()
+
+def test_disk_cache_round_trip_and_expiry(tmp_path, mocker):
+    d = DiskCache(tmp_path / "c.sqlite")
+    d.set(("weather.geocode", (("city", "Barcelona"),)), "weather.geocode", {"name": "Barcelona"}, expires_at=2000.0)
+    mocker.patch("services.disk_cache.time.time", return_value=1000.0)
+    hit, value, expires_at = d.get(("weather.geocode", (("city", "Barcelona"),)))
+    assert hit and value == {"name": "Barcelona"} and expires_at == 2000.0
+    mocker.patch("services.disk_cache.time.time", return_value=2001.0)
+    assert d.get(("weather.geocode", (("city", "Barcelona"),)))[0] is False
+    assert d.compact() == 1 and len(d) == 0
+    d.close()
+
+def test_disk_cache_compact_trims_to_size_cap(tmp_path):
+    d = DiskCache(tmp_path / "c.sqlite", max_bytes=10_000)
+    for i in range(10):
+        d.set(("k", i), "src", "x" * 2000, expires_at=1e12)
+    assert d.compact() > 0
+    assert d.nbytes() <= 10_000
+    assert d.get(("k", 9))[0] is True
+    assert d.get(("k", 0))[0] is False
+    d.close()
+
+def test_disk_tier_survives_restart(disk_tier, mocker):
+    mock_response = mocker.Mock()
+    mock_response.status_code = 200
+    mock_response.json.return_value = {"results": [{"name": "Barcelona"}]}
+    get = mocker.patch("requests.Session.get", return_value=mock_response)
+
+    weather.geocode_city("Barcelona")
+    cache._CACHE.clear()  # a restart empties the memory tier only
+    assert weather.geocode_city("Barcelona") == {"name": "Barcelona"}
+    assert get.call_count == 1
+    assert cache_stats()["disk_hits"] == 1
+
+def test_warm_start_loads_live_disk_entries(disk_tier):
+    disk_tier.set(("wiki.summary", (("title", "Barcelona"),)), "wiki.summary", {"extract": "A city."}, expires_at=1e12)
+    assert cache.warm_start() == 1
+    assert cache._CACHE.get(("wiki.summary", (("title", "Barcelona"),))) == (True, {"extract": "A city."})
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+def test_expired_entry_is_served_while_refreshed_in_background(monkeypatch):
+    monkeypatch.setitem(cache.TTL_SECONDS, "news.search", 0.05)
+    monkeypatch.setattr(cache, "REVALIDATE_FRACTION", 100)
+    release = threading.Event()
+    calls = []
+
+    @cache.cached("news.search")
+    def search(query):
+        calls.append(query)
+        if len(calls) > 1:
+            release.wait(2)
+        return [len(calls)]
+
+    assert search("AI") == [1]
+    time.sleep(0.1)
+    # expired: the old value comes back at once, one refresh runs however often it is asked for
+    assert search("AI") == [1]
+    assert search("AI") == [1]
+    release.set()
+    assert _wait_for(lambda: search("AI") == [2])
+    assert calls == ["AI", "AI"]
+    assert cache_stats()["revalidated"]["news.search"] >= 2
+
+def test_async_expired_entry_is_refreshed_on_the_running_loop(monkeypatch):
+    monkeypatch.setitem(cache.TTL_SECONDS, "news.search", 0.05)
+    monkeypatch.setattr(cache, "REVALIDATE_FRACTION", 100)
+    calls = []
+
+    @cache.cached("news.search")
+    async def search(query):
+        calls.append(query)
+        return [len(calls)]
+
+    async def scenario():
+        assert await search("AI") == [1]
+        await asyncio.sleep(0.1)
+        assert await search("AI") == [1]
+        await asyncio.sleep(0.01)  # let the refresh task run
+        return await search("AI")
+
+    assert asyncio.run(scenario()) == [2]
+
+def test_entries_past_the_revalidate_window_are_fetched_inline(monkeypatch):
+    monkeypatch.setitem(cache.TTL_SECONDS, "news.search", 0.05)
+    monkeypatch.setattr(cache, "REVALIDATE_FRACTION", 100)
+    monkeypatch.setattr(cache, "REVALIDATE_SECONDS", 0.01)
+    calls = []
+
+    @cache.cached("news.search")
+    def search(query):
+        calls.append(query)
+        return [len(calls)]
+
+    search("AI")
+    time.sleep(0.1)
+    assert search("AI") == [2]
+
+def test_revalidate_window_scales_with_the_source_ttl(monkeypatch):
+    assert cache.revalidate_window("news.search") == 5 * 60
+    assert cache.revalidate_window("wiki.summary") == cache.REVALIDATE_SECONDS
+    assert cache.revalidate_window("forex.timeseries") == 0.0
+
+    # one TTL past expiry, well inside REVALIDATE_SECONDS: fetched inline, not served stale
+    monkeypatch.setitem(cache.TTL_SECONDS, "news.search", 0.05)
+    calls = []
+
+    @cache.cached("news.search")
+    def search(query):
+        calls.append(query)
+        return [len(calls)]
+
+    search("AI")
+    time.sleep(0.15)
+    assert search("AI") == [2]
+    assert calls == ["AI", "AI"]
+    assert cache_stats()["revalidated"] == {}
+
+def test_refresh_ahead_refetches_entries_about_to_expire():
+    calls = []
+
+    @cache.cached("news.search")  # 5 minutes
+    def search(query):
+        calls.append(query)
+        return [len(calls)]
+
+    search("AI")
+    with cache.refresh_ahead(60):
+        assert search("AI") == [1]
+    with cache.refresh_ahead(600):
+        assert search("AI") == [2]
+    assert search("AI") == [2]
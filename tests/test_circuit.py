@@ -0,0 +1,147 @@
+import time
+
+import pytest
+import requests
+
+from services import aggregate, cache, circuit, news, ratelimit
+
+
+def test_breaker_opens_after_threshold_and_probes_once_after_reset_timeout(monkeypatch):
+    b = circuit.CircuitBreaker(threshold=3, reset_timeout=10)
+    now = [1000.0]
+    monkeypatch.setattr(circuit.time, "monotonic", lambda: now[0])
+
+    for _ in range(2):
+        b.record_failure()
+    assert b.allow() and b.state == circuit.CLOSED
+    b.record_failure()
+    assert b.state == circuit.OPEN and not b.allow()
+    assert b.retry_in() == 10
+
+    now[0] += 10
+    assert b.allow() and b.state == circuit.HALF_OPEN
+    assert not b.allow()  # only one probe at a time
+    b.record_failure()
+    assert b.state == circuit.OPEN and not b.allow()
+
+    now[0] += 10
+    assert b.allow()
+    b.record_success()
+    assert b.state == circuit.CLOSED and b.failures == 0
+
+
+def test_lost_probe_is_replaced_after_its_lease(monkeypatch):
+    b = circuit.CircuitBreaker(threshold=1, reset_timeout=10)
+    now = [1000.0]
+    monkeypatch.setattr(circuit.time, "monotonic", lambda: now[0])
+    b.record_failure()
+    now[0] += 10
+    assert b.admit() is True
+    assert b.admit() is None
+    now[0] += 10  # the probe never reported back
+    assert b.admit() is True
+
+    b.release_probe()  # e.g. cancelled
+    assert b.admit() is True
+
+
+def test_open_circuit_fails_fast_without_calling_the_host(mocker, monkeypatch):
+    monkeypatch.setitem(circuit._breakers, "hn.algolia.com", circuit.CircuitBreaker(threshold=2))
+    get = mocker.patch("requests.Session.get", side_effect=requests.exceptions.ConnectionError("down"))
+
+    for query in ("a", "b"):
+        with pytest.raises(requests.exceptions.ConnectionError):
+            news.search_hn(query)
+    assert get.call_count == 2
+    assert circuit.status()["hn.algolia.com"]["state"] == circuit.OPEN
+
+    with circuit.track() as notes, pytest.raises(circuit.CircuitOpenError):
+        news.search_hn("c")
+    assert get.call_count == 2
+    assert any("circuit open" in n for n in notes)
+
+
+def test_stale_entry_is_served_when_the_host_fails(mocker, monkeypatch):
+    monkeypatch.setitem(cache.TTL_SECONDS, "news.search", 0.05)
+    monkeypatch.setattr(cache, "REVALIDATE_SECONDS", 0)  # no background refresh: the call itself fails
+    ok = mocker.Mock(status_code=200)
+    ok.json.return_value = {"hits": [{"title": "Old story"}]}
+    get = mocker.patch("requests.Session.get", return_value=ok)
+    assert news.search_hn("python")[0]["title"] == "Old story"
+    time.sleep(0.1)
+
+    get.return_value = mocker.Mock(status_code=503, headers={})
+    with circuit.track() as notes:
+        assert news.search_hn("python")[0]["title"] == "Old story"
+    assert notes[0] == "hn.algolia.com: HTTP 503"
+    assert "serving cached news.search" in notes[1]
+    assert cache.cache_stats()["stale_served"] == {"news.search": 1}
+
+    # also instead of raising once the circuit is open
+    get.side_effect = requests.exceptions.ConnectionError("down")
+    assert news.search_hn("python")[0]["title"] == "Old story"
+
+    # an empty answer from a healthy host is not replaced by the stale one
+    get.side_effect = None
+    get.return_value = mocker.Mock(status_code=200, **{"json.return_value": {"hits": []}})
+    assert news.search_hn("python") == []
+
+
+def test_expired_entries_are_not_kept_without_a_stale_window():
+    c = cache.TTLCache(stale_seconds=0)
+    c.set("k", "v", ttl=0.01)
+    time.sleep(0.02)
+    assert c.get("k") == (False, None)
+    assert c.get_stale("k") == (False, None, 0.0)
+    assert len(c) == 0
+
+    c = cache.TTLCache(stale_seconds=60)
+    c.set("k", "v", ttl=0.01)
+    time.sleep(0.02)
+    assert c.get("k") == (False, None)
+    assert c.get_stale("k")[:2] == (True, "v")
+
+
+def test_429_with_retry_after_slows_the_host_down_and_pauses_it():
+    ratelimit.observe("api.example", 429, retry_after=2)
+    assert ratelimit.rate_limits() == {"api.example": ratelimit.ADAPTIVE_START_RPS / 2}
+    assert ratelimit._buckets["api.example"].try_acquire() > 1.5
+
+    # successes win the rate back and drop the adaptive limit at the release rate
+    bucket = ratelimit._buckets["api.example"]
+    bucket.ceiling = bucket.rate + 1.5 * ratelimit.RECOVERY_RPS
+    ratelimit.observe("api.example", 200)
+    assert "api.example" in ratelimit.rate_limits()
+    ratelimit.observe("api.example", 200)
+    assert ratelimit.rate_limits() == {}
+
+
+def test_configured_limit_is_lowered_but_never_raised_above_it():
+    ratelimit.set_rate_limit("api.example", 4)
+    ratelimit.observe("api.example", 503, retry_after=None)  # no Retry-After: not throttling
+    assert ratelimit.rate_limits() == {"api.example": 4}
+    ratelimit.observe("api.example", 200, throttled=True)
+    assert ratelimit.rate_limits() == {"api.example": 2}
+    for _ in range(50):
+        ratelimit.observe("api.example", 200)
+    assert ratelimit.rate_limits() == {"api.example": 4}
+
+
+@pytest.mark.parametrize("value, expected", [("3", 3.0), ("-1", 0.0), ("soon", None), (None, None)])
+def test_parse_retry_after(value, expected):
+    assert ratelimit.parse_retry_after(value) == expected
+
+
+def test_parse_retry_after_http_date():
+    assert ratelimit.parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+
+def test_smart_aggregate_reports_degraded_sources_in_errors(mocker):
+    def throttled_news(*args, **kwargs):
+        circuit.note("hn.algolia.com: HTTP 429 (throttled)")
+        return []
+
+    mocker.patch.object(aggregate, "search_pages", return_value=[])
+    mocker.patch.object(aggregate, "search_hn", side_effect=throttled_news)
+    res = aggregate.smart_aggregate("python", max_news=5, max_wiki=3)
+    assert res["errors"] == ["news: hn.algolia.com: HTTP 429 (throttled)"]
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from services import forex
+
+
+@pytest.fixture
+def series():
+    rng = np.random.default_rng(7)
+    index = pd.bdate_range("2015-01-01", periods=2600, name="date")
+    return pd.DataFrame({"rate": 1.1 * np.exp(np.cumsum(rng.normal(0, 0.005, len(index))))}, index=index)
+
+
+def test_lttb_keeps_endpoints_and_spikes():
+    x = np.arange(1000, dtype=float)
+    y = np.zeros(1000)
+    y[437] = 5.0
+    y[812] = -3.0
+
+    idx = forex.lttb_indices(x, y, 50)
+
+    assert len(idx) == 50 and idx[0] == 0 and idx[-1] == 999
+    assert np.all(np.diff(idx) > 0)
+    assert {437, 812} <= set(idx)
+    assert list(forex.lttb_indices(x[:10], y[:10], 50)) == list(range(10))
+
+
+def test_downsample_to_chart_width(series):
+    stats = forex.rolling_stats(series)
+    points = forex.downsample(stats, width_px=400)
+
+    assert len(points) == 400
+    assert points.index.is_monotonic_increasing
+    assert points.index[0] == series.index[0] and points.index[-1] == series.index[-1]
+    # the other columns travel with the chosen rows
+    assert points["sma_20"].equals(stats["sma_20"].loc[points.index])
+    assert forex.downsample(series.iloc[:100], width_px=400).equals(series.iloc[:100])
+
+
+def test_ohlc_bucket_size_follows_width(series):
+    assert forex.ohlc_frequency(30, 800) == "D"
+    assert forex.ohlc_frequency(3650, 800) == "MS"
+
+    bars = forex.ohlc(series, width_px=800)
+    assert len(bars) <= 800 // 6
+    assert (bars["high"] >= bars[["open", "close"]].max(axis=1)).all()
+    assert bars["low"].min() == series["rate"].min() and bars["high"].max() == series["rate"].max()
+
+
+def test_rolling_stats(series):
+    stats = forex.rolling_stats(series, windows=(5,), vol_window=10)
+
+    rate = series["rate"]
+    assert np.allclose(stats["return"].iloc[1:], np.log(rate).diff().iloc[1:])
+    assert stats["cum_return"].iloc[-1] == pytest.approx(rate.iloc[-1] / rate.iloc[0] - 1)
+    assert stats["sma_5"].iloc[4] == pytest.approx(rate.iloc[:5].mean())
+    assert stats["volatility"].iloc[:10].isna().all()
+    assert stats["volatility"].iloc[-1] == pytest.approx(np.log(rate).diff().iloc[-10:].std() * np.sqrt(252))
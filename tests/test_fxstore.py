@@ -0,0 +1,132 @@
+import datetime as dt
+import threading
+
+import numpy as np
+import pytest
+import requests
+
+from services import forex, fxstore
+from services.fxstore import FxRateStore
+
+
+def business_days(start, end):
+    day = start
+    while day <= end:
+        if day.weekday() < 5:
+            yield day
+        day += dt.timedelta(days=1)
+
+
+@pytest.fixture
+def frankfurter(mocker):
+    """Fake range endpoint: EUR->USD 1.1 and EUR->GBP 0.8 on every business day, JPY from 2 days ago."""
+    calls = []
+
+    def get(url, params=None, **kwargs):
+        start, end = (dt.date.fromisoformat(d) for d in url.rsplit("/", 1)[-1].split(".."))
+        calls.append((start, end))
+        rates = {}
+        for day in business_days(start, end):
+            rates[day.isoformat()] = {"USD": 1.1, "GBP": 0.8}
+            if day >= dt.date.today() - dt.timedelta(days=2):
+                rates[day.isoformat()]["JPY"] = 160.0
+        response = mocker.Mock(status_code=200 if rates else 404)
+        response.json.return_value = {"amount": 1.0, "base": params["from"], "rates": rates}
+        return response
+
+    mocker.patch.object(fxstore.http_client, "get", side_effect=get)
+    return calls
+
+
+def test_cross_rates_and_history_from_one_fetch(tmp_path, frankfurter):
+    store = FxRateStore(tmp_path)
+
+    df = store.history("USD", "GBP", days=10)
+    rate, date = store.rate("GBP", "USD")
+
+    assert len(frankfurter) == 1
+    assert np.allclose(df["rate"], 0.8 / 1.1)
+    assert df.index.min() >= np.datetime64(dt.date.today() - dt.timedelta(days=10))
+    assert rate == pytest.approx(1.1 / 0.8)
+    assert date == max(business_days(dt.date.today() - dt.timedelta(days=10), dt.date.today()))
+    # a currency that appeared later has no rate on earlier days
+    assert len(store.history("USD", "JPY", days=10)) < len(df)
+    assert store.rate("USD", "XXX") is None
+
+
+def test_only_missing_dates_are_fetched_and_store_persists(tmp_path, frankfurter, monkeypatch):
+    monkeypatch.setattr(fxstore, "FETCH_CHUNK_DAYS", 90)
+    today = dt.date.today()
+    store = FxRateStore(tmp_path)
+    store.history("EUR", "USD", days=7)
+    store.history("EUR", "USD", days=200)
+
+    # the second call only backfills what lies before the first one, in chunks
+    assert frankfurter[0] == (today - dt.timedelta(days=7), today)
+    assert frankfurter[1][0] == today - dt.timedelta(days=200)
+    assert frankfurter[-1][1] == today - dt.timedelta(days=8)
+    assert len(frankfurter) == 1 + 3
+
+    reopened = FxRateStore(tmp_path)
+    assert reopened.stats()["days"] == store.stats()["days"]
+    reopened.history("GBP", "USD", days=30)
+    assert len(frankfurter) == 4
+
+    # once the next ECB fix is due, only the days after the newest fix are requested
+    latest = reopened.latest_date()
+    reopened.dates, reopened.rates = reopened.dates[:-1], reopened.rates[:-1]
+    newest = reopened.latest_date()
+    reopened.rate("EUR", "USD")
+    assert len(frankfurter) == 4
+    monkeypatch.setattr(reopened, "next_refresh", 0.0)
+    reopened.rate("EUR", "USD")
+    assert frankfurter[-1] == (newest + dt.timedelta(days=1), today)
+    assert reopened.latest_date() == latest
+
+
+def test_convert_currency_uses_the_store(tmp_path, frankfurter, mocker):
+    mocker.patch.object(forex, "get_fx_store", return_value=FxRateStore(tmp_path))
+    api = mocker.patch("requests.Session.get")
+
+    res = forex.convert_currency(10, "usd", "gbp")
+
+    assert res["success"] and res["result"] == pytest.approx(10 * 0.8 / 1.1)
+    assert forex.get_timeseries("GBP", "USD")["rate"].iloc[-1] == pytest.approx(1.1 / 0.8)
+    api.assert_not_called()
+
+
+def test_panel_divides_all_targets_at_once(tmp_path, frankfurter):
+    panel = FxRateStore(tmp_path).panel("GBP", ["USD", "EUR", "XXX"], days=10)
+
+    assert list(panel.columns) == ["USD", "EUR"]
+    assert np.allclose(panel["USD"], 1.1 / 0.8) and np.allclose(panel["EUR"], 1 / 0.8)
+
+
+def test_readers_do_not_wait_for_a_fetch_and_failures_back_off(tmp_path, frankfurter, mocker, monkeypatch):
+    store = FxRateStore(tmp_path)
+    store.history("EUR", "USD", days=7)
+    fake = fxstore.http_client.get.side_effect
+    fetching, release = threading.Event(), threading.Event()
+
+    def slow(url, params=None, **kwargs):
+        fetching.set()
+        release.wait(5)
+        return fake(url, params=params, **kwargs)
+
+    mocker.patch.object(fxstore.http_client, "get", side_effect=slow)
+    backfill = threading.Thread(target=store.history, args=("EUR", "USD", 200))
+    backfill.start()
+    assert fetching.wait(5)
+    # the stored fix answers while the backfill request is in flight
+    assert store.rate("EUR", "USD")[0] == pytest.approx(1.1)
+    release.set()
+    backfill.join(5)
+    assert store.stats()["first_day"] == (dt.date.today() - dt.timedelta(days=200)).isoformat()
+
+    down = mocker.patch.object(fxstore.http_client, "get", side_effect=requests.ConnectionError("down"))
+    for _ in range(3):
+        assert len(store.history("EUR", "USD", days=400)) > 100
+    assert down.call_count == 1
+    monkeypatch.setattr(store, "retry_at", 0.0)
+    store.history("EUR", "USD", days=400)
+    assert down.call_count == 2
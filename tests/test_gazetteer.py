@@ -0,0 +1,74 @@
+import zipfile
+
+import pytest
+
+from services import gazetteer, weather
+from services.gazetteer import Gazetteer, build_index, normalize
+
+ROWS = [
+    # id, name, ascii, alternates, lat, lon, class, code, cc, pop, tz
+    (3128760, "Barcelona", "Barcelona", "Barcelone,Barcellona,BCN", 41.38879, 2.15899, "P", "PPLA", "ES", 1620343, "Europe/Madrid"),
+    (3646738, "Barcelona", "Barcelona", "", 10.13625, -64.68618, "P", "PPLA", "VE", 424795, "America/Caracas"),
+    (3448439, "São Paulo", "Sao Paulo", "Sampa", -23.5475, -46.63611, "P", "PPLA", "BR", 10021295, "America/Sao_Paulo"),
+    (3117735, "Madrid", "Madrid", "Madri", 40.4165, -3.70256, "P", "PPLC", "ES", 3255944, "Europe/Madrid"),
+    (6255148, "Europe", "Europe", "", 48.69, 9.14, "L", "CONT", "", 0, ""),
+]
+
+
+def write_dump(path):
+    lines = []
+    for gid, name, ascii_name, alt, lat, lon, fclass, fcode, cc, pop, tz in ROWS:
+        rec = [str(gid), name, ascii_name, alt, str(lat), str(lon), fclass, fcode, cc, "", "", "", "", "",
+               str(pop), "", "12", tz, "2024-01-01"]
+        lines.append("\t".join(rec))
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def gaz(tmp_path):
+    assert build_index(write_dump(tmp_path / "cities.txt"), tmp_path / "idx") == 4  # the continent is skipped
+    return Gazetteer(tmp_path / "idx")
+
+
+def test_normalize_folds_case_accents_and_spaces():
+    assert normalize("  São   PAULO ") == "sao paulo"
+
+
+def test_geocode_matches_names_and_aliases_most_populous_first(gaz):
+    bcn = gaz.geocode("barcelona")
+    assert bcn["country_code"] == "ES" and bcn["id"] == 3128760
+    assert bcn["latitude"] == pytest.approx(41.38879) and bcn["timezone"] == "Europe/Madrid"
+    assert gaz.geocode("Barcelone")["id"] == 3128760
+    assert gaz.geocode("SAO PAULO")["name"] == "São Paulo"
+    assert gaz.geocode("Atlantis") is None
+
+
+def test_prefix_and_fuzzy_lookup(gaz):
+    assert [p["country_code"] for p in gaz.prefix("barc")] == ["ES", "VE"]
+    assert [p["name"] for p in gaz.prefix("ma")] == ["Madrid"]
+    hits = gaz.fuzzy("Madird")
+    assert hits[0]["name"] == "Madrid" and hits[0]["distance"] == 2
+    assert gaz.fuzzy("Barselona", max_distance=1)[0]["id"] == 3128760
+
+
+def test_build_reads_zipped_dumps(tmp_path):
+    dump = write_dump(tmp_path / "cities.txt")
+    with zipfile.ZipFile(tmp_path / "cities.zip", "w") as zf:
+        zf.write(dump, "cities.txt")
+    assert build_index(tmp_path / "cities.zip", tmp_path / "idx", min_population=2_000_000) == 2
+
+
+def test_geocode_city_uses_gazetteer_before_the_api(gaz, mocker):
+    get = mocker.patch("requests.Session.get")
+    gazetteer.set_gazetteer(gaz)
+    try:
+        assert weather.geocode_city("Madrid")["id"] == 3117735
+        assert get.call_count == 0
+
+        get.return_value = mocker.Mock(status_code=200)
+        get.return_value.json.return_value = {"results": [{"name": "Atlantis"}]}
+        assert weather.geocode_city("Atlantis") == {"name": "Atlantis"}
+        assert get.call_count == 1
+    finally:
+        gazetteer.set_gazetteer(None)
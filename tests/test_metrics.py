@@ -0,0 +1,91 @@
+import subprocess
+import sys
+import urllib.request
+
+import pytest
+import requests
+
+from services import http_client, metrics, wiki
+from services.metrics import REGISTRY, Histogram
+
+
+@pytest.fixture(autouse=True)
+def _fresh_registry():
+    REGISTRY.reset()
+    yield
+    REGISTRY.reset()
+
+
+def test_histogram_quantiles_interpolate_within_buckets():
+    h = Histogram()
+    for _ in range(99):
+        h.observe(0.003)
+    h.observe(4.0)
+    assert h.count == 100
+    assert 0.0025 < h.quantile(0.5) <= 0.005
+    assert 2.5 < h.quantile(0.999) <= 5.0
+
+
+def test_timed_records_latency_and_errors():
+    @metrics.timed("test.fn")
+    def fn(fail=False):
+        if fail:
+            raise ValueError("nope")
+        return 1
+
+    fn()
+    with pytest.raises(ValueError):
+        fn(fail=True)
+    assert REGISTRY.histogram("intellidash_call_seconds", fn="test.fn").count == 2
+    assert REGISTRY.counter("intellidash_call_errors_total", fn="test.fn") == 1
+
+
+def test_http_client_records_status_bytes_retries_and_errors(mocker):
+    resp = mocker.Mock(status_code=200, content=b'{"pages": []}')
+    resp.raw.retries.history = (object(), object())
+    resp.json.return_value = {"pages": [{"title": "Python"}]}
+    mocker.patch("requests.Session.get", return_value=resp)
+
+    wiki.search_pages("Python")
+    wiki.search_pages("Python")  # cache hit: timed, but no second upstream request
+
+    host = "en.wikipedia.org"
+    assert REGISTRY.histogram("intellidash_http_request_seconds", host=host).count == 1
+    assert REGISTRY.counter("intellidash_http_responses_total", host=host, status="200") == 1
+    assert REGISTRY.counter("intellidash_http_retries_total", host=host) == 2
+    assert REGISTRY.counter("intellidash_http_response_bytes_total", host=host) == len(resp.content)
+    assert REGISTRY.histogram("intellidash_call_seconds", fn="wiki.search_pages").count == 2
+
+    mocker.patch("requests.Session.get", side_effect=requests.ConnectionError("down"))
+    with pytest.raises(requests.ConnectionError):
+        http_client.get("https://hn.algolia.com/api/v1/search")
+    assert REGISTRY.counter("intellidash_http_errors_total", host="hn.algolia.com", error="ConnectionError") == 1
+
+
+def test_render_prometheus_and_metrics_endpoint(mocker):
+    mocker.patch("requests.Session.get", return_value=mocker.Mock(status_code=404, content=b""))
+    wiki.get_summary("Nowhere")
+
+    text = metrics.render_prometheus()
+    assert "# TYPE intellidash_call_seconds histogram" in text
+    assert 'intellidash_call_seconds_bucket{fn="wiki.get_summary",le="+Inf"} 1' in text
+    assert 'intellidash_http_responses_total{host="en.wikipedia.org",status="404"} 1' in text
+    assert 'intellidash_cache_lookups_total{result="miss",source="wiki.summary"} 1' in text
+
+    server = metrics.start_metrics_server(port=_free_port())
+    assert server is not None and metrics.start_metrics_server() is server
+    body = urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics", timeout=5).read().decode()
+    assert "intellidash_call_seconds_count" in body
+
+
+def _free_port():
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_nlp_layer_does_not_import_services():
+    code = "import sys, intelligence.nlp; print(sorted(m for m in sys.modules if m.startswith('services')))"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert out.strip() == "[]"
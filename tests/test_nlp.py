@@ -1,4 +1,5 @@
 
+import time
 import pytest
 from intelligence.nlp import rake_keywords, textrank_summarize, tiny_sentiment, sentences, tokenize
 
@@ -38,3 +39,87 @@ def test_tiny_sentiment():
 
     mixed_text = "It has some good features, but also some bad ones."
     assert -0.3 < tiny_sentiment(mixed_text) < 0.3
+
+def test_score_many_matches_tiny_sentiment():
+    import numpy as np
+    from intelligence.nlp import score_many
+    texts = [
+        "This is a great, excellent, and wonderful product. I love it.",
+        "This is a bad, poor, and terrible product. I hate it.",
+        "not good",
+        "Not bad at all, never a loss",
+        "",
+        "!!!",
+        "no",
+        "It has some good features, but also some bad ones.",
+        "not good",
+        "Market crash fears: not a recession, analysts say growth is strong",
+    ]
+    scores = score_many(texts)
+    assert isinstance(scores, np.ndarray)
+    assert scores.tolist() == [tiny_sentiment(t) for t in texts]
+    assert score_many([]).shape == (0,)
+
+def _networkx_textrank(text, max_sentences):
+    """Reference: the original networkx implementation of textrank_summarize."""
+    import networkx as nx
+    sents = sentences(text)
+    G = nx.Graph()
+    G.add_nodes_from(range(len(sents)))
+    token_sets = [set(tokenize(s)) for s in sents]
+    for i in range(len(sents)):
+        for j in range(i + 1, len(sents)):
+            a, b = token_sets[i], token_sets[j]
+            if a and b and a & b:
+                G.add_edge(i, j, weight=len(a & b) / len(a | b))
+    if G.number_of_edges() == 0:
+        return sents[:max_sentences]
+    ranks = nx.pagerank(G, weight="weight")
+    ordered = sorted(range(len(sents)), key=lambda i: ranks.get(i, 0), reverse=True)
+    return [sents[i] for i in sorted(ordered[:max_sentences])]
+
+@pytest.mark.parametrize("text", [
+    "This is the first sentence. This sentence is very important. This is the third sentence. The second sentence is key.",
+    "The quick brown fox jumps over the lazy dog. The dog was not amused.",
+    "Barcelona is a city on the coast of northeastern Spain. It is the capital and largest city of Catalonia. "
+    "Barcelona is one of the world's leading tourist, economic, trade fair and cultural centres! "
+    "Its port is one of the busiest in Europe? The city is known for the architecture of Gaudí.",
+    "Alpha beta. Gamma delta. Epsilon zeta.",
+])
+@pytest.mark.parametrize("max_sentences", [1, 2, 3])
+def test_textrank_matches_networkx_reference(text, max_sentences):
+    assert textrank_summarize(text, max_sentences=max_sentences) == _networkx_textrank(text, max_sentences)
+
+def test_textrank_scales_to_thousands_of_sentences():
+    import random
+    rng = random.Random(0)
+    vocab = "the a of city river market data model open source port capital science history music".split()
+    text = " ".join(
+        " ".join(rng.choice(vocab) for _ in range(rng.randint(5, 15))).capitalize() + "." for _ in range(2000)
+    )
+    # a 15-word vocabulary links almost every pair: the worst case for the sparse similarity matrix
+    t0 = time.perf_counter()
+    summary = textrank_summarize(text, max_sentences=5, max_iter=50)
+    elapsed = time.perf_counter() - t0
+    assert len(summary) == 5
+    # the vectorized path takes a fraction of a second; the old pairwise loop + networkx took many seconds
+    assert elapsed < 2.0
+
+def test_document_matches_standalone_functions():
+    from intelligence.nlp import analyze
+    text = ("Barcelona is a city on the coast of northeastern Spain. It is the capital and largest city of Catalonia. "
+            "Barcelona is one of the world's leading tourist, economic, trade fair and cultural centres! "
+            "Its port is one of the busiest in Europe? The city is not bad at all.")
+    doc = analyze(text)
+    assert doc.tokens == tokenize(text)
+    assert doc.sentences == sentences(text)
+    assert doc.keywords(top_k=8) == rake_keywords(text, top_k=8)
+    assert doc.summary(max_sentences=2) == textrank_summarize(text, max_sentences=2)
+    assert doc.sentiment() == tiny_sentiment(text)
+
+def test_analyze_memoizes_by_content():
+    from intelligence.nlp import analyze
+    doc = analyze("Same text. Same result.")
+    assert analyze("Same text. " + "Same result.") is doc
+    assert doc.summary(1) is doc.summary(1)
+    assert analyze("").keywords() == [] and analyze("").summary() == []
@@ -0,0 +1,37 @@
+from services import aggregate, cache, prefetch
+
+
+def test_hot_queries_are_the_most_frequent_recent_searches():
+    r = prefetch.HotQueryRefresher(top_n=2, history=5)
+    r.seed(["old", "old", "old"])
+    for q in ["Paris", "Rome", "Paris", " ", "Rome", "Paris"]:
+        r.record(q)
+    # "old" fell out of the history window; blank queries are ignored
+    assert r.hot_queries() == [("Paris", 10, 5), ("Rome", 10, 5)]
+    # the same query with other settings is another set of cache entries
+    r.record("Rome", max_news=20)
+    assert ("Rome", 20, 5) not in r.hot_queries()
+
+
+def test_run_once_refreshes_hot_queries_ahead_of_expiry(mocker):
+    seen = []
+    mocker.patch.object(
+        prefetch, "smart_aggregate",
+        side_effect=lambda q, n, w: seen.append((q, n, w, cache._refresh_horizon.get())),
+    )
+    r = prefetch.HotQueryRefresher(top_n=1, interval=30)
+    r.record("Paris", 5, 3)
+    r.record("Paris", 5, 3)
+    r.record("Rome")
+    assert r.run_once() == [("Paris", 5, 3)]
+    assert seen == [("Paris", 5, 3, 60)]
+    assert r.stats() == {"tracked": 3, "rounds": 1, "refreshed": 1, "errors": 0}
+
+
+def test_smart_aggregate_workers_inherit_refresh_ahead(mocker):
+    horizons = []
+    mocker.patch.object(aggregate, "search_pages", return_value=[])
+    mocker.patch.object(aggregate, "search_hn", side_effect=lambda *a, **k: horizons.append(cache._refresh_horizon.get()) or [])
+    with cache.refresh_ahead(120):
+        aggregate.smart_aggregate("python", max_news=5, max_wiki=3)
+    assert horizons == [120]
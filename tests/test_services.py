@@ -8,17 +8,17 @@ def mock_get_success(mocker):
     mock_response = mocker.Mock()
     mock_response.status_code = 200
     mock_response.json.return_value = {"success": True, "data": "some data"}
-    return mocker.patch("requests.get", return_value=mock_response)
+    return mocker.patch("requests.Session.get", return_value=mock_response)
 
 @pytest.fixture
 def mock_get_fail(mocker):
     mock_response = mocker.Mock()
     mock_response.status_code = 404
-    return mocker.patch("requests.get", return_value=mock_response)
+    return mocker.patch("requests.Session.get", return_value=mock_response)
 
 @pytest.fixture
 def mock_get_exception(mocker):
-    return mocker.patch("requests.get", side_effect=requests.exceptions.RequestException("Test timeout"))
+    return mocker.patch("requests.Session.get", side_effect=requests.exceptions.RequestException("Test timeout"))
 
 def test_forex_convert_currency_success(mocker):
     mock_response = mocker.Mock()
@@ -28,7 +28,7 @@ def test_forex_convert_currency_success(mocker):
         "base": "EUR",
         "date": "2025-01-01"
     }
-    mocker.patch("requests.get", return_value=mock_response)
+    mocker.patch("requests.Session.get", return_value=mock_response)
 
     result = forex.convert_currency(100, "EUR", "USD")
     assert result["success"] is True
@@ -43,7 +43,7 @@ def test_news_search_hn_success(mocker):
     mock_response = mocker.Mock()
     mock_response.status_code = 200
     mock_response.json.return_value = {"hits": [{"title": "Test News"}]}
-    mocker.patch("requests.get", return_value=mock_response)
+    mocker.patch("requests.Session.get", return_value=mock_response)
 
     result = news.search_hn("test")
     assert len(result) == 1
@@ -57,7 +57,7 @@ def test_weather_geocode_city_success(mocker):
     mock_response = mocker.Mock()
     mock_response.status_code = 200
     mock_response.json.return_value = {"results": [{"name": "Chicago"}]}
-    mocker.patch("requests.get", return_value=mock_response)
+    mocker.patch("requests.Session.get", return_value=mock_response)
 
     result = weather.geocode_city("Chicago")
     assert result is not None
@@ -71,7 +71,7 @@ def test_weather_get_weather_success(mocker):
     mock_response = mocker.Mock()
     mock_response.status_code = 200
     mock_response.json.return_value = {"current_weather": {"temperature": 10}}
-    mocker.patch("requests.get", return_value=mock_response)
+    mocker.patch("requests.Session.get", return_value=mock_response)
 
     result = weather.get_weather(41.8, -87.6)
     assert result is not None
@@ -81,11 +81,47 @@ def test_weather_get_weather_fail(mock_get_fail):
     result = weather.get_weather(41.8, -87.6)
     assert result is None
 
+def test_weather_compare_cities_batches_forecasts_into_one_request(mocker):
+    places = {"Oslo": (59.91, 10.75, "NO"), "Rome": (41.89, 12.48, "IT")}
+
+    def fake_get(self, url, params=None, **kwargs):
+        resp = mocker.Mock(status_code=200)
+        if url == weather.GEOCODE:
+            hit = places.get(params["name"])
+            resp.json.return_value = {"results": [
+                {"name": params["name"], "latitude": hit[0], "longitude": hit[1], "country_code": hit[2]}
+            ]} if hit else {}
+        else:
+            n = len(params["latitude"].split(","))
+            resp.json.return_value = [
+                {"hourly": {"time": ["2026-10-17T00:00", "2026-10-17T01:00"],
+                            "temperature_2m": [float(i), float(i) + 1], "precipitation": [0.0, None]}}
+                for i in range(n)
+            ]
+        return resp
+
+    get = mocker.patch("requests.Session.get", autospec=True, side_effect=fake_get)
+
+    df = weather.compare_cities(["Oslo", "Rome", "Atlantis", "Oslo"])
+
+    forecast_calls = [c for c in get.call_args_list if c.args[1] == weather.BASE]
+    assert len(forecast_calls) == 1
+    assert forecast_calls[0].kwargs["params"]["latitude"] == "59.9100,41.8900"
+    assert list(df["city"].unique()) == ["Oslo", "Rome"]
+    assert list(df.columns[:5]) == ["city", "country_code", "latitude", "longitude", "time"]
+    assert df.loc[df["city"] == "Rome", "temperature_2m"].tolist() == [1.0, 2.0]
+    assert df["precipitation"].isna().sum() == 2
+    assert str(df["time"].dtype).startswith("datetime64")
+
+def test_weather_get_weather_many_empty():
+    df = weather.get_weather_many([])
+    assert df.empty and "temperature_2m" in df.columns
+
 def test_wiki_search_pages_success(mocker):
     mock_response = mocker.Mock()
     mock_response.status_code = 200
     mock_response.json.return_value = {"pages": [{"title": "Python (programming language)"}]}
-    mocker.patch("requests.get", return_value=mock_response)
+    mocker.patch("requests.Session.get", return_value=mock_response)
 
     result = wiki.search_pages("Python")
     assert len(result) == 1
@@ -99,7 +135,7 @@ def test_wiki_get_summary_success(mocker):
     mock_response = mocker.Mock()
     mock_response.status_code = 200
     mock_response.json.return_value = {"extract": "A high-level programming language."}
-    mocker.patch("requests.get", return_value=mock_response)
+    mocker.patch("requests.Session.get", return_value=mock_response)
 
     result = wiki.get_summary("Python (programming language)")
     assert result is not None
@@ -108,3 +144,106 @@ def test_wiki_get_summary_success(mocker):
 def test_wiki_get_summary_fail(mock_get_fail):
     result = wiki.get_summary("Python (programming language)")
     assert result is None
+
+def test_http_client_shares_one_pooled_session():
+    from services import http_client
+    session = http_client.get_session()
+    assert session is http_client.get_session()
+    adapter = session.get_adapter("https://en.wikipedia.org/w/rest.php")
+    assert 429 in adapter.max_retries.status_forcelist
+    assert adapter._pool_maxsize == http_client.POOL_MAXSIZE
+
+def test_http_client_configure_rebuilds_session(monkeypatch):
+    from services import http_client
+    monkeypatch.setattr(http_client, "POOL_MAXSIZE", http_client.POOL_MAXSIZE)
+    old = http_client.get_session()
+    http_client.configure(pool_maxsize=4)
+    new = http_client.get_session()
+    assert new is not old
+    assert new.get_adapter("https://api.frankfurter.app")._pool_maxsize == 4
+
+def test_http_client_coalesces_identical_in_flight_requests(mocker):
+    import threading
+    import time
+    from services import http_client
+    from services.singleflight import SingleFlight
+    mocker.patch.object(http_client, "_inflight", SingleFlight())
+    mock_response = mocker.Mock()
+    mock_response.status_code = 200
+
+    def slow_get(*args, **kwargs):
+        time.sleep(0.2)
+        return mock_response
+    get = mocker.patch("requests.Session.get", side_effect=slow_get)
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(http_client.get(news.BASE, params={"query": "AI"})))
+        for _ in range(5)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert get.call_count == 1
+    assert results == [mock_response] * 5
+    assert http_client.coalescing_stats() == {"hn.algolia.com": {"executed": 1, "coalesced": 4}}
+
+def test_singleflight_shares_exceptions_and_forgets_finished_calls():
+    from services.singleflight import SingleFlight
+    sf = SingleFlight()
+    with pytest.raises(ValueError):
+        sf.do("k", lambda: (_ for _ in ()).throw(ValueError("down")))
+    assert sf.in_flight() == 0
+    assert sf.do("k", lambda: 42) == 42
+    assert sf.stats() == {"default": {"executed": 2, "coalesced": 0}}
+
+def test_wiki_infer_entity_type_uses_given_summary(mocker):
+    get = mocker.patch("requests.Session.get")
+    pages = [{"title": "Barcelona"}]
+    assert wiki.infer_entity_type_from_pages(pages, summary={"description": "City in Spain"}) == "place"
+    assert wiki.infer_entity_type_from_pages(pages, summary={}) == "unknown"
+    get.assert_not_called()
+
+def test_wiki_classifies_from_search_results_without_fetching_the_summary(mocker):
+    get = mocker.patch("requests.Session.get")
+    mocker.patch.object(wiki, "get_gazetteer", return_value=None)
+    assert wiki.infer_entity_type_from_pages([{"title": "Lionel Messi", "description": "Argentine footballer (born 1987)"}]) == "person"
+    assert wiki.classify_pages([{"title": "Python", "description": "Programming language"}]) is None
+    get.assert_not_called()
+
+    # cached per title: a later search without a description still knows it
+    assert wiki.classify_pages([{"title": "Lionel Messi"}]) == "person"
+
+def test_wiki_classify_pages_uses_gazetteer_then_summary(mocker):
+    gazetteer = mocker.Mock()
+    gazetteer.geocode.side_effect = lambda name: {"name": name} if name == "Reus" else None
+    mocker.patch.object(wiki, "get_gazetteer", return_value=gazetteer)
+    get_summary = mocker.patch.object(wiki, "get_summary", return_value={"extract": "Vue is a JavaScript framework."})
+
+    assert wiki.infer_entity_type_from_pages([{"title": "Reus"}]) == "place"
+    assert wiki.infer_entity_type_from_pages([{"title": "Vue.js"}]) == "unknown"
+    assert wiki.infer_entity_type_from_pages([{"title": "Vue.js"}]) == "unknown"
+    get_summary.assert_called_once_with("Vue.js")
+
+def test_wiki_get_summaries_fetches_titles_in_parallel(mocker):
+    import time
+
+    def slow_get(url, **kwargs):
+        time.sleep(0.2)
+        mock_response = mocker.Mock()
+        mock_response.status_code = 200 if "Missing" not in url else 404
+        mock_response.json.return_value = {"extract": url.rsplit("/", 1)[-1]}
+        return mock_response
+    get = mocker.patch("requests.Session.get", side_effect=slow_get)
+    titles = [f"Page_{i}" for i in range(8)] + ["Missing", "Page_0"]
+
+    t0 = time.monotonic()
+    result = wiki.get_summaries(titles)
+    elapsed = time.monotonic() - t0
+
+    assert get.call_count == 9
+    assert result["Page_3"] == {"extract": "Page_3"}
+    assert result["Missing"] is None
+    assert elapsed < 0.6
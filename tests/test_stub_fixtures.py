@@ -0,0 +1,25 @@
+from benchmarks.bench_aggregate import run_load
+from benchmarks.stub_server import StubServer, point_services_at, restore_services
+from services import aggregate, wiki
+
+
+def test_smart_aggregate_runs_end_to_end_against_recorded_fixtures():
+    with StubServer(latency=0.0) as server:
+        originals = point_services_at(server.url)
+        try:
+            res = aggregate.smart_aggregate("Barcelona", max_news=10, max_wiki=3)
+            fx = aggregate.smart_aggregate("USD-EUR", max_news=10, max_wiki=3)
+            stats = run_load(["Girona", "Sitges"], concurrency=2)
+        finally:
+            restore_services(originals)
+
+    assert res["errors"] == []
+    assert res["query_type"] == "place"
+    assert [p["title"] for p in res["wiki"]][:1] == ["Barcelona"] and len(res["wiki"]) == 3
+    assert res["summaries"]["Barcelona"]["description"] == "City in Catalonia, Spain"
+    assert len(res["news"]) == 10
+    assert res["geo"]["country_code"] == "ES"
+    assert len(res["weather"]["hourly"]["temperature_2m"]) == 168
+    assert fx["fx"] == {"base": "USD", "target": "EUR", "result": 0.9213}
+    assert stats["queries"] == 2 and stats["errors"] == 0
+    assert wiki.SEARCH_URL.startswith("https://en.wikipedia.org")